@@ -0,0 +1,22 @@
+# benchmarks
+# Throughput benchmarks of the Zerocycle readers and ingestion
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Mon Aug 04 09:20:14 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: __init__.py [] benjamin@bengfort.com $
+
+"""
+Throughput benchmarks of the Zerocycle readers and ingestion.
+
+The generate module writes synthetic monthly supervisor reports and
+accounts exports in the layouts of the real reports at any scale, and the
+run module times the readers and ingestion against them and writes the
+results as JSON so that they can be compared between commits:
+
+    $ python -m benchmarks.run --routes 400 --days 22 -o results.json
+    $ python -m benchmarks.run --compare before.json after.json
+"""
@@ -0,0 +1,215 @@
+# benchmarks.generate
+# Synthetic monthly supervisor reports and accounts exports
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Mon Aug 04 09:31:52 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: generate.py [] benjamin@bengfort.com $
+
+"""
+Synthetic monthly supervisor reports and accounts exports.
+
+The reports are written in the layout of the real reports (see the
+fixtures): the monthly report is an Excel workbook with a section per
+supervisor, made up of a daily date row, a row per pickup and a daily
+total row for every day, and the accounts export is a CSV with old Mac
+line endings. Its scale is routes x days x vehicles pickups.
+
+A PickupFrame of pickups can also be generated directly, for benchmarks
+of the analytics that need more pickups than a report can hold.
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import sys
+import random
+import argparse
+import numpy as np
+import unicodecsv as csv
+
+from xlwt import Workbook
+from datetime import date, timedelta
+from zerocycle.analytics.frame import PickupFrame, to_days
+
+##########################################################################
+## Module Constants
+##########################################################################
+
+MAX_ROWS    = 65536                 # Rows in an Excel 97 worksheet
+NBSP        = u"\xa0"               # Cells of the reports are padded with these
+START_DATE  = date(2014, 3, 3)      # A Monday, like the fixture
+WEEKDAYS    = (u"M", u"T", u"W", u"H", u"F")
+HEADER      = (u"Supervisor Daily Report", u"Route Number", u"Vehicle Number", u"Miles", u"Total Garbage Weight")
+
+##########################################################################
+## Helper functions
+##########################################################################
+
+def route_names(routes):
+    """
+    Returns route names in the style of the reports, e.g. PAM60.
+    """
+    return [u"PA%s%02i" % (WEEKDAYS[idx % 5], idx // 5) for idx in xrange(routes)]
+
+def supervisor_names(supervisors):
+    """
+    Returns supervisor names in the style of the reports.
+    """
+    return [u"Supervisor%02i, Synthetic" % idx for idx in xrange(supervisors)]
+
+def weekdays(start, days):
+    """
+    Returns the first days weekdays on or after the start date.
+    """
+    dates = []
+    while len(dates) < days:
+        if start.weekday() < 5:
+            dates.append(start)
+        start += timedelta(days=1)
+    return dates
+
+##########################################################################
+## Report Writers
+##########################################################################
+
+class SheetWriter(object):
+    """
+    Appends rows to a workbook, adding a sheet whenever one is full just
+    as the reports are split across sheets by Excel.
+    """
+
+    def __init__(self, workbook):
+        self.workbook = workbook
+        self.sheets   = 0
+        self.sheet    = None
+        self.ridx     = MAX_ROWS
+
+    def append(self, *values):
+        if self.ridx >= MAX_ROWS:
+            self.sheets += 1
+            self.sheet   = self.workbook.add_sheet(u"Sheet%i" % (self.sheets + 1))
+            self.ridx    = 0
+
+        for cidx, value in enumerate(values):
+            if value is not None:
+                self.sheet.write(self.ridx, cidx, value)
+        self.ridx += 1
+
+def generate_monthly(path, routes=200, days=22, vehicles=1, supervisors=8, start=START_DATE, seed=42):
+    """
+    Writes a monthly supervisor report where each of the routes is picked
+    up by every one of the vehicles on each of the (week)days from the
+    start date. Routes are split evenly between the supervisors. Returns
+    the number of pickups in the report.
+    """
+    rng     = random.Random(seed)
+    names   = route_names(routes)
+    bosses  = supervisor_names(supervisors)
+    dates   = weekdays(start, days)
+    pickups = 0
+
+    workbook = Workbook(encoding="utf-8")
+    writer   = SheetWriter(workbook)
+    writer.append(*HEADER)
+
+    for sidx, supervisor in enumerate(bosses):
+        section = names[sidx::supervisors]
+        if not section: continue
+
+        writer.append()
+        writer.append(u"Supervisor: ", supervisor)
+        total_miles, total_garbage = 0, 0
+
+        for day in dates:
+            writer.append(NBSP * 2 + u"Daily Date: ", NBSP * 2 + day.strftime("%m/%d/%Y"))
+            daily_miles, daily_garbage = 0, 0
+
+            for ridx, route in enumerate(section):
+                for vidx in xrange(vehicles):
+                    vehicle = u"%02iG%03i" % (7 + vidx % 7, (ridx * vehicles + vidx) % 1000)
+                    miles   = rng.randint(5, 120)
+                    garbage = float(rng.randint(50, 1700) * 20)
+                    writer.append(None, NBSP + route, NBSP + vehicle, NBSP + unicode(miles), garbage)
+
+                    daily_miles   += miles
+                    daily_garbage += garbage
+                    pickups       += 1
+
+            writer.append(NBSP * 2 + u"Daily Total:", None, None, float(daily_miles), daily_garbage)
+            writer.append()
+            total_miles   += daily_miles
+            total_garbage += daily_garbage
+
+        writer.append(u"Supervisor Total:", None, None, float(total_miles), total_garbage)
+
+    workbook.add_sheet(u"Sheet%i" % (writer.sheets + 2)) # the reports end with an empty sheet
+    workbook.save(path)
+    return pickups
+
+def generate_accounts(path, routes=200, seed=42):
+    """
+    Writes an accounts export with the service locations of the routes.
+    Returns the number of routes in the export.
+    """
+    rng = random.Random(seed)
+    with open(path, 'wb') as data:
+        writer = csv.writer(data, lineterminator="\r")
+        writer.writerow(["ROUTE NAME", "SERVICE LOCATIONS"])
+        for name in route_names(routes):
+            writer.writerow([name, rng.randint(400, 1800)])
+    return routes
+
+##########################################################################
+## Frame Generator
+##########################################################################
+
+def generate_frame(routes=250, days=1305, supervisors=12, vehicles=40, start=START_DATE, seed=42):
+    """
+    Returns a PickupFrame where each of the routes is picked up once on
+    each of the (week)days from the start date, by one of the vehicles,
+    with about 20 pounds of garbage per household and 1% missing weights.
+    The defaults are city-sized: five years of pickups, about 325,000.
+    """
+    rng   = np.random.RandomState(seed)
+    dates = np.repeat(to_days(weekdays(start, days)), routes)
+    route = np.tile(np.arange(routes, dtype=np.int32), days)
+    names = np.array(route_names(routes), dtype=object)
+    sups  = np.array(supervisor_names(supervisors), dtype=object)[np.arange(routes) % supervisors]
+    locs  = rng.randint(200, 2000, routes)
+
+    garbage = locs[route] * rng.normal(20.0, 4.0, len(dates))
+    garbage[rng.rand(len(dates)) < 0.01] = np.nan
+
+    return PickupFrame(
+        dates, route, route % vehicles, rng.uniform(5, 40, len(dates)), garbage,
+        names, np.arange(vehicles), sups, locs,
+    )
+
+##########################################################################
+## Main Method
+##########################################################################
+
+def main(*argv):
+    parser = argparse.ArgumentParser(description="Generate synthetic Zerocycle reports")
+    parser.add_argument('monthly', type=str, help='Path to write the monthly report (.xls) to.')
+    parser.add_argument('accounts', type=str, nargs='?', default=None, help='Path to write the accounts export (.csv) to.')
+    parser.add_argument('-r', '--routes', type=int, default=200, help='Number of routes.')
+    parser.add_argument('-d', '--days', type=int, default=22, help='Number of weekdays of pickups.')
+    parser.add_argument('-v', '--vehicles', type=int, default=1, help='Number of vehicles per route per day.')
+    parser.add_argument('-s', '--supervisors', type=int, default=8, help='Number of supervisors.')
+    parser.add_argument('--seed', type=int, default=42, help='Seed of the random values.')
+    args = parser.parse_args(argv or None)
+
+    pickups = generate_monthly(args.monthly, args.routes, args.days, args.vehicles, args.supervisors, seed=args.seed)
+    print "%i pickups written to %s" % (pickups, args.monthly)
+    if args.accounts:
+        generate_accounts(args.accounts, args.routes, seed=args.seed)
+        print "%i routes written to %s" % (args.routes, args.accounts)
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,237 @@
+# benchmarks.run
+# Timed runs of the report readers and ingestion
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Mon Aug 04 11:02:37 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: run.py [] benjamin@bengfort.com $
+
+"""
+Timed runs of the report readers and ingestion.
+
+Each benchmark is run a number of times against synthetic reports in a
+temporary directory; ingestion writes to a local SQLite database that is
+created afresh for every run, the text cells of the monthly report are
+normalized with an empty memo, and the household rates are computed by
+every group over a generated PickupFrame of the same scale. The results
+(best and mean seconds, rows and rows per second of the best run) are
+written as JSON along with the scale, the commit and the Python version,
+and two results files can be compared with --compare.
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+from datetime import datetime
+from collections import OrderedDict
+from benchmarks.generate import generate_monthly, generate_accounts, generate_frame
+
+from zerocycle.conf import settings
+from zerocycle.db.models import syncdb, create_session
+from zerocycle.analytics.frame import GROUPS
+from zerocycle.analytics.rates import household_rates
+from zerocycle.ingest import ingest_report
+from zerocycle.ingest.base import CSVReportReader, ExcelReportReader
+from zerocycle.ingest.monthly import MonthlyReportReader
+from zerocycle.ingest.accounts import AccountsReportReader
+from zerocycle.utils import text
+
+##########################################################################
+## Module Constants
+##########################################################################
+
+DEFAULT_REPEAT = 3
+
+##########################################################################
+## Benchmarks
+##########################################################################
+
+def count(iterable):
+    """
+    Exhausts an iterable and returns the number of items in it.
+    """
+    return sum(1 for item in iterable)
+
+def use_database(path):
+    """
+    Points the configured database at a new SQLite database at path.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    settings.override(database={'scheme': 'sqlite', 'name': path})
+    create_session.dispose()
+    syncdb()
+
+def bench_csv_reader(reports):
+    return count(CSVReportReader(reports['accounts'], header=True))
+
+def bench_csv_chunks(reports):
+    return sum(len(chunk["ROUTE NAME"]) for chunk in AccountsReportReader(reports['accounts']).chunks())
+
+def bench_excel_reader(reports):
+    return count(ExcelReportReader(reports['monthly']))
+
+def bench_monthly_reader(reports):
+    return count(MonthlyReportReader(reports['monthly']))
+
+def bench_ingest_accounts(reports):
+    use_database(reports['database'])
+    return count(ingest_report('accounts', reports['accounts']))
+
+def bench_ingest_monthly(reports):
+    use_database(reports['database'])
+    return count(ingest_report('monthly', reports['monthly']))
+
+def bench_normalize(reports):
+    text.clear_cache()
+    return len(text.normalize_many(reports['cells']))
+
+def bench_household_rates(reports):
+    frame = reports['frame']
+    for by in GROUPS:
+        household_rates(frame, by)
+    return len(frame) * len(GROUPS)
+
+BENCHMARKS = OrderedDict([
+    ("csv_reader", bench_csv_reader),
+    ("csv_chunks", bench_csv_chunks),
+    ("excel_reader", bench_excel_reader),
+    ("monthly_reader", bench_monthly_reader),
+    ("ingest_accounts", bench_ingest_accounts),
+    ("ingest_monthly", bench_ingest_monthly),
+    ("normalize", bench_normalize),
+    ("household_rates", bench_household_rates),
+])
+
+##########################################################################
+## Running and comparing
+##########################################################################
+
+def git_commit():
+    """
+    Returns the commit of the working tree, if it is a git repository.
+    """
+    try:
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=devnull).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def time_benchmark(func, reports, repeat=DEFAULT_REPEAT):
+    """
+    Runs the benchmark repeat times and returns its timings.
+    """
+    timings = []
+    for idx in xrange(repeat):
+        started = time.time()
+        rows    = func(reports)
+        timings.append(time.time() - started)
+
+    best = min(timings)
+    return OrderedDict([
+        ("best", best),
+        ("mean", sum(timings) / len(timings)),
+        ("rows", rows),
+        ("rows_per_sec", rows / best if best > 0 else 0.0),
+    ])
+
+def run(routes=200, days=22, vehicles=1, supervisors=8, repeat=DEFAULT_REPEAT, names=None, workdir=None):
+    """
+    Generates the synthetic reports and runs the benchmarks (all of them,
+    or those named), returning the results as an ordered dictionary.
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix="zerocycle-bench-")
+    reports = {
+        "monthly":  os.path.join(workdir, "monthly.xls"),
+        "accounts": os.path.join(workdir, "accounts.csv"),
+        "database": os.path.join(workdir, "bench.db"),
+    }
+
+    previous = settings.override()
+    try:
+        pickups = generate_monthly(reports['monthly'], routes, days, vehicles, supervisors)
+        generate_accounts(reports['accounts'], routes)
+        reports['cells'] = [
+            cell for row in ExcelReportReader(reports['monthly'])
+            for cell in row if isinstance(cell, basestring)
+        ]
+        reports['frame'] = generate_frame(routes, days * vehicles, supervisors)
+
+        results = OrderedDict()
+        for name, func in BENCHMARKS.items():
+            if names and name not in names: continue
+            results[name] = time_benchmark(func, reports, repeat)
+    finally:
+        settings.restore(previous)
+        create_session.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return OrderedDict([
+        ("timestamp", datetime.now().isoformat()),
+        ("commit", git_commit()),
+        ("python", platform.python_version()),
+        ("scale", OrderedDict([
+            ("routes", routes), ("days", days), ("vehicles", vehicles),
+            ("supervisors", supervisors), ("pickups", pickups), ("repeat", repeat),
+        ])),
+        ("benchmarks", results),
+    ])
+
+def compare(before, after):
+    """
+    Returns lines comparing the best times of two results dictionaries,
+    with the speedup of after over before.
+    """
+    lines = ["%-16s %10s %10s %8s" % ("benchmark", before.get("commit") or "before", after.get("commit") or "after", "speedup")]
+    for name, result in after["benchmarks"].items():
+        if name not in before["benchmarks"]: continue
+        old, new = before["benchmarks"][name]["best"], result["best"]
+        lines.append("%-16s %9.3fs %9.3fs %7.2fx" % (name, old, new, old / new if new > 0 else 0.0))
+    return lines
+
+##########################################################################
+## Main Method
+##########################################################################
+
+def main(*argv):
+    parser = argparse.ArgumentParser(description="Benchmark the Zerocycle readers and ingestion")
+    parser.add_argument('-r', '--routes', type=int, default=200, help='Number of routes.')
+    parser.add_argument('-d', '--days', type=int, default=22, help='Number of weekdays of pickups.')
+    parser.add_argument('-v', '--vehicles', type=int, default=1, help='Number of vehicles per route per day.')
+    parser.add_argument('-s', '--supervisors', type=int, default=8, help='Number of supervisors.')
+    parser.add_argument('-n', '--repeat', type=int, default=DEFAULT_REPEAT, help='Number of runs of each benchmark.')
+    parser.add_argument('-b', '--benchmark', type=str, action='append', choices=BENCHMARKS.keys(), help='Only run this benchmark.')
+    parser.add_argument('-o', '--output', type=str, default=None, help='Path to write the JSON results to.')
+    parser.add_argument('--compare', type=str, nargs=2, metavar=('BEFORE', 'AFTER'), help='Compare two JSON results files.')
+    args = parser.parse_args(argv or None)
+
+    if args.compare:
+        with open(args.compare[0]) as before, open(args.compare[1]) as after:
+            before = json.load(before, object_pairs_hook=OrderedDict)
+            after  = json.load(after, object_pairs_hook=OrderedDict)
+        print "\n".join(compare(before, after))
+        return
+
+    results = run(args.routes, args.days, args.vehicles, args.supervisors, args.repeat, args.benchmark)
+    output  = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as out:
+            out.write(output + "\n")
+    print output
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
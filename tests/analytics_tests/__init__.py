@@ -0,0 +1,18 @@
+# tests.analytics_tests
+# Tests for the analytics module
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Thu Jul 31 11:40:17 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: __init__.py [] benjamin@bengfort.com $
+
+"""
+Tests for the analytics module
+"""
+
+##########################################################################
+## Imports
+##########################################################################
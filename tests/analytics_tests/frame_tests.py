@@ -0,0 +1,123 @@
+# tests.analytics_tests.frame_tests
+# Tests for the columnar pickup frame
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Thu Jul 31 11:42:30 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: frame_tests.py [] benjamin@bengfort.com $
+
+"""
+Tests for the columnar pickup frame
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import unittest
+import numpy as np
+
+from datetime import date
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from zerocycle.db.models import *
+from zerocycle.analytics.frame import *
+
+##########################################################################
+## Fixtures
+##########################################################################
+
+RECORDS = [
+    {"date": date(2014, 3, 3), "route": u"PAM60", "supervisor": u"Litson, Gary", "vehicle": u"10G760", "miles": 31, "garbage": 23540},
+    {"date": date(2014, 3, 3), "route": u"PAM61", "supervisor": u"Litson, Gary", "vehicle": u"07G161", "miles": 7, "garbage": 6480},
+    {"date": date(2014, 3, 4), "route": u"PAT60", "supervisor": u"Moreno, John", "vehicle": u"10G760", "miles": 23, "garbage": 22820},
+    {"date": date(2014, 4, 1), "route": u"PAM60", "supervisor": u"Litson, Gary", "vehicle": u"10G760", "miles": 20, "garbage": None},
+]
+
+##########################################################################
+## TestCases
+##########################################################################
+
+class PickupFrameTests(unittest.TestCase):
+
+    def setUp(self):
+        self.frame = PickupFrame.from_records(RECORDS)
+
+    def test_columns(self):
+        """
+        Assert records are encoded into columns
+        """
+        self.assertEqual(len(self.frame), 4)
+        self.assertEqual(list(self.frame.routes), [u"PAM60", u"PAM61", u"PAT60"])
+        self.assertEqual(list(self.frame.route), [0, 1, 2, 0])
+        self.assertEqual(self.frame.date[0], (date(2014, 3, 3) - date(1970, 1, 1)).days)
+        self.assertTrue(np.isnan(self.frame.garbage[3]))
+
+    def test_where(self):
+        """
+        Assert vectorized filtering
+        """
+        self.assertEqual(len(self.frame.where(start=date(2014, 3, 4))), 2)
+        self.assertEqual(len(self.frame.where(end=date(2014, 3, 3))), 2)
+        self.assertEqual(len(self.frame.where(routes=[u"PAM60"])), 2)
+        self.assertEqual(len(self.frame.where(supervisor=u"Moreno, John")), 1)
+        self.assertEqual(len(self.frame.where(vehicles=[u"10G760"])), 3)
+
+    def test_groupby(self):
+        """
+        Assert group by reductions ignore missing values
+        """
+        labels, values = self.frame.groupby('route')
+        self.assertEqual(list(values), [23540, 6480, 22820])
+
+        labels, values = self.frame.groupby('supervisor', 'miles', 'mean')
+        self.assertEqual(list(labels), [u"Litson, Gary", u"Moreno, John"])
+        self.assertEqual(list(values), [(31 + 7 + 20) / 3.0, 23])
+
+        labels, values = self.frame.groupby('month', how='count')
+        self.assertEqual([str(label) for label in labels], ["2014-03-01", "2014-04-01"])
+        self.assertEqual(list(values), [3, 0])
+
+        labels, values = self.frame.groupby('week', 'miles', 'max')
+        self.assertEqual([str(label) for label in labels], ["2014-03-03", "2014-03-31"])
+        self.assertEqual(list(values), [31, 20])
+
+    def test_groupby_errors(self):
+        """
+        Assert unknown groups and reducers raise ValueError
+        """
+        with self.assertRaises(ValueError):
+            self.frame.groupby('year')
+        with self.assertRaises(ValueError):
+            self.frame.groupby('route', how='median')
+
+    def test_join_locations(self):
+        """
+        Assert route locations are joined onto pickups
+        """
+        joined = self.frame.join_locations({u"PAM60": 1073, u"PAT60": 1189})
+        self.assertEqual(list(joined.households()[[0, 2, 3]]), [1073, 1189, 1073])
+        self.assertTrue(np.isnan(joined.households()[1]))
+        self.assertTrue(np.isnan(self.frame.households()[0]))
+
+    def test_from_database(self):
+        """
+        Assert pickups are loaded from the database
+        """
+        engine  = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+
+        route = Route(name=u"PAM60", supervisor=u"Litson, Gary", locations=1073)
+        for record in RECORDS[:1] + RECORDS[3:]:
+            session.add(Pickup(route=route, date=record["date"], vehicle=record["vehicle"], miles=record["miles"], garbage=record["garbage"]))
+        session.commit()
+
+        frame = PickupFrame.from_database(session, start=date(2014, 3, 1))
+        self.assertEqual(len(frame), 2)
+        self.assertEqual(list(frame.households()), [1073, 1073])
+        self.assertEqual(len(PickupFrame.from_database(session, end=date(2014, 3, 31))), 1)
+        session.close()
@@ -0,0 +1,138 @@
+# tests.analytics_tests.rates_tests
+# Tests for the per-household solid waste rates
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Fri Aug 01 10:05:17 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: rates_tests.py [] benjamin@bengfort.com $
+
+"""
+Tests for the per-household solid waste rates
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import os
+import tempfile
+import unittest
+import numpy as np
+
+from datetime import date
+from benchmarks.generate import generate_frame
+from zerocycle.analytics.frame import *
+from zerocycle.analytics.rates import *
+
+##########################################################################
+## Fixtures
+##########################################################################
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "..", "fixtures")
+ACCOUNTS = os.path.join(FIXTURES, "accounts.csv")
+
+RECORDS  = [
+    {"date": date(2014, 3, 3), "route": u"PAM60", "supervisor": u"Litson, Gary", "vehicle": u"10G760", "miles": 31, "garbage": 20000},
+    {"date": date(2014, 3, 3), "route": u"PAM61", "supervisor": u"Litson, Gary", "vehicle": u"07G161", "miles": 7, "garbage": 6000},
+    {"date": date(2014, 3, 4), "route": u"PAT60", "supervisor": u"Moreno, John", "vehicle": u"10G760", "miles": 23, "garbage": 9000},
+    {"date": date(2014, 3, 10), "route": u"PAM60", "supervisor": u"Litson, Gary", "vehicle": u"10G760", "miles": 20, "garbage": 30000},
+    {"date": date(2014, 4, 1), "route": u"PAM60", "supervisor": u"Litson, Gary", "vehicle": u"10G760", "miles": 20, "garbage": None},
+]
+
+LOCATIONS = {u"PAM60": 1000, u"PAM61": 500, u"PAT60": 900}
+
+##########################################################################
+## TestCases
+##########################################################################
+
+class HouseholdRatesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.frame = PickupFrame.from_records(RECORDS).join_locations(LOCATIONS)
+
+    def test_route_rates(self):
+        """
+        Assert route rates are garbage per household per pickup
+        """
+        labels, rates = household_rates(self.frame, 'route')
+        self.assertEqual(list(labels), [u"PAM60", u"PAM61", u"PAT60"])
+        self.assertEqual(list(rates), [25.0, 12.0, 10.0])
+
+    def test_weighted_rates(self):
+        """
+        Assert supervisor and period rates weight routes by households
+        """
+        labels, rates = household_rates(self.frame, 'supervisor')
+        self.assertEqual(list(rates), [56000.0 / 2500, 10.0])
+
+        labels, rates = household_rates(self.frame, 'week')
+        self.assertEqual([str(label) for label in labels], ["2014-03-03", "2014-03-10"])
+        self.assertEqual(list(rates), [35000.0 / 2400, 30.0])
+
+        labels, rates = household_rates(self.frame, 'month')
+        self.assertEqual([str(label) for label in labels], ["2014-03-01"])
+
+    def test_unknown_locations(self):
+        """
+        Assert routes without locations are ignored
+        """
+        frame = PickupFrame.from_records(RECORDS).join_locations({u"PAT60": 900})
+        labels, rates = household_rates(frame, 'date')
+        self.assertEqual(list(rates), [10.0])
+        self.assertEqual(overall_rate(frame), 10.0)
+
+        frame = PickupFrame.from_records(RECORDS)
+        self.assertTrue(np.isnan(overall_rate(frame)))
+        labels, rates = household_rates(frame, 'supervisor')
+        self.assertTrue(np.isnan(rates).all())
+
+    def test_overall_rate(self):
+        """
+        Assert the overall rate over the whole frame
+        """
+        self.assertEqual(overall_rate(self.frame), 65000.0 / 3400)
+        self.assertEqual(overall_rate(self.frame, 'miles'), 101.0 / 4400)
+
+    def test_route_locations(self):
+        """
+        Assert route locations are read from an accounts report
+        """
+        locations = route_locations(ACCOUNTS)
+        self.assertTrue(len(locations) > 0)
+        for name, count in locations.items():
+            self.assertIsInstance(count, (int, long, np.integer))
+
+    def test_route_locations_missing(self):
+        """
+        Assert routes without service locations are left out
+        """
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, 'w') as data:
+            data.write("ROUTE NAME,SERVICE LOCATIONS\nPAM60,1000\nPAM61\nPAT60,900\n")
+
+        try:
+            locations = route_locations(path)
+        finally:
+            os.remove(path)
+
+        self.assertEqual(locations, {u"PAM60": 1000, u"PAT60": 900})
+        self.assertIsInstance(locations[u"PAM60"], np.integer)
+
+    def test_generated_frame(self):
+        """
+        Assert rates by every group over a generated frame
+        """
+        frame = generate_frame(routes=20, days=30, supervisors=4, vehicles=5)
+        self.assertEqual(len(frame), 600)
+
+        for by in GROUPS:
+            labels, rates = household_rates(frame, by)
+            self.assertEqual(len(labels), len(rates))
+            self.assertFalse(np.isnan(rates).any())
+
+        labels, rates = household_rates(frame, 'supervisor')
+        self.assertEqual(len(labels), 4)
+        self.assertAlmostEqual(overall_rate(frame), 20.0, delta=1.0)
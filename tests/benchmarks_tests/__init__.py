@@ -0,0 +1,18 @@
+# tests.benchmarks_tests
+# Tests for the benchmarks package
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Mon Aug 04 13:15:40 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: __init__.py [] benjamin@bengfort.com $
+
+"""
+Tests for the benchmarks package
+"""
+
+##########################################################################
+## Imports
+##########################################################################
@@ -0,0 +1,96 @@
+# tests.benchmarks_tests.generate_tests
+# Tests for the synthetic reports and the benchmark runner
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Mon Aug 04 13:17:02 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: generate_tests.py [] benjamin@bengfort.com $
+
+"""
+Tests for the synthetic reports and the benchmark runner
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+
+from datetime import date
+from benchmarks import generate, run
+from zerocycle.conf import settings
+from zerocycle.ingest.monthly import MonthlyReportReader
+from zerocycle.ingest.accounts import AccountsReportReader
+
+##########################################################################
+## TestCases
+##########################################################################
+
+class GenerateTests(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir  = tempfile.mkdtemp()
+        self.monthly  = os.path.join(self.workdir, "monthly.xls")
+        self.accounts = os.path.join(self.workdir, "accounts.csv")
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def test_monthly_report(self):
+        """
+        Assert the monthly report parses without unknown rows
+        """
+        pickups = generate.generate_monthly(self.monthly, routes=12, days=3, vehicles=2, supervisors=5)
+        self.assertEqual(pickups, 72)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            items = list(MonthlyReportReader(self.monthly).items())
+
+        self.assertEqual(len(items), 72)
+        self.assertEqual(len(set(item["route"] for item in items)), 12)
+        self.assertEqual(len(set(item["supervisor"] for item in items)), 5)
+        self.assertEqual(set(item["date"] for item in items), set([date(2014, 3, 3), date(2014, 3, 4), date(2014, 3, 5)]))
+        self.assertEqual(len(set((item["route"], item["date"], item["vehicle"]) for item in items)), 72)
+
+    def test_weekdays(self):
+        """
+        Assert pickups are only generated on weekdays
+        """
+        days = generate.weekdays(date(2014, 3, 6), 4)
+        self.assertEqual(days, [date(2014, 3, 6), date(2014, 3, 7), date(2014, 3, 10), date(2014, 3, 11)])
+
+    def test_accounts_report(self):
+        """
+        Assert the accounts export parses with every route
+        """
+        generate.generate_accounts(self.accounts, routes=30)
+        routes = list(AccountsReportReader(self.accounts))
+        self.assertEqual([route.name for route in routes], generate.route_names(30))
+        self.assertTrue(all(400 <= route.locations <= 1800 for route in routes))
+
+class RunTests(unittest.TestCase):
+
+    def test_run(self):
+        """
+        Assert results are reported and the database is restored
+        """
+        uri     = settings.get('database').uri
+        results = run.run(routes=10, days=2, repeat=1, names=["csv_reader", "monthly_reader", "ingest_accounts"])
+
+        self.assertEqual(settings.get('database').uri, uri)
+        self.assertEqual(results["scale"]["pickups"], 20)
+        self.assertEqual(results["benchmarks"].keys(), ["csv_reader", "monthly_reader", "ingest_accounts"])
+        self.assertEqual(results["benchmarks"]["monthly_reader"]["rows"], 20)
+        self.assertEqual(results["benchmarks"]["ingest_accounts"]["rows"], 10)
+
+        lines = run.compare(results, results)
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[1].endswith("1.00x"))
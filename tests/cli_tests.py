@@ -0,0 +1,113 @@
+# tests.cli_tests
+# Import time regression tests for the zerocycle admin script
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Wed Aug 06 09:12:50 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: cli_tests.py [] benjamin@bengfort.com $
+
+"""
+Import time regression tests for the zerocycle admin script
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import os
+import sys
+import imp
+import json
+import unittest
+import subprocess
+
+##########################################################################
+## Fixtures
+##########################################################################
+
+ROOT    = os.path.join(os.path.dirname(__file__), "..")
+SCRIPT  = os.path.join(ROOT, "bin", "zerocycle")
+
+## Dependencies that must not be imported unless a command needs them
+HEAVY   = ("sqlalchemy", "xlrd", "unicodecsv", "numpy", "yaml", "dateutil")
+
+def imported_after(statement):
+    """
+    Runs the statement in a fresh interpreter and returns the top level
+    packages that were imported by it.
+    """
+    program = (
+        "import sys, json\n"
+        "before = set(sys.modules)\n"
+        "%s\n"
+        "print json.dumps(sorted(set(name.split('.')[0] for name in set(sys.modules) - before)))\n"
+    ) % statement
+
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(ROOT))
+    output = subprocess.check_output([sys.executable, "-c", program], env=env)
+    return set(json.loads(output.splitlines()[-1]))
+
+##########################################################################
+## TestCases
+##########################################################################
+
+class ImportTimeTests(unittest.TestCase):
+
+    def test_cli_imports(self):
+        """
+        Assert the admin script imports no heavy dependencies
+        """
+        statement = "import imp; imp.load_source('zerocycle_cli', %r)" % SCRIPT
+        self.assertEqual(imported_after(statement) & set(HEAVY), set())
+
+    def test_conf_imports(self):
+        """
+        Assert the configuration is not parsed on import
+        """
+        statement = "from zerocycle.conf import settings; assert not settings.loaded"
+        self.assertNotIn("yaml", imported_after(statement))
+
+    def test_models_imports(self):
+        """
+        Assert the configuration is not parsed when the models are imported
+        """
+        for module in ("zerocycle.db.models", "zerocycle.ingest", "zerocycle.ingest.validate", "zerocycle.export"):
+            statement = "import %s; from zerocycle.conf import settings; assert not settings.loaded" % module
+            self.assertNotIn("yaml", imported_after(statement))
+
+    def test_ingest_imports(self):
+        """
+        Assert the readers are only imported when they are looked up
+        """
+        readers = ("xlrd", "unicodecsv", "numpy")
+        self.assertEqual(imported_after("import zerocycle.ingest") & set(readers), set())
+
+        statement = "import zerocycle.ingest; zerocycle.ingest.READERS['MONTHLY']"
+        self.assertEqual(imported_after(statement) & set(readers), set(readers))
+
+    def test_cli_defaults(self):
+        """
+        Assert the defaults repeated by the admin script are up to date
+        """
+        from zerocycle.ingest.bulk import DEFAULT_BATCH_SIZE
+        from zerocycle.ingest.pipeline import DEFAULT_QUEUE_DEPTH
+        from zerocycle.analytics.frame import GROUPS
+
+        cli = imp.load_source("zerocycle_cli", SCRIPT)
+        self.assertEqual(cli.BATCH_SIZE, DEFAULT_BATCH_SIZE)
+        self.assertEqual(cli.QUEUE_DEPTH, DEFAULT_QUEUE_DEPTH)
+        self.assertEqual(cli.RATE_GROUPS, GROUPS)
+
+        from zerocycle import export
+        self.assertEqual(cli.EXPORT_TABLES, export.TABLES)
+        self.assertEqual(cli.EXPORT_FORMATS, export.FORMATS)
+        self.assertEqual(cli.EXPORT_CHUNK_SIZE, export.CHUNK_SIZE)
+
+        from zerocycle.service import DEFAULT_CACHE_SIZE
+        self.assertEqual(cli.SERVICE_CACHE_SIZE, DEFAULT_CACHE_SIZE)
+
+        from zerocycle.ingest import READERS
+        self.assertEqual(sorted(cli.REPORT_TYPES), sorted(name.lower() for name in READERS))
@@ -47,6 +47,9 @@ class ConfigurationTests(unittest.TestCase):
         self.original_conf_paths = copy(Configuration.CONF_PATHS)
         Configuration.CONF_PATHS = []
 
+        self.original_cache_path = Configuration.CACHE_PATH
+        Configuration.CACHE_PATH = tempfile.mktemp(suffix=".cache")
+
         self.config_file = tempfile.NamedTemporaryFile(suffix=".yaml", delete=False).name
         with open(self.config_file, "w") as conf:
             yaml.dump(self.FIXTURE, conf, default_flow_style=False)
@@ -55,6 +58,10 @@ class ConfigurationTests(unittest.TestCase):
         Configuration.CONF_PATHS = self.original_conf_paths
         os.remove(self.config_file)
 
+        if os.path.exists(Configuration.CACHE_PATH):
+            os.remove(Configuration.CACHE_PATH)
+        Configuration.CACHE_PATH = self.original_cache_path
+
     def test_search_path(self):
         """
         Assert there are directories to search for a configuration
@@ -183,6 +190,71 @@ class ConfigurationTests(unittest.TestCase):
             config = TestConfiguration.load()
             self.assertTrue(config["notanopt"])
 
+    def test_load_cache(self):
+        """
+        Assert loaded YAML is cached until the file changes
+        """
+        Configuration.CONF_PATHS.append(self.config_file)
+        os.utime(self.config_file, (1400000000, 1400000000))
+        self.assertEqual(TestConfiguration.load()["myprop"], "Allen")
+        self.assertTrue(os.path.exists(Configuration.CACHE_PATH))
+
+        # The cache is used while the file's mtime and size are unchanged
+        with open(self.config_file, "w") as conf:
+            yaml.dump(dict(self.FIXTURE, myprop="Bobby"), conf, default_flow_style=False)
+        os.utime(self.config_file, (1400000000, 1400000000))
+        self.assertEqual(TestConfiguration.load()["myprop"], "Allen")
+        self.assertEqual(TestConfiguration.load(cache=False)["myprop"], "Bobby")
+
+        os.utime(self.config_file, (1400000010, 1400000010))
+        self.assertEqual(TestConfiguration.load()["myprop"], "Bobby")
+
+    def test_unreadable_cache(self):
+        """
+        Assert a corrupt cache is parsed again
+        """
+        Configuration.CONF_PATHS.append(self.config_file)
+        with open(Configuration.CACHE_PATH, "w") as cache:
+            cache.write("not a pickle")
+
+        self.assertEqual(TestConfiguration.load()["myprop"], "Allen")
+
+    def test_copy(self):
+        """
+        Assert copies do not share nested configurations
+        """
+        config = TestConfiguration.load()
+        level  = config.get("nested").get("level")
+        other  = config.copy()
+        other.configure({"anoption": 7, "nested": {"level": "roof"}})
+
+        self.assertEqual(config["anoption"], 42)
+        self.assertEqual(config.get("nested").get("level"), level)
+        self.assertEqual(other.get("nested").get("level"), "roof")
+
+    def test_snapshot(self):
+        """
+        Check the lookups of a flattened snapshot
+        """
+        config   = TestConfiguration.load()
+        nested   = config.get("nested")
+        snapshot = config.snapshot()
+
+        self.assertTrue(snapshot["mysetting"])
+        self.assertTrue(snapshot["MYSETTING"])
+        self.assertEqual(snapshot["nested.level"], nested["level"])
+        self.assertEqual(snapshot["nested.nested.level"], nested.get("nested")["level"])
+        self.assertEqual(snapshot["nested"]["level"], nested["level"])
+        self.assertEqual(snapshot.nested.nested.level, nested.get("nested")["level"])
+        self.assertEqual(snapshot.get("notanopt", 1), 1)
+        self.assertEqual(set(snapshot), set(dict(TestConfiguration().options())))
+
+        with self.assertRaises(KeyError):
+            snapshot["notanopt"]
+
+        with self.assertRaises(TypeError):
+            snapshot.mysetting = False
+
     @unittest.skip
     def test_configure_back_to_empty(self):
         """
@@ -208,6 +280,30 @@ class DatabaseConfigurationTests(unittest.TestCase):
         Test the construction of the URI in the database config
         """
         self.assertEqual(settings.get('database').uri, "postgresql://postgres:@127.0.0.1:5432/zerocycle")
+        self.assertEqual(settings['database.uri'], "postgresql://postgres:@127.0.0.1:5432/zerocycle")
+
+class SettingsTests(unittest.TestCase):
+    """
+    Tests for overriding the immutable settings
+    """
+
+    def test_immutable(self):
+        """
+        Assert the settings cannot be assigned to
+        """
+        with self.assertRaises(TypeError):
+            settings.debug = False
+
+    def test_overridden(self):
+        """
+        Assert overrides are applied and then restored
+        """
+        with settings.overridden({"debug": False}, database={"scheme": "sqlite", "name": "/tmp/test.db"}):
+            self.assertFalse(settings["debug"])
+            self.assertEqual(settings["database.uri"], "sqlite:////tmp/test.db")
+
+        self.assertTrue(settings["debug"])
+        self.assertEqual(settings["database.uri"], "postgresql://postgres:@127.0.0.1:5432/zerocycle")
 
 ##########################################################################
 ## Mock Configurations
@@ -0,0 +1,203 @@
+# tests.db_tests.managers_tests
+# Tests for the model managers and their aggregations
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Sat Aug 02 10:31:26 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: managers_tests.py [] benjamin@bengfort.com $
+
+"""
+Tests for the model managers and their aggregations
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import unittest
+
+from datetime import date
+from sqlalchemy import create_engine, event, func
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.dialects import postgresql
+from zerocycle.db.models import *
+from zerocycle.db.managers import *
+
+##########################################################################
+## TestCases
+##########################################################################
+
+class AggregateTests(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+
+        litson = Route(name=u"PAM60", supervisor=u"Litson, Gary", locations=1000)
+        moreno = Route(name=u"PAT60", supervisor=u"Moreno, John", locations=900)
+        self.session.add_all([
+            Pickup(route=litson, date=date(2014, 3, 3), vehicle=u"10G760", miles=30, garbage=20000),
+            Pickup(route=litson, date=date(2014, 3, 9), vehicle=u"10G760", miles=10, garbage=10000),
+            Pickup(route=litson, date=date(2014, 4, 1), vehicle=u"07G161", miles=20, garbage=None),
+            Pickup(route=moreno, date=date(2014, 3, 10), vehicle=u"10G760", miles=25, garbage=9000),
+        ])
+        self.session.commit()
+        self.manager = PickupsManager()
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_totals(self):
+        """
+        Assert ungrouped aggregates over the table
+        """
+        self.assertEqual(self.manager.aggregate(self.session, 'garbage'), [(39000,)])
+        self.assertEqual(self.manager.aggregate(self.session, 'garbage', 'count'), [(3,)])
+        self.assertEqual(self.manager.aggregate(self.session, ('miles', 'garbage'), 'max'), [(30, 20000)])
+
+    def test_group_by_bucket(self):
+        """
+        Assert monthly and weekly totals come from date buckets
+        """
+        result = self.manager.aggregate(self.session, 'garbage', by='month')
+        self.assertEqual(result, [(date(2014, 3, 1), 39000), (date(2014, 4, 1), None)])
+        self.assertEqual(result[0].month, date(2014, 3, 1))
+        self.assertEqual(result[0].garbage, 39000)
+
+        result = self.manager.aggregate(self.session, 'miles', by='week')
+        self.assertEqual(result, [(date(2014, 3, 3), 40), (date(2014, 3, 10), 25), (date(2014, 3, 31), 20)])
+
+    def test_group_by_related(self):
+        """
+        Assert grouping by route, supervisor and vehicle
+        """
+        result = self.manager.aggregate(self.session, 'garbage', 'avg', by='supervisor')
+        self.assertEqual(result, [(u"Litson, Gary", 15000), (u"Moreno, John", 9000)])
+
+        result = self.manager.aggregate(self.session, 'miles', by=('route', 'vehicle'))
+        self.assertEqual(result, [(u"PAM60", u"07G161", 20), (u"PAM60", u"10G760", 40), (u"PAT60", u"10G760", 25)])
+
+    def test_filters(self):
+        """
+        Assert date ranges and group filters
+        """
+        result = self.manager.aggregate(self.session, 'garbage', start=date(2014, 3, 5), end=date(2014, 3, 31))
+        self.assertEqual(result, [(19000,)])
+
+        result = self.manager.aggregate(self.session, 'miles', by='month', route=u"PAM60")
+        self.assertEqual(result, [(date(2014, 3, 1), 40), (date(2014, 4, 1), 20)])
+
+        result = self.manager.aggregate(self.session, 'miles', supervisor=[u"Moreno, John"], vehicle=u"10G760")
+        self.assertEqual(result, [(25,)])
+
+    def test_routes_manager(self):
+        """
+        Assert aggregation of the routes table
+        """
+        result = RoutesManager().aggregate(self.session, 'locations', by='supervisor')
+        self.assertEqual(result, [(u"Litson, Gary", 1000), (u"Moreno, John", 900)])
+
+    def test_single_query(self):
+        """
+        Assert the aggregation compiles to one GROUP BY statement
+        """
+        query = self.manager.aggregates(self.session, 'garbage', by=('month', 'route'))
+        sql   = str(query.statement.compile(dialect=postgresql.dialect()))
+        self.assertEqual(sql.count("SELECT"), 1)
+        self.assertIn("GROUP BY", sql)
+        self.assertIn("date_trunc", sql)
+
+    def test_errors(self):
+        """
+        Assert unknown reductions and groups raise ValueError
+        """
+        with self.assertRaises(ValueError):
+            self.manager.aggregate(self.session, 'garbage', 'median')
+        with self.assertRaises(ValueError):
+            self.manager.aggregate(self.session, 'garbage', by='decade')
+        with self.assertRaises(ValueError):
+            self.manager.aggregate(self.session, 'garbage', by='route_id_typo')
+
+class GetOrCreateManyTests(unittest.TestCase):
+
+    def setUp(self):
+        self.engine  = create_engine("sqlite://")
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        self.session.add_all([
+            Route(name=u"PAM60", supervisor=u"Litson, Gary"),
+            Route(name=u"PAT60", supervisor=u"Moreno, John"),
+        ])
+        self.session.commit()
+
+        self.queries = []
+        event.listen(self.engine, 'before_cursor_execute', self.count_query)
+
+    def tearDown(self):
+        event.remove(self.engine, 'before_cursor_execute', self.count_query)
+        self.session.close()
+
+    def count_query(self, conn, cursor, statement, parameters, context, executemany):
+        self.queries.append(statement)
+
+    def test_routes(self):
+        """
+        Assert routes are fetched or created in the order of the names
+        """
+        names   = [u"PAT60", u"PAX01", u"PAM60", u"PAX01"]
+        results = RoutesManager().get_or_create_many(self.session, names, defaults={'locations': 10})
+
+        self.assertEqual([route.name for route, created in results], names)
+        self.assertEqual([created for route, created in results], [False, True, False, False])
+        self.assertIs(results[1][0], results[3][0])
+        self.assertEqual(results[1][0].locations, 10)
+        self.assertEqual(results[0][0].supervisor, u"Moreno, John")
+        self.assertEqual(len(self.queries), 1)
+
+    def test_chunks(self):
+        """
+        Assert one query is issued per chunk of keys
+        """
+        names   = [u"R%03i" % idx for idx in xrange(25)] + [u"PAM60"]
+        results = RoutesManager().get_or_create_many(self.session, names, chunk_size=10)
+        self.assertEqual(sum(created for route, created in results), 25)
+        self.assertEqual(len(self.queries), 3)
+
+    def test_compound_keys(self):
+        """
+        Assert keys of several fields are matched together
+        """
+        keys = [
+            {'name': u"PAM60", 'supervisor': u"Litson, Gary"},
+            {'name': u"PAT60", 'supervisor': u"Litson, Gary"},
+        ]
+        results = Manager(Route).get_or_create_many(self.session, keys)
+        self.assertEqual([created for route, created in results], [False, True])
+        self.assertEqual(len(self.queries), 1)
+
+    def test_invalid_keys(self):
+        """
+        Assert empty keys and expressions are refused
+        """
+        manager = Manager(Route)
+        with self.assertRaises(ValueError):
+            manager.get_or_create_many(self.session, [{'name': u"PAM60"}, {}])
+
+        with self.assertRaises(ValueError):
+            manager.get_or_create_many(self.session, [{'name': func.upper(u"pam60")}])
+        self.assertEqual(self.queries, [])
+
+    def test_get_or_create(self):
+        """
+        Assert the batch agrees with get_or_create
+        """
+        manager = RoutesManager()
+        for name in (u"PAM60", u"PAX02"):
+            single = manager.get_or_create(self.session, name)
+            many   = manager.get_or_create_many(self.session, [name])[0]
+            self.assertEqual(single[1], many[1])
+            self.assertEqual(single[0].name, many[0].name)
@@ -17,8 +17,12 @@ Test the models described using declarative base.
 ## Imports
 ##########################################################################
 
+import os
+import tempfile
 import unittest
+import threading
 
+from sqlalchemy import event, MetaData, Table, Column, Integer
 from zerocycle.db.models import *
 
 ##########################################################################
@@ -36,3 +40,162 @@ class ConnectionTests(unittest.TestCase):
         """
         engine = get_engine()
         self.assertEqual(str(engine.url), "postgresql://postgres:@127.0.0.1:5432/zerocycle")
+
+    def test_engine_pool(self):
+        """
+        Check that the pool settings are applied to the engine
+        """
+        engine = get_engine()
+        self.assertEqual(engine.pool.size(), 5)
+        self.assertEqual(engine.pool._max_overflow, 10)
+        self.assertEqual(engine.pool._recycle, 3600)
+
+        engine = get_engine(pool_size=2, pool_recycle=-1)
+        self.assertEqual(engine.pool.size(), 2)
+        self.assertEqual(engine.pool._recycle, -1)
+
+    def test_sqlite_engine(self):
+        """
+        Check that pool sizes are not passed to sqlite engines
+        """
+        engine = get_engine("sqlite://")
+        self.assertEqual(engine.url.drivername, "sqlite")
+
+    def test_pre_ping(self):
+        """
+        Check that pre-ping tests connections on checkout
+        """
+        with settings.overridden(database={'pool_pre_ping': True}):
+            engine = get_engine("sqlite://")
+
+        self.assertTrue(event.contains(engine, 'checkout', ping_connection))
+        self.assertEqual(engine.execute("SELECT 2").scalar(), 2)
+
+class TimestampTests(unittest.TestCase):
+    """
+    Tests for the created and updated timestamp columns
+    """
+
+    def test_local_timestamps(self):
+        """
+        Check timestamps default to the local time in Python
+        """
+        column = timestamp(onupdate=True, server=False)
+        self.assertTrue(column.default.is_callable)
+        self.assertTrue(column.onupdate.is_callable)
+        self.assertIsNone(column.server_default)
+
+    def test_server_timestamps(self):
+        """
+        Check server timestamps are stamped by the database
+        """
+        created = timestamp(server=True)
+        updated = timestamp(onupdate=True, server=True)
+        created.name = created.key = "created"
+        updated.name = updated.key = "updated"
+
+        table = Table("stamped", MetaData(), Column("id", Integer, primary_key=True), created, updated)
+        self.assertIsNone(table.c.created.default)
+        self.assertTrue(table.c.updated.onupdate.is_clause_element)
+
+        engine = get_engine("sqlite://")
+        table.create(engine)
+        engine.execute(table.insert(), [{"id": 1}, {"id": 2}])
+        engine.execute(table.update().where(table.c.id == 2))
+
+        for row in engine.execute(table.select()):
+            self.assertIsNotNone(row.created)
+            self.assertIsNotNone(row.updated)
+
+    def test_use_server_timestamps(self):
+        """
+        Check timestamps that follow the setting can be switched
+        """
+        created = timestamp()
+        updated = timestamp(onupdate=True)
+        local   = timestamp(server=False)
+        for name, column in (("created", created), ("updated", updated), ("local", local)):
+            column.name = column.key = name
+
+        metadata = MetaData()
+        table    = Table("stamped", metadata, Column("id", Integer, primary_key=True), created, updated, local)
+        self.assertTrue(table.c.created.default.is_callable)
+        self.assertIsNone(table.c.created.server_default)
+
+        use_server_timestamps(metadata)
+        self.assertIsNone(table.c.created.default)
+        self.assertIsNotNone(table.c.created.server_default)
+        self.assertTrue(table.c.updated.onupdate.is_clause_element)
+        self.assertTrue(table.c.local.default.is_callable)
+
+        engine = get_engine("sqlite://")
+        table.create(engine)
+        engine.execute(table.insert(), [{"id": 1}])
+        row = engine.execute(table.select()).first()
+        self.assertIsNotNone(row.created)
+        self.assertIsNotNone(row.updated)
+
+class SessionFactoryTests(unittest.TestCase):
+    """
+    Tests for the lazily created engine and sessions
+    """
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.factory = SessionFactory("sqlite:///" + self.path)
+
+    def tearDown(self):
+        self.factory.dispose()
+        os.remove(self.path)
+
+    def test_sessions(self):
+        """
+        Check that plain sessions are new and share an engine
+        """
+        first, second = self.factory(), self.factory()
+        self.assertIsNot(first, second)
+        self.assertIs(first.get_bind(), second.get_bind())
+
+    def test_scoped_sessions(self):
+        """
+        Check that scoped sessions are local to a thread
+        """
+        session = self.factory(scoped=True)
+        self.assertIs(session, self.factory(scoped=True))
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(self.factory(scoped=True)))
+        thread.start()
+        thread.join()
+        self.assertIsNot(session, other[0])
+
+        self.factory.remove()
+        self.assertIsNot(session, self.factory(scoped=True))
+
+    def test_threaded_initialization(self):
+        """
+        Check that threads racing to create the engine share one
+        """
+        engines = []
+        threads = [threading.Thread(target=lambda: engines.append(self.factory().get_bind())) for idx in xrange(8)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        self.assertEqual(len(set(map(id, engines))), 1)
+
+    def test_dispose(self):
+        """
+        Check that dispose forgets the engine
+        """
+        engine = self.factory().get_bind()
+        self.factory.dispose()
+        self.assertIsNone(self.factory.engine)
+        self.assertIsNot(self.factory().get_bind(), engine)
+
+    def test_fork(self):
+        """
+        Check that a forked process creates its own engine
+        """
+        engine = self.factory().get_bind()
+        self.factory.pid = -1   # pretend to be in another process
+        self.assertIsNot(self.factory().get_bind(), engine)
@@ -0,0 +1,186 @@
+# tests.db_tests.rollups_tests
+# Tests for the maintenance of the rollup tables
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Sun Aug 03 16:40:51 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: rollups_tests.py [] benjamin@bengfort.com $
+
+"""
+Tests for the maintenance of the rollup tables
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import unittest
+
+from datetime import date
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from zerocycle.db import rollups
+from zerocycle.db.models import *
+from zerocycle.db.managers import PickupsManager, MonthlyRollupsManager, DailyRollupsManager
+
+##########################################################################
+## TestCases
+##########################################################################
+
+class RollupsTests(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.factory = sessionmaker(bind=engine)
+        self.session = self.factory()
+
+        self.litson  = Route(name=u"PAM60", supervisor=u"Litson, Gary", locations=1000)
+        self.moreno  = Route(name=u"PAT60", supervisor=u"Moreno, John", locations=900)
+        self.pickups = [
+            Pickup(route=self.litson, date=date(2014, 3, 3), vehicle=u"10G760", miles=30, garbage=20000),
+            Pickup(route=self.litson, date=date(2014, 3, 3), vehicle=u"07G161", miles=10, garbage=None),
+            Pickup(route=self.moreno, date=date(2014, 3, 10), vehicle=u"10G760", miles=25, garbage=9000),
+            Pickup(route=self.moreno, date=date(2014, 4, 1), vehicle=u"10G760", miles=20, garbage=8000),
+        ]
+        self.session.add_all(self.pickups)
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def keys(self, pickups):
+        return set((pickup.route_id, pickup.date) for pickup in pickups)
+
+    def monthly(self):
+        return self.session.query(
+            MonthlyRollup.month, MonthlyRollup.supervisor, MonthlyRollup.pickups,
+            MonthlyRollup.miles, MonthlyRollup.garbage,
+        ).order_by(MonthlyRollup.month, MonthlyRollup.supervisor).all()
+
+    def test_next_month(self):
+        """
+        Assert the month helpers across a year boundary
+        """
+        self.assertEqual(rollups.month_of(date(2014, 12, 25)), date(2014, 12, 1))
+        self.assertEqual(rollups.next_month(date(2014, 12, 1)), date(2015, 1, 1))
+        self.assertEqual(rollups.next_month(date(2014, 3, 1)), date(2014, 4, 1))
+
+    def test_chunked(self):
+        """
+        Assert chunks of keys never span more than a month
+        """
+        keys   = [(1, date(2014, 1, 2)), (2, date(2014, 12, 30)), (1, date(2014, 1, 20)), (3, date(2014, 1, 5))]
+        chunks = list(rollups.chunked(keys, size=2))
+        self.assertEqual(chunks, [
+            [(1, date(2014, 1, 2)), (1, date(2014, 1, 20))],
+            [(3, date(2014, 1, 5))],
+            [(2, date(2014, 12, 30))],
+        ])
+
+    def test_update_rollups(self):
+        """
+        Assert daily and monthly rollups are created for touched keys
+        """
+        changed = rollups.update_rollups(self.session, self.keys(self.pickups[:3]))
+        self.assertEqual(changed, 2)
+        self.assertEqual(self.monthly(), [
+            (date(2014, 3, 1), u"Litson, Gary", 2, 40, 20000),
+            (date(2014, 3, 1), u"Moreno, John", 1, 25, 9000),
+        ])
+
+        daily = self.session.query(DailyRollup).filter_by(route_id=self.litson.id).one()
+        self.assertEqual((daily.pickups, daily.miles, daily.garbage), (2, 40, 20000))
+
+    def test_update_deltas(self):
+        """
+        Assert changed pickups are applied to the monthly rollups as deltas
+        """
+        rollups.update_rollups(self.session, self.keys(self.pickups))
+
+        self.pickups[1].garbage = 5000
+        self.session.delete(self.pickups[2])
+        self.moreno.supervisor = u"Litson, Gary"
+        self.session.flush()
+
+        changed = rollups.update_rollups(self.session, self.keys(self.pickups))
+        self.assertEqual(changed, 3)
+        self.assertEqual(self.monthly(), [
+            (date(2014, 3, 1), u"Litson, Gary", 2, 40, 25000),
+            (date(2014, 4, 1), u"Litson, Gary", 1, 20, 8000),
+        ])
+        self.assertEqual(self.session.query(DailyRollup).count(), 2)
+
+        self.assertEqual(rollups.update_rollups(self.session, self.keys(self.pickups)), 0)
+
+    def test_rebuild_rollups(self):
+        """
+        Assert rebuilding matches the incrementally maintained rollups
+        """
+        rollups.update_rollups(self.session, self.keys(self.pickups))
+        self.session.commit()
+        expected = self.monthly()
+
+        self.session.query(MonthlyRollup).update({'garbage': 0})
+        self.session.add(MonthlyRollup(month=date(2013, 1, 1), supervisor=u"", pickups=1))
+        self.session.commit()
+
+        create_session = rollups.create_session
+        rollups.create_session = self.factory
+        try:
+            result = list(rollups.rebuild_rollups())
+        finally:
+            rollups.create_session = create_session
+
+        self.assertEqual(result, [(date(2014, 3, 1), 2), (date(2014, 4, 1), 1)])
+        self.session.expire_all()
+        self.assertEqual(self.monthly(), expected)
+
+    def test_supervisor_change(self):
+        """
+        Assert a route that changes supervisor matches a rebuild
+        """
+        rollups.update_rollups(self.session, self.keys(self.pickups))
+        self.session.commit()
+
+        # A later report moves PAT60 to Litson, touching only its April pickup
+        self.moreno.supervisor = u"Litson, Gary"
+        self.pickups[3].garbage = 8500
+        self.session.flush()
+
+        changed = rollups.update_rollups(self.session, self.keys(self.pickups[3:]))
+        self.session.commit()
+        self.assertEqual(changed, 2)
+        incremental = self.monthly()
+        self.assertEqual(incremental, [
+            (date(2014, 3, 1), u"Litson, Gary", 3, 65, 29000),
+            (date(2014, 4, 1), u"Litson, Gary", 1, 20, 8500),
+        ])
+
+        create_session = rollups.create_session
+        rollups.create_session = self.factory
+        try:
+            list(rollups.rebuild_rollups())
+        finally:
+            rollups.create_session = create_session
+
+        self.session.expire_all()
+        self.assertEqual(self.monthly(), incremental)
+
+        result = PickupsManager().aggregate(self.session, 'garbage', by=['month', 'supervisor'])
+        self.assertEqual([tuple(row) for row in result], [(month, supervisor, garbage) for month, supervisor, pickups, miles, garbage in incremental])
+
+    def test_rollup_managers(self):
+        """
+        Assert the rollups are aggregated through managers
+        """
+        rollups.update_rollups(self.session, self.keys(self.pickups))
+
+        result = MonthlyRollupsManager().aggregate(self.session, 'garbage', by='month')
+        self.assertEqual(result, [(date(2014, 3, 1), 29000), (date(2014, 4, 1), 8000)])
+
+        result = DailyRollupsManager().aggregate(self.session, 'garbage', by='route', end=date(2014, 3, 31))
+        self.assertEqual(result, [(u"PAM60", 20000), (u"PAT60", 9000)])
@@ -0,0 +1,143 @@
+# tests.export_tests
+# Tests for the streaming export of pickups and routes
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Thu Aug 07 11:02:15 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: export_tests.py [] benjamin@bengfort.com $
+
+"""
+Tests for the streaming export of pickups and routes
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import os
+import gzip
+import json
+import tempfile
+import unittest
+
+from datetime import date, datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from zerocycle.db.models import *
+from zerocycle.export import *
+
+##########################################################################
+## Fixtures
+##########################################################################
+
+class Output(object):
+    """
+    Collects the strings written to it, like a file.
+    """
+
+    def __init__(self):
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append(data)
+
+    def getvalue(self):
+        return "".join(self.writes)
+
+##########################################################################
+## TestCases
+##########################################################################
+
+class ExportTests(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+
+        stamp  = datetime(2014, 4, 1, 8, 30)
+        routes = [
+            Route(name=u"PAM01", supervisor=u"Litson, Gary", locations=1204, created=stamp, updated=stamp),
+            Route(name=u"PAT02", supervisor=u"Ruiz, Ana", locations=873, created=stamp, updated=stamp),
+        ]
+        for route in routes:
+            for day in xrange(3, 8):
+                pickup = Pickup(date=date(2014, 3, day), vehicle=u"10G760", miles=day, garbage=day * 100, created=stamp, updated=stamp)
+                pickup.route = route
+                self.session.add(pickup)
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_export_csv(self):
+        """
+        Assert pickups are exported as CSV with a header
+        """
+        out   = Output()
+        count = export(self.session, "pickups", out)
+        lines = out.getvalue().splitlines()
+
+        self.assertEqual(count, 10)
+        self.assertEqual(len(lines), 11)
+        self.assertEqual(lines[0], "date,route,supervisor,vehicle,miles,garbage,created,updated")
+        self.assertEqual(lines[1], '2014-03-03,PAM01,"Litson, Gary",10G760,3,300,2014-04-01T08:30:00,2014-04-01T08:30:00')
+
+    def test_export_jsonl(self):
+        """
+        Assert routes are exported as JSON Lines
+        """
+        out   = Output()
+        count = export(self.session, "routes", out, "jsonl")
+        rows  = [json.loads(line) for line in out.getvalue().splitlines()]
+
+        self.assertEqual(count, 2)
+        self.assertEqual(rows[1], {
+            "name": "PAT02", "supervisor": "Ruiz, Ana", "locations": 873,
+            "created": "2014-04-01T08:30:00", "updated": "2014-04-01T08:30:00",
+        })
+
+    def test_filters(self):
+        """
+        Assert pickups are filtered by date, route and supervisor
+        """
+        out = Output()
+        self.assertEqual(export(self.session, "pickups", out, start=date(2014, 3, 4), end=date(2014, 3, 5)), 4)
+        self.assertEqual(export(self.session, "pickups", out, routes=[u"PAM01"]), 5)
+        self.assertEqual(export(self.session, "pickups", out, supervisors=[u"Ruiz, Ana"], end=date(2014, 3, 3)), 1)
+        self.assertEqual(export(self.session, "routes", out, supervisors=[u"Nobody"]), 0)
+
+        with self.assertRaises(ValueError):
+            export(self.session, "routes", out, start=date(2014, 3, 4))
+
+        with self.assertRaises(ValueError):
+            export(self.session, "reports", out)
+
+    def test_chunked_writes(self):
+        """
+        Assert rows are fetched and written a chunk at a time
+        """
+        chunks = list(stream_rows(self.session, export_query("pickups"), chunk_size=4))
+        self.assertEqual([len(rows) for rows in chunks], [4, 4, 2])
+
+        out = Output()
+        export(self.session, "pickups", out, header=False, chunk_size=4)
+        self.assertEqual(len(out.writes), 3)
+
+    def test_gzip_output(self):
+        """
+        Assert outputs ending with .gz are compressed
+        """
+        fd, path = tempfile.mkstemp(suffix=".jsonl.gz")
+        os.close(fd)
+        try:
+            with open_output(path) as out:
+                export(self.session, "pickups", out, "jsonl")
+
+            with gzip.open(path) as data:
+                self.assertEqual(len(data.read().splitlines()), 10)
+        finally:
+            os.remove(path)
@@ -0,0 +1,18 @@
+# tests.ingest_tests
+# Tests for the ingestion module
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Mon Jul 21 09:40:12 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: __init__.py [] benjamin@bengfort.com $
+
+"""
+Tests for the ingestion module
+"""
+
+##########################################################################
+## Imports
+##########################################################################
@@ -0,0 +1,224 @@
+# tests.ingest_tests.base_tests
+# Tests for the base report readers
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Tue Jul 22 11:02:18 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: base_tests.py [] benjamin@bengfort.com $
+
+"""
+Tests for the base report readers
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import os
+import tempfile
+import unittest
+import warnings
+import numpy as np
+
+from datetime import datetime
+
+from zerocycle.exceptions import *
+from zerocycle.ingest.base import *
+from zerocycle.ingest.accounts import AccountsReportReader
+
+##########################################################################
+## Fixtures
+##########################################################################
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "..", "fixtures")
+MONTHLY  = os.path.join(FIXTURES, "march2014.xls")
+ACCOUNTS = os.path.join(FIXTURES, "accounts.csv")
+
+##########################################################################
+## TestCases
+##########################################################################
+
+class ReportReaderTests(unittest.TestCase):
+
+    def test_report_not_found(self):
+        """
+        Assert a missing report raises ReportNotFound
+        """
+        with self.assertRaises(ReportNotFound):
+            ReportReader(os.path.join(FIXTURES, "notareport.xls"))
+
+class ExcelReportReaderTests(unittest.TestCase):
+
+    def test_rows(self):
+        """
+        Assert all rows of every sheet are read
+        """
+        rows = list(ExcelReportReader(MONTHLY).rows())
+        self.assertEqual(len(rows), 1355)
+        self.assertTrue(all(len(row) == 5 for row in rows))
+
+    def test_normalize_text(self):
+        """
+        Assert text cells are stripped of whitespace
+        """
+        row = next(ExcelReportReader(MONTHLY).rows())
+        self.assertEqual(row[0], u"Supervisor Daily Report")
+
+    def test_normalize_empty(self):
+        """
+        Assert empty cells are replaced with None
+        """
+        rows = ExcelReportReader(MONTHLY).rows()
+        next(rows)
+        self.assertEqual(next(rows), [None] * 5)
+
+    def test_normalize_numbers(self):
+        """
+        Assert number cells are left alone
+        """
+        reader = ExcelReportReader(MONTHLY)
+        row    = reader.normalize_row([0, 1, 1, 2, 4], [u"", u" PAM60 ", u"10G760", 31.0, 1])
+        self.assertEqual(row, [None, u"PAM60", u"10G760", 31.0, True])
+
+    def test_normalize_dates(self):
+        """
+        Assert date cells are converted with the workbook datemode
+        """
+        reader = ExcelReportReader(MONTHLY)
+        row    = reader.normalize_row([1, 3], [u"Daily Date: ", 41701.0])
+        self.assertEqual(row, [u"Daily Date:", datetime(2014, 3, 3)])
+
+        reader.datemode = 1
+        row    = reader.normalize_row([1, 3], [u"Daily Date: ", 40239.0])
+        self.assertEqual(row, [u"Daily Date:", datetime(2014, 3, 3)])
+
+class CSVReportReaderTests(unittest.TestCase):
+
+    def test_rows_header(self):
+        """
+        Assert rows are dictionaries when there is a header
+        """
+        rows = list(CSVReportReader(ACCOUNTS, header=True).rows())
+        self.assertEqual(len(rows), 183)
+        self.assertEqual(rows[0]["ROUTE NAME"], u"PAM01")
+
+    def test_rows_no_header(self):
+        """
+        Assert rows are lists when there is no header
+        """
+        rows = list(CSVReportReader(ACCOUNTS).rows())
+        self.assertEqual(len(rows), 184)
+        self.assertEqual(rows[1], [u"PAM01", u"1204"])
+
+    def test_chunks(self):
+        """
+        Assert columnar chunks cover every row of the file
+        """
+        reader = CSVReportReader(ACCOUNTS, header=True)
+        chunks = list(reader.chunks(chunksize=50))
+        self.assertEqual([len(chunk["ROUTE NAME"]) for chunk in chunks], [50, 50, 50, 33])
+        self.assertEqual(chunks[0]["ROUTE NAME"][0], u"PAM01")
+
+    def test_chunks_dtypes(self):
+        """
+        Assert chunk columns are converted to their declared types
+        """
+        chunk  = next(AccountsReportReader(ACCOUNTS).chunks())
+        self.assertEqual(chunk["SERVICE LOCATIONS"].dtype.name, "int64")
+        self.assertEqual(chunk["SERVICE LOCATIONS"][0], 1204)
+        self.assertEqual(chunk["ROUTE NAME"].dtype.name, "object")
+
+    def test_chunks_ragged_rows(self):
+        """
+        Assert short rows are padded rather than truncating the chunk
+        """
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, 'w') as data:
+            data.write("A,B,C\n1,2,3\n4,5\n6,7,8\n")
+
+        try:
+            chunk = next(CSVReportReader(path, header=True).chunks())
+        finally:
+            os.remove(path)
+
+        self.assertEqual(sorted(chunk.keys()), ["A", "B", "C"])
+        self.assertEqual(list(chunk["C"]), [u"3", None, u"8"])
+
+    def test_chunks_missing_numbers(self):
+        """
+        Assert missing and malformed numbers are NaN rather than errors
+        """
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, 'w') as data:
+            data.write("ROUTE NAME,SERVICE LOCATIONS\nPAM01,1204\nPAT02\nPAW03,\nPAF04,many\n")
+
+        try:
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter("always", UnparsableRow)
+                chunk = next(AccountsReportReader(path).chunks())
+        finally:
+            os.remove(path)
+
+        locations = chunk["SERVICE LOCATIONS"]
+        self.assertEqual(locations.dtype.name, "float64")
+        self.assertEqual(locations[0], 1204)
+        self.assertTrue(np.isnan(locations[1:]).all())
+
+        self.assertEqual(len(caught), 1)
+        self.assertEqual(str(caught[0].message), "line 5: u'many' is not a number")
+
+    def test_numeric_column(self):
+        """
+        Assert complete numeric columns keep their declared dtype
+        """
+        column = numeric_column([u"1", u" 2 ", u"3"], np.dtype(np.int64), [2, 3, 4])
+        self.assertEqual(column.dtype.name, "int64")
+        self.assertEqual(list(column), [1, 2, 3])
+
+        column = numeric_column([u"1.5", None], np.dtype(np.float64), [2, 3])
+        self.assertEqual(column[0], 1.5)
+        self.assertTrue(np.isnan(column[1]))
+
+    def test_chunks_blank_lines(self):
+        """
+        Assert a run of blank lines does not end the chunks
+        """
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, 'w') as data:
+            data.write("A,B\n" + "\n" * 5 + "1,2\n3,4\n")
+
+        try:
+            chunks = list(CSVReportReader(path, header=True).chunks(chunksize=3))
+        finally:
+            os.remove(path)
+
+        self.assertEqual([value for chunk in chunks for value in chunk["B"]], [u"2", u"4"])
+
+    def test_chunks_no_header(self):
+        """
+        Assert chunk columns are named by index without a header
+        """
+        chunk = next(CSVReportReader(ACCOUNTS).chunks())
+        self.assertEqual(sorted(chunk.keys()), [0, 1])
+        self.assertEqual(len(chunk[0]), 184)
+
+    def test_chunks_dates(self):
+        """
+        Assert declared date columns are parsed into datetime64 arrays
+        """
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, 'w') as data:
+            data.write("ROUTE NAME,PICKED UP\nPAM01,03/03/2014 07:15\nPAM02,03/04/2014 16:40\n")
+
+        try:
+            reader = CSVReportReader(path, header=True)
+            reader.DATE_COLUMNS = {"PICKED UP": "%m/%d/%Y %H:%M"}
+            chunk  = next(reader.chunks())
+        finally:
+            os.remove(path)
+
+        self.assertEqual(chunk["PICKED UP"].dtype.name, "datetime64[us]")
+        self.assertEqual(chunk["PICKED UP"][1].astype(datetime), datetime(2014, 3, 4, 16, 40))
@@ -0,0 +1,145 @@
+# tests.ingest_tests.bulk_tests
+# Tests for the batched insert or update of ingested objects
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Mon Jul 21 09:41:37 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: bulk_tests.py [] benjamin@bengfort.com $
+
+"""
+Tests for the batched insert or update of ingested objects
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import unittest
+
+from datetime import date, datetime
+from dateutil.tz import tzutc
+from sqlalchemy import create_engine, func, MetaData, DefaultClause
+from sqlalchemy.orm import sessionmaker
+from zerocycle.db.models import *
+from zerocycle.ingest.bulk import *
+from zerocycle.utils.timez import BatchClock
+
+##########################################################################
+## TestCases
+##########################################################################
+
+class BulkUpserterTests(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+
+    def tearDown(self):
+        self.session.close()
+
+    def make_items(self, garbage=100):
+        """
+        Creates (route, pickup) tuples like the MonthlyReportReader
+        """
+        items = []
+        for name in (u"PAM01", u"PAM02"):
+            route = Route(name=name, supervisor=u"Litson, Gary")
+            for day in (3, 4):
+                pickup = Pickup(date=date(2014, 3, day), vehicle=u"10G760", miles=20, garbage=garbage)
+                pickup.route = route
+                items.append((route, pickup))
+        return items
+
+    def upsert(self, items, batch_size=3):
+        upserter = BulkUpserter(self.session, batch_size)
+        results  = []
+        for item in items:
+            results.extend(upserter.add(item))
+        results.extend(upserter.flush())
+        return results
+
+    def test_insert(self):
+        """
+        Assert new routes and pickups are inserted
+        """
+        results = self.upsert(self.make_items())
+        self.assertEqual(len(results), 8)
+        self.assertEqual(sum(1 for obj, created in results if created), 6)
+        self.assertEqual(self.session.query(Route).count(), 2)
+        self.assertEqual(self.session.query(Pickup).count(), 4)
+
+    def test_update(self):
+        """
+        Assert existing routes and pickups are updated, not duplicated
+        """
+        self.upsert(self.make_items())
+        results = self.upsert(self.make_items(garbage=250), batch_size=100)
+
+        self.assertFalse(any(created for obj, created in results))
+        self.assertEqual(self.session.query(Route).count(), 2)
+        self.assertEqual(self.session.query(Pickup).count(), 4)
+        self.assertEqual(set(p.garbage for p in self.session.query(Pickup)), set([250]))
+
+    def test_partial_route_update(self):
+        """
+        Assert unset route columns are not overwritten on update
+        """
+        self.upsert(self.make_items())
+        self.upsert([Route(name=u"PAM01", locations=1204)])
+
+        route = self.session.query(Route).filter_by(name=u"PAM01").one()
+        self.assertEqual(route.locations, 1204)
+        self.assertEqual(route.supervisor, u"Litson, Gary")
+
+    def test_pickup_route_ids(self):
+        """
+        Assert pickups are attached to the resolved route ids
+        """
+        self.upsert(self.make_items())
+        for pickup in self.session.query(Pickup):
+            self.assertIn(pickup.route.name, (u"PAM01", u"PAM02"))
+
+    def test_batch_timestamps(self):
+        """
+        Assert a batch is stamped with the time of its batch clock
+        """
+        first  = BatchClock(datetime(2014, 3, 3, 8, tzinfo=tzutc()))
+        second = BatchClock(datetime(2014, 3, 4, 8, tzinfo=tzutc()))
+
+        with first:
+            self.upsert(self.make_items(), batch_size=100)
+        with second:
+            self.upsert(self.make_items(garbage=250), batch_size=100)
+
+        for obj in self.session.query(Route).all() + self.session.query(Pickup).all():
+            self.assertEqual(obj.created.replace(tzinfo=None), datetime(2014, 3, 3, 8))
+            self.assertEqual(obj.updated.replace(tzinfo=None), datetime(2014, 3, 4, 8))
+
+    def test_stamp(self):
+        """
+        Assert rows are stamped unless the database stamps them
+        """
+        now   = datetime(2014, 3, 3, 8)
+        table = Pickup.__table__
+        self.assertEqual(stamp([{'miles': 1}], table, now), [{'miles': 1, 'created': now, 'updated': now}])
+        self.assertEqual(stamp([{'miles': 1}], table, now, ('updated',)), [{'miles': 1, 'updated': now}])
+
+        table = Base.metadata.tables['pickups'].tometadata(MetaData())
+        table.c.created.server_default = DefaultClause(func.now())
+        self.assertEqual(stamp([{'miles': 1}], table, now), [{'miles': 1}])
+
+    def test_pickup_upsert(self):
+        """
+        Assert the PostgreSQL upsert only updates the columns that are set
+        """
+        sql = pickup_upsert(['date', 'route_id', 'vehicle', 'garbage', 'created', 'updated'])
+        self.assertIn("(created, date, garbage, route_id, updated, vehicle)", sql)
+        self.assertTrue(sql.endswith("DO UPDATE SET garbage = EXCLUDED.garbage, updated = EXCLUDED.updated"))
+
+        # Timestamps stamped by the database are left to it
+        sql = pickup_upsert(['date', 'route_id', 'vehicle', 'miles'])
+        self.assertTrue(sql.endswith("DO UPDATE SET miles = EXCLUDED.miles, updated = now()"))
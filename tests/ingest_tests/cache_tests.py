@@ -0,0 +1,114 @@
+# tests.ingest_tests.cache_tests
+# Tests for the parsed report cache
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Tue Jul 29 17:20:14 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: cache_tests.py [] benjamin@bengfort.com $
+
+"""
+Tests for the parsed report cache
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import os
+import glob
+import shutil
+import unittest
+import tempfile
+
+from zerocycle.ingest.cache import *
+from zerocycle.ingest.base import CSVReportReader
+from zerocycle.ingest.monthly import MonthlyReportReader
+
+##########################################################################
+## Fixtures
+##########################################################################
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "..", "fixtures")
+MONTHLY  = os.path.join(FIXTURES, "march2014.xls")
+ACCOUNTS = os.path.join(FIXTURES, "accounts.csv")
+
+##########################################################################
+## TestCases
+##########################################################################
+
+class ReportCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache  = ReportCache(self.tmpdir, 1048576)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def cached_files(self):
+        return glob.glob(os.path.join(self.tmpdir, ".*" + CACHE_EXT))
+
+    def test_monthly_records(self):
+        """
+        Assert monthly records are identical when loaded from the cache
+        """
+        parsed = list(MonthlyReportReader(MONTHLY).items())
+        stored = list(MonthlyReportReader(MONTHLY, cache=self.cache).items())
+        loaded = list(MonthlyReportReader(MONTHLY, cache=self.cache).items())
+
+        self.assertEqual(len(self.cached_files()), 1)
+        self.assertEqual(parsed, stored)
+        self.assertEqual(parsed, loaded)
+
+    def test_partial_read(self):
+        """
+        Assert a partially read report is not cached
+        """
+        rows = CSVReportReader(ACCOUNTS, cache=self.cache).items()
+        next(rows)
+        rows.close()
+
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_key(self):
+        """
+        Assert the key depends on the reader class and version
+        """
+        reader = CSVReportReader(ACCOUNTS)
+        key = self.cache.key(reader)
+
+        reader.VERSION = 2
+        self.assertNotEqual(key, self.cache.key(reader))
+        self.assertNotEqual(key, self.cache.key(MonthlyReportReader(ACCOUNTS)))
+
+    def test_eviction(self):
+        """
+        Assert least recently used files are evicted beyond maxsize
+        """
+        list(MonthlyReportReader(MONTHLY, cache=self.cache).items())
+        self.cache.maxsize = 1
+        list(CSVReportReader(ACCOUNTS, cache=self.cache).items())
+
+        self.assertEqual(self.cached_files(), [])
+
+    def test_same_names(self):
+        """
+        Assert reports with the same name in other directories are kept
+        """
+        paths = []
+        for month in ("2014/03", "2014/[04]"):
+            directory = os.path.join(self.tmpdir, "reports", month)
+            os.makedirs(directory)
+            paths.append(os.path.join(directory, "accounts.csv"))
+            shutil.copy(ACCOUNTS, paths[-1])
+
+        for path in paths + paths:
+            list(CSVReportReader(path, cache=self.cache).items())
+
+        self.assertEqual(len(self.cached_files()), 2)
+        for path in paths:
+            reader = CSVReportReader(path)
+            self.assertEqual(self.cache.stale(reader), [self.cache.path(reader)])
@@ -0,0 +1,177 @@
+# tests.ingest_tests.ingest_tests
+# Tests for ingesting several reports serially and in a worker pool
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Mon Aug 11 10:24:17 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: ingest_tests.py [] benjamin@bengfort.com $
+
+"""
+Tests for ingesting several reports serially and in a worker pool
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import os
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+
+from datetime import date
+from collections import Counter
+from multiprocessing.pool import Pool
+from benchmarks.generate import generate_monthly
+from zerocycle import ingest
+from zerocycle.db.models import *
+from zerocycle.exceptions import *
+from zerocycle.ingest.routes import RouteMap
+from zerocycle.utils.timers import profiler
+
+##########################################################################
+## Helpers
+##########################################################################
+
+class TerminatedPool(Pool):
+    """
+    A worker pool that remembers whether it was terminated.
+    """
+
+    terminated = False
+
+    def terminate(self):
+        TerminatedPool.terminated = True
+        super(TerminatedPool, self).terminate()
+
+##########################################################################
+## TestCases
+##########################################################################
+
+class IngestReportsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir  = tempfile.mkdtemp()
+        self.reports = []
+        for idx, start in enumerate((date(2014, 3, 3), date(2014, 4, 1), date(2014, 3, 17))):
+            path = os.path.join(self.tmpdir, "monthly%i.xls" % idx)
+            generate_monthly(path, routes=12, days=5, vehicles=2, supervisors=3, start=start, seed=idx)
+            self.reports.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def ingest(self, name, paths, **kwargs):
+        """
+        Ingests the paths into a new SQLite database called name and
+        returns the factory of its sessions, the results, the counts and
+        the number of times the sessions were disposed.
+        """
+        factory  = SessionFactory("sqlite:///" + os.path.join(self.tmpdir, name))
+        Base.metadata.create_all(factory().get_bind())
+        disposed = []
+        dispose  = factory.dispose
+
+        def recorded():
+            disposed.append(True)
+            dispose()
+
+        factory.dispose = recorded
+        create_session  = ingest.create_session
+        ingest.create_session = factory
+        try:
+            counts  = Counter()
+            results = list(ingest.ingest_reports("monthly", paths, counts=counts, **kwargs))
+        finally:
+            ingest.create_session = create_session
+            factory.dispose = dispose
+
+        return factory, results, counts, len(disposed)
+
+    def contents(self, factory):
+        """
+        Returns the pickups, rollups and manifest of the database by their
+        natural keys, so that databases can be compared.
+        """
+        session = factory()
+        pickups = session.query(Route.name, Route.supervisor, Pickup.date, Pickup.vehicle, Pickup.miles, Pickup.garbage)
+        daily   = session.query(Route.name, DailyRollup.date, DailyRollup.supervisor, DailyRollup.pickups, DailyRollup.miles, DailyRollup.garbage)
+        monthly = session.query(MonthlyRollup.month, MonthlyRollup.supervisor, MonthlyRollup.pickups, MonthlyRollup.miles, MonthlyRollup.garbage)
+        reports = session.query(Report.path, Report.checksum, Report.reader, Report.rows)
+
+        contents = {
+            "pickups": sorted(pickups.select_from(Pickup).join(Pickup.route).all()),
+            "daily":   sorted(daily.select_from(DailyRollup).join(Route, Route.id == DailyRollup.route_id).all()),
+            "monthly": sorted(monthly.all()),
+            "reports": reports.order_by(Report.id).all(),
+        }
+        session.close()
+        factory.dispose()
+        return contents
+
+    def test_parallel_matches_serial(self):
+        """
+        Assert reports ingested in a worker pool match a serial ingest
+        """
+        serial, sresults, scounts, sdisposed = self.ingest("serial.db", self.reports, jobs=1)
+        routes = RouteMap()
+        parallel, presults, pcounts, pdisposed = self.ingest("parallel.db", self.reports, jobs=2, routes=routes)
+
+        self.assertEqual((sdisposed, pdisposed), (0, 1))
+        self.assertEqual(pcounts, scounts)
+        self.assertEqual(scounts["rows"], 12 * 5 * 2 * 3)
+        self.assertEqual([created for obj, created in presults], [created for obj, created in sresults])
+
+        expected = self.contents(serial)
+        self.assertEqual(self.contents(parallel), expected)
+        self.assertEqual([report[0] for report in expected["reports"]], self.reports)
+        self.assertEqual(len(expected["monthly"]), 6)
+
+        # The parent's RouteMap learned the routes that were written
+        session = parallel()
+        self.assertEqual(routes.ids, dict((name, idx) for idx, name in session.query(Route.id, Route.name)))
+        session.close()
+        parallel.dispose()
+
+    def test_parallel_profile(self):
+        """
+        Assert the stages of workers are merged into the profile
+        """
+        profiler.reset().enable()
+        try:
+            factory = self.ingest("profile.db", self.reports, jobs=2)[0]
+        finally:
+            profiler.disable()
+            factory.dispose()
+
+        self.assertEqual(profiler.calls["workers"], len(self.reports))
+        self.assertEqual(profiler.calls["workers.read"], len(self.reports))
+        self.assertGreater(profiler.calls["workers.read.handle_row"], 0)
+        self.assertEqual(profiler.calls["read"], len(self.reports))
+        self.assertIn("write", profiler.seconds)
+        profiler.reset()
+
+    def test_worker_error(self):
+        """
+        Assert the pool is terminated when a worker raises
+        """
+        paths = [self.reports[0], os.path.join(self.tmpdir, "missing.xls"), self.reports[1]]
+
+        TerminatedPool.terminated = False
+        pool = multiprocessing.Pool
+        multiprocessing.Pool = TerminatedPool
+        try:
+            with self.assertRaises(ReportNotFound):
+                self.ingest("error.db", paths, jobs=2)
+        finally:
+            multiprocessing.Pool = pool
+
+        self.assertTrue(TerminatedPool.terminated)
+
+        # Reports before the failure were written in order and committed
+        contents = self.contents(SessionFactory("sqlite:///" + os.path.join(self.tmpdir, "error.db")))
+        self.assertEqual([report[0] for report in contents["reports"]], paths[:1])
@@ -0,0 +1,132 @@
+# tests.ingest_tests.manifest_tests
+# Tests for the manifest of ingested reports
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Wed Jul 23 15:02:47 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: manifest_tests.py [] benjamin@bengfort.com $
+
+"""
+Tests for the manifest of ingested reports
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import os
+import shutil
+import unittest
+import tempfile
+
+from collections import Counter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from zerocycle import ingest
+from zerocycle.db.models import *
+from zerocycle.ingest.manifest import *
+
+##########################################################################
+## Fixtures
+##########################################################################
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "..", "fixtures")
+ACCOUNTS = os.path.join(FIXTURES, "accounts.csv")
+MONTHLY  = os.path.join(FIXTURES, "march2014.xls")
+
+##########################################################################
+## TestCases
+##########################################################################
+
+class ManifestTests(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+
+        self.tmpdir = tempfile.mkdtemp()
+        self.copy   = os.path.join(self.tmpdir, "accounts-copy.csv")
+        shutil.copy(ACCOUNTS, self.copy)
+
+    def tearDown(self):
+        self.session.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_fingerprint(self):
+        """
+        Assert the fingerprint depends on content, not path
+        """
+        original = fingerprint(ACCOUNTS)
+        copied   = fingerprint(self.copy)
+
+        self.assertEqual(original["checksum"], copied["checksum"])
+        self.assertEqual(original["size"], os.path.getsize(ACCOUNTS))
+        self.assertNotEqual(original["path"], copied["path"])
+
+    def test_record_report(self):
+        """
+        Assert reports are recorded once per content hash
+        """
+        record_report(self.session, ACCOUNTS, "accounts", 183)
+        self.session.commit()
+        record_report(self.session, self.copy, "accounts", 183)
+        self.session.commit()
+
+        report = self.session.query(Report).one()
+        self.assertEqual(report.reader, u"ACCOUNTS")
+        self.assertEqual(report.rows, 183)
+
+    def test_filter_reports(self):
+        """
+        Assert already ingested reports are filtered out
+        """
+        other = os.path.join(self.tmpdir, "other.csv")
+        with open(other, 'w') as f:
+            f.write("ROUTE NAME,SERVICE LOCATIONS\nPAM01,1\n")
+
+        record_report(self.session, ACCOUNTS, "accounts", 183)
+        self.session.commit()
+
+        self.assertEqual(filter_reports(self.session, [self.copy, other]), [other])
+        self.assertEqual(filter_reports(self.session, []), [])
+
+        # The same content listed twice in one run is only ingested once
+        prints = {}
+        self.assertEqual(filter_reports(self.session, [other, other, self.copy], prints), [other])
+        self.assertEqual(prints[other], fingerprint(other))
+
+    def test_recorded_fingerprint(self):
+        """
+        Assert a fingerprint that has been taken is recorded as is
+        """
+        details = dict(fingerprint(ACCOUNTS), path=u"/reports/accounts.csv")
+        report  = record_report(self.session, ACCOUNTS, "accounts", 183, details)
+        self.assertEqual(report.path, u"/reports/accounts.csv")
+        self.assertEqual(report.checksum, details["checksum"])
+
+    def test_report_rows(self):
+        """
+        Assert the rows of a report are recorded, not its objects
+        """
+        factory = SessionFactory("sqlite:///" + os.path.join(self.tmpdir, "manifest.db"))
+        Base.metadata.create_all(factory().get_bind())
+
+        create_session = ingest.create_session
+        ingest.create_session = factory
+        try:
+            counts  = Counter()
+            results = list(ingest.ingest_report("monthly", MONTHLY, counts=counts))
+        finally:
+            ingest.create_session = create_session
+
+        session = factory()
+        report  = session.query(Report).one()
+        self.assertEqual(counts["objects"], len(results))
+        self.assertEqual(counts["rows"], session.query(Pickup).count())
+        self.assertEqual(report.rows, counts["rows"])
+        session.close()
+        factory.dispose()
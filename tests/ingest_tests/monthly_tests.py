@@ -0,0 +1,93 @@
+# tests.ingest_tests.monthly_tests
+# Tests for the monthly supervisor report reader
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Thu Jul 24 10:15:09 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: monthly_tests.py [] benjamin@bengfort.com $
+
+"""
+Tests for the monthly supervisor report reader
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import os
+import warnings
+import unittest
+
+from datetime import date, datetime
+from zerocycle.exceptions import *
+from zerocycle.ingest.monthly import *
+
+##########################################################################
+## Fixtures
+##########################################################################
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "..", "fixtures")
+MONTHLY  = os.path.join(FIXTURES, "march2014.xls")
+
+##########################################################################
+## TestCases
+##########################################################################
+
+class MonthlyReportReaderTests(unittest.TestCase):
+
+    def setUp(self):
+        self.reader = MonthlyReportReader(MONTHLY)
+
+    def test_record_row(self):
+        """
+        Assert record rows are passed through
+        """
+        row = [None, "PAM60", "10G760", "31", 23540.0]
+        self.assertEqual(self.reader.handle_row(row), row)
+
+    def test_empty_row(self):
+        """
+        Assert empty rows are skipped
+        """
+        self.assertIsNone(self.reader.handle_row([None] * 5))
+
+    def test_marker_rows(self):
+        """
+        Assert marker rows set the current date and supervisor
+        """
+        self.assertIsNone(self.reader.handle_row(["Supervisor:", "Litson, Gary", None, None, None]))
+        self.assertIsNone(self.reader.handle_row(["Daily Date:", "03/03/2014", None, None, None]))
+        self.assertIsNone(self.reader.handle_row(["Daily Total:", None, None, 224.0, 157440.0]))
+
+        self.assertEqual(self.reader._current_supervisor, "Litson, Gary")
+        self.assertEqual(self.reader._current_pickup_date, date(2014, 3, 3))
+
+    def test_date_cells(self):
+        """
+        Assert daily dates may be date cells
+        """
+        self.assertIsNone(self.reader.handle_row(["Daily Date:", datetime(2014, 3, 4), None, None, None]))
+        self.assertEqual(self.reader._current_pickup_date, date(2014, 3, 4))
+
+    def test_unknown_row(self):
+        """
+        Assert unknown rows warn with UnparsableRow
+        """
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            self.assertIsNone(self.reader.handle_row([None, "PAX99", "07G999", "39", None]))
+            self.assertIsNone(self.reader.handle_row([12.0, None, None, None, None]))
+
+        self.assertEqual(len(caught), 2)
+        self.assertTrue(all(issubclass(w.category, UnparsableRow) for w in caught))
+
+    def test_compile_markers(self):
+        """
+        Assert marker keywords are normalized once per class
+        """
+        markers = MonthlyReportReader.compile_markers()
+        self.assertIs(markers, MonthlyReportReader.compile_markers())
+        self.assertEqual(markers["daily date"], "handle_daily_date")
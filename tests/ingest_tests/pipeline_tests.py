@@ -0,0 +1,73 @@
+# tests.ingest_tests.pipeline_tests
+# Tests for the reader/writer pipeline
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Mon Jul 28 14:30:51 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: pipeline_tests.py [] benjamin@bengfort.com $
+
+"""
+Tests for the reader/writer pipeline
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import unittest
+
+from zerocycle.ingest.pipeline import *
+
+##########################################################################
+## TestCases
+##########################################################################
+
+class PipelineTests(unittest.TestCase):
+
+    def test_order(self):
+        """
+        Assert the pipeline yields every item in order
+        """
+        pipeline = Pipeline(xrange(1234), depth=2, chunksize=10)
+        self.assertEqual(list(pipeline), range(1234))
+
+    def test_backpressure(self):
+        """
+        Assert the reader stage never gets more than depth chunks ahead
+        """
+        consumed = []
+
+        def reader():
+            for idx in xrange(1000):
+                # chunks on the queue + the chunk being built + chunk in use
+                self.assertLessEqual(idx - len(consumed), (2 + 2) * 10)
+                yield idx
+
+        for item in Pipeline(reader(), depth=2, chunksize=10):
+            consumed.append(item)
+
+        self.assertEqual(len(consumed), 1000)
+
+    def test_reader_exception(self):
+        """
+        Assert reader exceptions are raised in the writer
+        """
+        def reader():
+            yield 1
+            raise ValueError("bad row")
+
+        with self.assertRaises(ValueError):
+            list(Pipeline(reader()))
+
+    def test_early_stop(self):
+        """
+        Assert the reader stage stops when the writer stops consuming
+        """
+        pipeline = Pipeline(xrange(100000), depth=1, chunksize=10)
+        for item in pipeline:
+            if item == 5: break
+
+        self.assertFalse(pipeline.thread.is_alive())
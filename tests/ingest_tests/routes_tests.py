@@ -0,0 +1,153 @@
+# tests.ingest_tests.routes_tests
+# Tests for the route identity map
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Fri Jul 25 10:12:03 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: routes_tests.py [] benjamin@bengfort.com $
+
+"""
+Tests for the route identity map
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from zerocycle import ingest
+from zerocycle.db.models import *
+from zerocycle.ingest.routes import *
+from zerocycle.ingest.accounts import AccountsReportReader
+
+##########################################################################
+## Fixtures
+##########################################################################
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "..", "fixtures")
+ACCOUNTS = os.path.join(FIXTURES, "accounts.csv")
+
+##########################################################################
+## TestCases
+##########################################################################
+
+class RouteMapTests(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.session.add_all([Route(name=u"PAM01"), Route(name=u"PAM02")])
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_warm(self):
+        """
+        Assert the map is warmed from the routes table
+        """
+        routes = RouteMap().warm(self.session)
+        self.assertEqual(len(routes), 2)
+        self.assertIn(u"PAM01", routes)
+        self.assertIsNone(routes.resolve(u"PAM03"))
+
+    def test_route(self):
+        """
+        Assert constructed routes have their ids resolved
+        """
+        routes = RouteMap().warm(self.session)
+        known  = routes.route(u"PAM01", locations=1204)
+        self.assertEqual(known.id, routes.resolve(u"PAM01"))
+        self.assertEqual(known.locations, 1204)
+        self.assertIsNone(routes.route(u"PAM03").id)
+
+    def test_rollback(self):
+        """
+        Assert ids learned in a rolled back transaction are forgotten
+        """
+        routes = RouteMap().warm(self.session)
+        routes.learn([(u"PAM03", 3)])
+        routes.commit()
+        routes.learn([(u"PAM04", 4), (u"PAM01", 1)])
+        routes.rollback()
+
+        self.assertIn(u"PAM01", routes)
+        self.assertIn(u"PAM03", routes)
+        self.assertNotIn(u"PAM04", routes)
+
+    def test_write_items(self):
+        """
+        Assert routes written one at a time or in batches are learned
+        """
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        factory = SessionFactory("sqlite:///" + path)
+        Base.metadata.create_all(factory().get_bind())
+
+        create_session = ingest.create_session
+        ingest.create_session = factory
+        try:
+            for batch_size in (0, 100):
+                routes = RouteMap()
+                items  = AccountsReportReader(ACCOUNTS, routes=routes)
+                list(ingest.write_items(items, False, batch_size, routes=routes))
+                self.assertEqual(len(routes), 0)
+
+                routes = RouteMap()
+                items  = AccountsReportReader(ACCOUNTS, routes=routes)
+                list(ingest.write_items(items, True, batch_size, routes=routes))
+
+                session = factory()
+                self.assertEqual(routes.ids, dict((name, idx) for idx, name in session.query(Route.id, Route.name)))
+                self.assertGreater(len(routes), 0)
+                session.close()
+        finally:
+            ingest.create_session = create_session
+            factory.dispose()
+            os.remove(path)
+
+    def test_shared_across_reports(self):
+        """
+        Assert routes learned from one report are reused by the next
+        """
+        tmpdir = tempfile.mkdtemp()
+        copy   = os.path.join(tmpdir, "accounts-copy.csv")
+        shutil.copy(ACCOUNTS, copy)
+
+        factory = SessionFactory("sqlite:///" + os.path.join(tmpdir, "routes.db"))
+        Base.metadata.create_all(factory().get_bind())
+
+        readers = []
+        def get_reader(report_type, path, **kwargs):
+            reader = get_reader.wrapped(report_type, path, **kwargs)
+            readers.append((reader, dict(reader.routes.ids)))
+            return reader
+
+        create_session, get_reader.wrapped = ingest.create_session, ingest.get_reader
+        ingest.create_session, ingest.get_reader = factory, get_reader
+        try:
+            list(ingest.ingest_reports("accounts", [ACCOUNTS, copy]))
+        finally:
+            ingest.create_session, ingest.get_reader = create_session, get_reader.wrapped
+
+        session = factory()
+        ids = dict((name, idx) for idx, name in session.query(Route.id, Route.name))
+        session.close()
+        factory.dispose()
+        shutil.rmtree(tmpdir)
+
+        (first, before), (second, learned) = readers
+        self.assertIs(first.routes, second.routes)
+        self.assertEqual(before, {})
+        self.assertEqual(learned, ids)
+        self.assertGreater(len(learned), 0)
@@ -0,0 +1,165 @@
+# tests.ingest_tests.validate_tests
+# Tests for the validation of reports without a database
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Sat Aug 09 11:02:51 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: validate_tests.py [] benjamin@bengfort.com $
+
+"""
+Tests for the validation of reports without a database
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from datetime import date
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from zerocycle.db.models import Route, Pickup
+from zerocycle.exceptions import *
+from zerocycle.ingest.validate import *
+
+##########################################################################
+## Fixtures
+##########################################################################
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "..", "fixtures")
+MONTHLY  = os.path.join(FIXTURES, "march2014.xls")
+ACCOUNTS = os.path.join(FIXTURES, "accounts.csv")
+
+##########################################################################
+## TestCases
+##########################################################################
+
+class ValidateTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.broken = os.path.join(self.tmpdir, "broken.csv")
+        with open(self.broken, 'w') as data:
+            data.write("ROUTE NAME,SERVICE LOCATIONS\nPAM01,1204\nPAT02,many\nPAW03,\nPAF04,873\n")
+
+        self.queries = []
+        event.listen(Engine, 'before_cursor_execute', self.record_query)
+
+    def tearDown(self):
+        event.remove(Engine, 'before_cursor_execute', self.record_query)
+        shutil.rmtree(self.tmpdir)
+
+    def record_query(self, conn, cursor, statement, *args):
+        self.queries.append(statement)
+
+    def test_valid_reports(self):
+        """
+        Assert reports are counted without querying the database
+        """
+        monthly, accounts = validate_reports(None, [MONTHLY, ACCOUNTS])
+
+        self.assertEqual(monthly["type"], "MONTHLY")
+        self.assertTrue(monthly["valid"])
+        self.assertEqual(monthly["rows"], monthly["pickups"])
+        self.assertGreater(monthly["pickups"], 0)
+        self.assertGreater(monthly["unparsable_count"], 0)
+        self.assertTrue(monthly["unparsable"][0].startswith("unknown monthly report row"))
+
+        self.assertEqual(accounts["type"], "ACCOUNTS")
+        self.assertEqual((accounts["rows"], accounts["pickups"]), (accounts["routes"], 0))
+        self.assertEqual(accounts["unparsable_count"], 0)
+        self.assertIsNone(accounts["error"])
+
+        self.assertEqual(self.queries, [])
+
+    def test_broken_rows(self):
+        """
+        Assert rows that cannot be converted are invalid but not fatal
+        """
+        summary = validate_report(("ACCOUNTS", self.broken, {}))
+        self.assertFalse(summary["valid"])
+        self.assertIsNone(summary["error"])
+        self.assertEqual((summary["rows"], summary["routes"]), (4, 2))
+        self.assertEqual(summary["invalid_count"], 2)
+        self.assertTrue(summary["invalid"][0].startswith("row 2: ValueError"))
+        self.assertTrue(summary["invalid"][1].startswith("row 3: ValueError"))
+
+    def test_broken_report(self):
+        """
+        Assert an exception that stops the reader is the error of the report
+        """
+        corrupt = os.path.join(self.tmpdir, "corrupt.xls")
+        with open(corrupt, 'w') as data:
+            data.write("Not a workbook")
+
+        summary = validate_report((None, corrupt, {}))
+        self.assertFalse(summary["valid"])
+        self.assertEqual(summary["rows"], 0)
+        self.assertIsNotNone(summary["error"])
+
+        summary = validate_report((None, os.path.join(self.tmpdir, "missing.xls"), {}))
+        self.assertTrue(summary["error"].startswith("ReportNotFound"))
+
+        with self.assertRaises(IngestionException):
+            list(validate_reports("ledger", [ACCOUNTS]))
+
+    def test_check_item(self):
+        """
+        Assert missing and mistyped required columns are invalid
+        """
+        route  = Route(name=u"PAM01")
+        pickup = Pickup(date=date(2014, 3, 4), vehicle=u"10G760")
+        pickup.route = route
+        self.assertIsNone(check_item(route))
+        self.assertIsNone(check_item(pickup))
+
+        self.assertEqual(check_item(Route()), "route name is None")
+        self.assertEqual(check_item(Pickup(date="03/04/2014", vehicle=u"10G760")), "pickup date is '03/04/2014'")
+        self.assertEqual(check_item(Pickup(date=date(2014, 3, 4), vehicle=u"10G760")), "pickup has no route")
+
+    def test_directories(self):
+        """
+        Assert directories are expanded to the reports in them
+        """
+        shutil.copy(ACCOUNTS, self.tmpdir)
+        with open(os.path.join(self.tmpdir, "README"), 'w') as data:
+            data.write("Not a report")
+
+        paths = [os.path.join(self.tmpdir, name) for name in ("accounts.csv", "broken.csv")]
+        self.assertEqual(find_reports([self.tmpdir]), paths)
+        self.assertEqual(report_type_of(MONTHLY), "MONTHLY")
+        self.assertRaises(IngestionException, report_type_of, "README")
+
+    def test_parallel(self):
+        """
+        Assert reports validated in a pool are summarized in order
+        """
+        paths    = [MONTHLY, self.broken, ACCOUNTS]
+        serial   = list(validate_reports(None, paths))
+        parallel = list(validate_reports(None, paths, jobs=2))
+
+        for summary in serial + parallel:
+            summary.pop("elapsed")
+        self.assertEqual(parallel, serial)
+
+    def test_summarize(self):
+        """
+        Assert totals are summed and unparsable rows only fail strictly
+        """
+        summaries = list(validate_reports(None, [MONTHLY, ACCOUNTS]))
+
+        totals = summarize(summaries)
+        self.assertTrue(totals["valid"])
+        self.assertEqual(totals["rows"], sum(summary["rows"] for summary in summaries))
+        self.assertEqual(totals["errors"], 0)
+
+        totals = summarize(summaries, strict=True)
+        self.assertFalse(totals["valid"])
+        self.assertEqual(totals["failed"], 1)
@@ -0,0 +1,232 @@
+# tests.service_tests
+# Tests for the read-only WSGI query service
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Fri Aug 08 10:31:44 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: service_tests.py [] benjamin@bengfort.com $
+
+"""
+Tests for the read-only WSGI query service
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import os
+import json
+import tempfile
+import unittest
+
+from datetime import date
+from zerocycle.db import rollups
+from zerocycle.db.models import *
+from zerocycle.service import *
+
+##########################################################################
+## TestCases
+##########################################################################
+
+class ResponseCacheTests(unittest.TestCase):
+
+    def test_least_recently_used(self):
+        """
+        Assert the least recently used responses are evicted
+        """
+        cache = ResponseCache(2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_disabled(self):
+        """
+        Assert nothing is cached with a maxsize of 0
+        """
+        cache = ResponseCache(0)
+        cache.set("a", 1)
+        self.assertIsNone(cache.get("a"))
+
+class QueryServiceTests(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.sessions = SessionFactory("sqlite:///" + self.path)
+        Base.metadata.create_all(self.sessions().get_bind())
+
+        session = self.sessions()
+        for name, supervisor in ((u"PAM01", u"Litson, Gary"), (u"PAT02", u"Ruiz, Ana")):
+            route = Route(name=name, supervisor=supervisor, locations=1000)
+            for day in (3, 4):
+                pickup = Pickup(date=date(2014, 3, day), vehicle=u"10G760", miles=10, garbage=day * 100)
+                pickup.route = route
+                session.add(pickup)
+        session.add(Report(path=u"/reports/march.xls", checksum=u"a" * 40, rows=4))
+        session.commit()
+        session.close()
+
+        self.service = QueryService(sessions=self.sessions)
+
+    def tearDown(self):
+        self.sessions.dispose()
+        os.remove(self.path)
+
+    def request(self, path, query="", method="GET", etag=None):
+        """
+        Calls the service and returns the status, headers and parsed body.
+        """
+        environ  = {'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': query}
+        if etag: environ['HTTP_IF_NONE_MATCH'] = etag
+        response = {}
+
+        def start_response(status, headers):
+            response['status']  = int(status.split()[0])
+            response['headers'] = dict(headers)
+
+        body = "".join(self.service(environ, start_response))
+        return response['status'], response['headers'], json.loads(body) if body else None
+
+    def test_routes(self):
+        """
+        Assert routes are listed and filtered by supervisor
+        """
+        status, headers, body = self.request("/routes")
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['Content-Type'], "application/json; charset=utf-8")
+        self.assertEqual([route["name"] for route in body["routes"]], [u"PAM01", u"PAT02"])
+
+        status, headers, body = self.request("/routes", "supervisor=Ruiz,%20Ana")
+        self.assertEqual([route["name"] for route in body["routes"]], [u"PAT02"])
+
+        status, headers, body = self.request("/routes/PAM01")
+        self.assertEqual(body["supervisor"], u"Litson, Gary")
+        self.assertEqual(self.request("/routes/PAX99")[0], 404)
+
+    def test_pickups(self):
+        """
+        Assert pickups are paged and filtered
+        """
+        status, headers, body = self.request("/pickups", "route=PAM01&start=2014-03-04")
+        self.assertEqual(status, 200)
+        self.assertEqual(body["pickups"], [{
+            "date": "2014-03-04", "route": "PAM01", "supervisor": "Litson, Gary",
+            "vehicle": "10G760", "miles": 10, "garbage": 400,
+        }])
+
+        status, headers, body = self.request("/pickups", "limit=3&offset=2")
+        self.assertEqual(len(body["pickups"]), 2)
+
+    def test_aggregates(self):
+        """
+        Assert aggregates are grouped through the managers
+        """
+        status, headers, body = self.request("/aggregates/pickups", "by=supervisor&column=garbage,miles")
+        self.assertEqual(status, 200)
+        self.assertEqual(body["results"], [
+            {"supervisor": "Litson, Gary", "garbage": 700, "miles": 20},
+            {"supervisor": "Ruiz, Ana", "garbage": 700, "miles": 20},
+        ])
+
+        status, headers, body = self.request("/aggregates/pickups", "how=max&by=route,day&route=PAT02")
+        self.assertEqual(len(body["results"]), 2)
+        self.assertEqual(self.request("/aggregates/reports")[0], 404)
+
+    def test_bad_requests(self):
+        """
+        Assert bad parameters and methods are refused
+        """
+        self.assertEqual(self.request("/pickups", "start=03/04/2014")[0], 400)
+        self.assertEqual(self.request("/pickups", "limit=100000")[0], 400)
+        self.assertEqual(self.request("/pickups", "offset=-1")[2], {"error": "offset must be at least 0"})
+        self.assertEqual(self.request("/pickups", "limit=-1")[2], {"error": "limit must be between 0 and 10000"})
+        self.assertEqual(self.request("/aggregates/pickups", "how=median")[0], 400)
+        self.assertEqual(self.request("/aggregates/monthly", "by=vehicle")[0], 400)
+        self.assertEqual(self.request("/routes", method="POST")[0], 405)
+        self.assertEqual(self.request("/reports")[0], 404)
+
+    def test_revalidation(self):
+        """
+        Assert a request with the current ETag is not modified
+        """
+        status, headers, body = self.request("/aggregates/daily", "by=month")
+        etag = headers['ETag']
+
+        status, headers, body = self.request("/aggregates/daily", "by=month", etag=etag)
+        self.assertEqual(status, 304)
+        self.assertEqual(headers['ETag'], etag)
+        self.assertIsNone(body)
+
+        # Another request has another ETag
+        self.assertNotEqual(self.request("/aggregates/daily", "by=week")[1]['ETag'], etag)
+
+    def test_revalidation_matching(self):
+        """
+        Assert If-None-Match matches weakly, in a list, or with *
+        """
+        etag = self.request("/routes")[1]['ETag']
+
+        self.assertEqual(self.request("/routes", etag="W/" + etag)[0], 304)
+        self.assertEqual(self.request("/routes", etag='"other", W/%s' % etag)[0], 304)
+        self.assertEqual(self.request("/routes", etag='"other"')[0], 200)
+        self.assertEqual(self.request("/routes", etag=etag[1:-1])[0], 200)
+
+        self.assertEqual(self.request("/routes", etag="*")[0], 304)
+        self.assertEqual(self.request("/routes/PAM01", etag="*")[0], 304)
+        self.assertEqual(self.request("/routes/PAX99", etag="*")[0], 404)
+
+    def test_cached_responses(self):
+        """
+        Assert responses are cached until the next ingest
+        """
+        first = self.request("/routes")
+        self.assertEqual(self.request("/routes"), first)
+        self.assertEqual(self.service.cache.hits, 1)
+
+        # Ingesting a report changes the data version and the ETag
+        session = self.sessions()
+        session.add(Route(name=u"PAW03", supervisor=u"Ruiz, Ana"))
+        session.add(Report(path=u"/reports/accounts.csv", checksum=u"b" * 40, rows=1))
+        session.commit()
+        session.close()
+
+        status, headers, body = self.request("/routes", etag=first[1]['ETag'])
+        self.assertEqual(status, 200)
+        self.assertNotEqual(headers['ETag'], first[1]['ETag'])
+        self.assertEqual(len(body["routes"]), 3)
+
+    def test_rebuilt_rollups(self):
+        """
+        Assert rebuilding the rollups changes the ETag of the aggregates
+        """
+        create_session = rollups.create_session
+        rollups.create_session = self.sessions
+        try:
+            list(rollups.rebuild_rollups())
+            first = self.request("/aggregates/daily", "by=route")
+            self.assertEqual(first[2]["results"][0]["garbage"], 700)
+
+            # Pickups corrected without an ingest are only rolled up by a rebuild
+            session = self.sessions()
+            session.query(Pickup).filter(Pickup.garbage == 300).update({'garbage': 350})
+            session.commit()
+            session.close()
+            self.assertEqual(self.request("/aggregates/daily", "by=route", etag=first[1]['ETag'])[0], 304)
+
+            list(rollups.rebuild_rollups())
+        finally:
+            rollups.create_session = create_session
+
+        status, headers, body = self.request("/aggregates/daily", "by=route", etag=first[1]['ETag'])
+        self.assertEqual(status, 200)
+        self.assertNotEqual(headers['ETag'], first[1]['ETag'])
+        self.assertEqual(body["results"][0]["garbage"], 750)
@@ -128,3 +128,63 @@ class TextUtilsTests(unittest.TestCase):
         expected = "bob went to the store with a friend"
 
         self.assertTrue(text.compare(original, expected))
+
+    def test_normalize_cache(self):
+        """
+        Test that normalize memoizes str and unicode separately
+        """
+        text.clear_cache()
+        self.assertIsInstance(text.normalize("Daily Date:"), str)
+        self.assertIsInstance(text.normalize(u"Daily Date:"), unicode)
+        self.assertIn((unicode, u"Daily Date:"), text._normalized)
+
+    def test_normalize_cache_hits(self):
+        """
+        Test that a memoized value is not normalized again
+        """
+        calls = []
+        depunctuate = text.depunctuate
+
+        def counted(s):
+            calls.append(s)
+            return depunctuate(s)
+
+        text.clear_cache()
+        text.depunctuate = counted
+        try:
+            original = [u"Litson, Gary", u"PAM01", u"Litson, Gary"]
+            self.assertEqual(text.normalize_many(original), [u"litson gary", u"pam01", u"litson gary"])
+            self.assertEqual(text.normalize(u"PAM01"), u"pam01")
+        finally:
+            text.depunctuate = depunctuate
+
+        self.assertEqual(calls, [u"Litson, Gary", u"PAM01"])
+
+    def test_punctuation_table(self):
+        """
+        Test that the punctuation table is built once and shared
+        """
+        table = text.punctuation_table()
+        self.assertIn(ord(u"?"), table)
+        self.assertNotIn(ord(u"a"), table)
+        self.assertIs(text.punctuation_table(), table)
+        self.assertEqual(text.depunctuate(u"Mr. String?"), u"Mr String")
+        self.assertIs(text.punctuation_table(), table)
+
+    def test_normalize_cache_bounded(self):
+        """
+        Test that the normalize memo does not grow without bound
+        """
+        text.clear_cache()
+        for idx in xrange(text.NORMALIZE_CACHE_SIZE + 10):
+            text.normalize(u"PAM%i" % idx)
+        self.assertLessEqual(len(text._normalized), text.NORMALIZE_CACHE_SIZE)
+
+    def test_normalize_many(self):
+        """
+        Test the batch normalize function
+        """
+        original = [u"Litson, Gary", None, u"LITSON  GARY", "  PAM60 "]
+        expected = [u"litson gary", None, u"litson gary", "pam60"]
+
+        self.assertEqual(expected, text.normalize_many(original))
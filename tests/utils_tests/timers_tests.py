@@ -0,0 +1,129 @@
+# tests.utils_tests.timers_tests
+# Tests for the per-stage timers and counters
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Tue Aug 05 11:20:36 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: timers_tests.py [] benjamin@bengfort.com $
+
+"""
+Tests for the per-stage timers and counters
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import os
+import unittest
+
+from zerocycle.utils.timers import *
+from zerocycle.ingest.monthly import MonthlyReportReader
+
+##########################################################################
+## Fixtures
+##########################################################################
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "..", "fixtures")
+MONTHLY  = os.path.join(FIXTURES, "march2014.xls")
+
+##########################################################################
+## TestCases
+##########################################################################
+
+class ProfilerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.profiler = Profiler()
+
+    def test_disabled(self):
+        """
+        Assert a disabled profiler leaves code untouched
+        """
+        func  = lambda: 42
+        items = [1, 2, 3]
+        self.assertIs(self.profiler.timer("stage"), NULL_TIMER)
+        self.assertIs(self.profiler.wrap("stage", func), func)
+        self.assertIs(self.profiler.iterate("stage", items), items)
+
+        with self.profiler.timer("stage"):
+            self.profiler.count("counter")
+        self.assertEqual(dict(self.profiler.seconds), {})
+        self.assertEqual(dict(self.profiler.counters), {})
+
+    def test_enabled(self):
+        """
+        Assert an enabled profiler times stages and counts
+        """
+        self.profiler.enable()
+        with self.profiler.timer("read"):
+            self.profiler.count("rows", 3)
+
+        double = self.profiler.wrap("read.double", lambda x: x * 2)
+        self.assertEqual(double(21), 42)
+        self.assertEqual(list(self.profiler.iterate("write", [1, 2, 3])), [1, 2, 3])
+
+        self.assertEqual(self.profiler.calls, {"read": 1, "read.double": 1, "write": 3})
+        self.assertEqual(self.profiler.counters, {"rows": 3})
+        self.assertTrue(all(seconds >= 0 for seconds in self.profiler.seconds.values()))
+
+        self.profiler.reset()
+        self.assertEqual(dict(self.profiler.calls), {})
+
+    def test_report(self):
+        """
+        Assert the report nests parts beneath their stage
+        """
+        self.profiler.add("read", 2.0)
+        self.profiler.add("read.handle_row", 1.5, 10)
+        self.profiler.add("commit", 0.5)
+        self.profiler.enable().count("rows", 100)
+
+        lines = self.profiler.report(elapsed=2.5, rows=100)
+        self.assertEqual([line.split()[0] for line in lines], ["stage", "read", "handle_row", "(other)", "commit", "rows", "100"])
+        self.assertIn("80.0%", lines[1])
+        self.assertIn("  handle_row", lines[2])
+        self.assertIn("0.500", lines[3])
+        self.assertEqual(lines[-1], "100 rows in 2.500 seconds, 40.0 rows/sec")
+
+    def test_merge(self):
+        """
+        Assert the snapshot of another profiler is merged beneath a stage
+        """
+        worker = Profiler().enable()
+        worker.add("read", 2.0)
+        worker.add("read.handle_row", 1.5, 10)
+        worker.count("rows", 5)
+
+        self.profiler.add("read", 0.5)
+        self.profiler.merge(worker.snapshot(), "workers")
+        self.profiler.merge(worker.snapshot(), "workers")
+
+        self.assertEqual(self.profiler.seconds, {"read": 0.5, "workers": 4.0, "workers.read": 4.0, "workers.read.handle_row": 3.0})
+        self.assertEqual(self.profiler.calls["workers"], 2)
+        self.assertEqual(self.profiler.calls["workers.read.handle_row"], 20)
+        self.assertEqual(self.profiler.counters, {"rows": 10})
+
+class ReaderProfileTests(unittest.TestCase):
+
+    def tearDown(self):
+        profiler.disable().reset()
+
+    def test_reader_stages(self):
+        """
+        Assert reader stages are timed when the profiler is enabled
+        """
+        reader = MonthlyReportReader(MONTHLY)
+        self.assertNotIn("handle_row", reader.__dict__)
+
+        profiler.reset().enable()
+        reader = MonthlyReportReader(MONTHLY)
+        items  = list(reader)
+
+        self.assertEqual(profiler.calls["read.construct"], len(items))
+        self.assertEqual(profiler.calls["read.handle_item"], len(items))
+        self.assertEqual(profiler.calls["read.open"], 1)
+        self.assertGreater(profiler.calls["read.handle_row"], len(items))
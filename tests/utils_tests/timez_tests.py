@@ -18,6 +18,7 @@ Tests for the timez utility package
 ##########################################################################
 
 import unittest
+import threading
 
 from zerocycle.utils.timez import *
 from dateutil.tz import tzlocal, tzutc
@@ -156,3 +157,155 @@ class ClockTest(unittest.TestCase):
         clk = Clock("iso", local=False)
         lcl = self.get_now_times()[1]
         self.assertEqual(str(clk), lcl.strftime("%Y-%m-%dT%H:%M:%S%z"))
+
+    def test_local_timezone(self):
+        """
+        Assert the local timezone is resolved once
+        """
+        self.assertIs(Clock.localnow().tzinfo, LOCAL_TZ)
+        self.assertIs(Clock.localnow().tzinfo, Clock.localnow().tzinfo)
+
+class BatchClockTest(unittest.TestCase):
+
+    def test_batch_clock(self):
+        """
+        Assert localnow is stopped within a batch clock
+        """
+        clock = BatchClock()
+        with clock:
+            self.assertIs(Clock.localnow(), clock.now)
+            self.assertIs(Clock.localnow(), clock.now)
+        self.assertIsNot(Clock.localnow(), clock.now)
+
+    def test_nested_clocks(self):
+        """
+        Assert the outer clock is restored after an inner one
+        """
+        outer = BatchClock(datetime(2014, 3, 3, tzinfo=tzutc()))
+        inner = BatchClock(datetime(2014, 3, 4, tzinfo=tzutc()))
+        with outer:
+            with inner:
+                self.assertEqual(Clock.localnow(), inner.now)
+            self.assertEqual(Clock.localnow(), outer.now)
+
+            with outer:
+                self.assertEqual(Clock.localnow(), outer.now)
+            self.assertEqual(Clock.localnow(), outer.now)
+
+    def test_thread_isolation(self):
+        """
+        Assert a batch clock does not stop the clock of other threads
+        """
+        clock  = BatchClock(datetime(2014, 3, 3, tzinfo=tzutc()))
+        result = []
+        with clock:
+            thread = threading.Thread(target=lambda: result.append(Clock.localnow()))
+            thread.start()
+            thread.join()
+        self.assertNotEqual(result[0], clock.now)
+
+class DateParserTest(unittest.TestCase):
+
+    def test_numeric_format(self):
+        """
+        Assert numeric formats are parsed like strptime
+        """
+        parser = date_parser("%m/%d/%Y")
+        self.assertIsNotNone(parser.numeric)
+        for value in ("03/14/2014", "3/4/2014", "12/31/1999"):
+            self.assertEqual(parser(value), datetime.strptime(value, "%m/%d/%Y"))
+        self.assertEqual(parser.date("03/14/2014"), datetime(2014, 3, 14).date())
+
+    def test_compiled_once(self):
+        """
+        Assert parsers are compiled once per format
+        """
+        self.assertIs(date_parser("%Y-%m-%d"), date_parser("%Y-%m-%d"))
+        self.assertIsNot(date_parser("%Y-%m-%d"), date_parser("%Y-%m-%d", 0))
+
+    def test_named_format(self):
+        """
+        Assert names, 12 hour clocks and fractions are parsed
+        """
+        parser = date_parser("%a %b %d %I:%M:%S.%f %p %y")
+        self.assertEqual(parser("Fri Mar 14 01:05:09.25 PM 14"), datetime(2014, 3, 14, 13, 5, 9, 250000))
+        self.assertEqual(parser("fri mar 14 12:05:09.25 am 99"), datetime(1999, 3, 14, 0, 5, 9, 250000))
+        self.assertEqual(date_parser("%B %d, %Y")("March 4, 2014"), datetime(2014, 3, 4))
+
+    def test_utc_offsets(self):
+        """
+        Assert UTC offsets, including minutes, are converted to UTC
+        """
+        parser = date_parser(ISO8601_DATETIME)
+        self.assertEqual(parser("2014-03-14T10:11:12-0430"), datetime(2014, 3, 14, 14, 41, 12, tzinfo=tzutc()))
+        self.assertEqual(parser("2014-03-14T10:11:12+01:00"), datetime(2014, 3, 14, 9, 11, 12, tzinfo=tzutc()))
+        self.assertEqual(parser("2014-03-14T10:11:12Z"), datetime(2014, 3, 14, 10, 11, 12, tzinfo=tzutc()))
+
+    def test_fallback(self):
+        """
+        Assert formats with other directives use strptime
+        """
+        parser = date_parser("%j %Y %z")
+        self.assertIsNone(parser.regex)
+        self.assertEqual(parser("073 2014 +0100"), datetime(2014, 3, 13, 23, tzinfo=tzutc()))
+
+    def test_mismatch(self):
+        """
+        Assert values that do not match the format raise ValueError
+        """
+        parser = date_parser("%m/%d/%Y")
+        for value in ("13/01/2014", "03/14/2014 ", "2014-03-14", "02/30/2014"):
+            with self.assertRaises(ValueError):
+                parser(value)
+
+    def test_xldate(self):
+        """
+        Assert Excel date serials are converted in both datemodes
+        """
+        self.assertEqual(xldate(41701.0), datetime(2014, 3, 3))
+        self.assertEqual(xldate(41701.25), datetime(2014, 3, 3, 6))
+        self.assertEqual(xldate(40239.0, 1), datetime(2014, 3, 3))
+        self.assertEqual(xldate(1.0), datetime(1900, 1, 1))
+        self.assertEqual(xldate(61.0), datetime(1900, 3, 1))
+
+        with self.assertRaises(ValueError):
+            xldate(60.0)
+
+        parser = date_parser("%m/%d/%Y", 0)
+        self.assertEqual(parser(41701.0), datetime(2014, 3, 3))
+        self.assertEqual(parser("03/03/2014"), datetime(2014, 3, 3))
+
+    def test_column(self):
+        """
+        Assert whole columns are parsed into datetime64 arrays
+        """
+        parser = date_parser("%m/%d/%Y")
+        column = parser.column(["03/03/2014", "03/04/2014", "03/03/2014"])
+        self.assertEqual(column.dtype.name, "datetime64[us]")
+        self.assertEqual([value.astype(datetime) for value in column], [datetime(2014, 3, 3), datetime(2014, 3, 4), datetime(2014, 3, 3)])
+
+        column = date_parser("%m/%d/%Y", 0).column([41701.0, 41701.25, 1.0])
+        self.assertEqual([value.astype(datetime) for value in column], [datetime(2014, 3, 3), datetime(2014, 3, 3, 6), datetime(1900, 1, 1)])
+
+    def test_column_missing(self):
+        """
+        Assert empty values are NaT and malformed values only if coerced
+        """
+        parser = date_parser("%m/%d/%Y")
+        column = parser.column(["03/03/2014", "", None, "  ", "03/03/2014"])
+        self.assertEqual(column[0].astype(datetime), datetime(2014, 3, 3))
+        self.assertEqual([str(value) for value in column[1:4]], ["NaT"] * 3)
+
+        with self.assertRaises(ValueError):
+            parser.column(["03/03/2014", "tomorrow"])
+        self.assertEqual(str(parser.column(["03/03/2014", "tomorrow"], coerce=True)[1]), "NaT")
+
+        parser = date_parser("%m/%d/%Y", 0)
+        column = parser.column([41701.0, float('nan')])
+        self.assertEqual(column[0].astype(datetime), datetime(2014, 3, 3))
+        self.assertEqual(str(column[1]), "NaT")
+
+        # Negative serials are refused like they are by xldate
+        self.assertRaises(ValueError, xldate, -1.0)
+        self.assertRaises(ValueError, parser.column, [41701.0, -1.0])
+        self.assertEqual(str(parser.column([41701.0, -1.0], coerce=True)[1]), "NaT")
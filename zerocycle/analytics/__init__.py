@@ -0,0 +1,21 @@
+# zerocycle.analytics
+# Analysis of solid waste pickups
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Thu Jul 31 10:22:45 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: __init__.py [] benjamin@bengfort.com $
+
+"""
+Analysis of solid waste pickups
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+from .frame import PickupFrame
+from .rates import household_rates, overall_rate, route_locations
@@ -0,0 +1,305 @@
+# zerocycle.analytics.frame
+# Columnar in-memory store of pickups for analytics
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Thu Jul 31 10:24:09 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: frame.py [] benjamin@bengfort.com $
+
+"""
+Columnar in-memory store of pickups for analytics.
+
+Loading millions of Pickup ORM instances (each with its instrumentation
+and route relationship) is far too slow and too large for city-wide
+analyses. The PickupFrame instead holds one NumPy array per column: dates
+as days since the epoch, routes and vehicles as dictionary-encoded codes,
+and miles and garbage as floats (NaN where missing). Routes are described
+by per-code arrays of their names, supervisors and service locations.
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import numpy as np
+
+from sqlalchemy import select
+from zerocycle.db.models import Route, Pickup
+
+##########################################################################
+## Module Constants
+##########################################################################
+
+FETCH_SIZE = 50000                          # Rows fetched from the database at a time
+GROUPS     = ('route', 'supervisor', 'vehicle', 'date', 'week', 'month')
+REDUCERS   = ('sum', 'mean', 'count', 'min', 'max')
+
+##########################################################################
+## Helper functions
+##########################################################################
+
+def to_days(dates):
+    """
+    Converts a sequence of dates into an array of days since the epoch.
+    """
+    return np.array(dates, dtype='datetime64[D]').astype(np.int32)
+
+def to_dates(days):
+    """
+    Converts an array of days since the epoch into datetime64 dates.
+    """
+    return np.asarray(days).astype('datetime64[D]')
+
+def encode(values):
+    """
+    Dictionary-encodes a sequence of values, returning the sorted unique
+    values and an array of codes into them.
+    """
+    values = np.array(values, dtype=object)
+    if not len(values):
+        return np.array([], dtype=object), np.array([], dtype=np.int32)
+    labels, codes = np.unique(values, return_inverse=True)
+    return labels, codes.astype(np.int32)
+
+def to_floats(values):
+    """
+    Converts a sequence of numbers with None into a float array with NaN.
+    """
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+##########################################################################
+## PickupFrame
+##########################################################################
+
+class PickupFrame(object):
+    """
+    A columnar set of pickups. Each row is a pickup with the columns:
+
+        date:    int32 days since 1970-01-01
+        route:   int32 code into the route arrays
+        vehicle: int32 code into the vehicles array
+        miles:   float64 miles driven (NaN if unknown)
+        garbage: float64 garbage weight (NaN if unknown)
+
+    Route codes index into the `routes` (names), `supervisors` and
+    `locations` arrays, which are shared by frames filtered from this one.
+    """
+
+    def __init__(self, date, route, vehicle, miles, garbage, routes, vehicles, supervisors=None, locations=None):
+        self.date        = np.asarray(date, dtype=np.int32)
+        self.route       = np.asarray(route, dtype=np.int32)
+        self.vehicle     = np.asarray(vehicle, dtype=np.int32)
+        self.miles       = np.asarray(miles, dtype=np.float64)
+        self.garbage     = np.asarray(garbage, dtype=np.float64)
+        self.routes      = np.asarray(routes, dtype=object)
+        self.vehicles    = np.asarray(vehicles, dtype=object)
+
+        if supervisors is None:
+            supervisors  = [None] * len(self.routes)
+        if locations is None:
+            locations    = [None] * len(self.routes)
+
+        self.supervisors = np.asarray(supervisors, dtype=object)
+        self.locations   = to_floats(locations)
+
+    ##////////////////////////////////////////////////////////////////////
+    ## Constructors
+    ##////////////////////////////////////////////////////////////////////
+
+    @classmethod
+    def from_records(klass, records):
+        """
+        Builds a frame from denormalized pickup dictionaries with the keys
+        date, route, supervisor, vehicle, miles and garbage; for example the
+        items of a MonthlyReportReader.
+        """
+        columns = dict((key, []) for key in ('date', 'route', 'supervisor', 'vehicle', 'miles', 'garbage'))
+        for record in records:
+            for key, column in columns.items():
+                column.append(record.get(key))
+
+        routes, route     = encode(columns['route'])
+        vehicles, vehicle = encode(columns['vehicle'])
+
+        supervisors = np.empty(len(routes), dtype=object)
+        supervisors[route] = columns['supervisor']  # the last supervisor seen
+
+        return klass(
+            to_days(columns['date']), route, vehicle,
+            to_floats(columns['miles']), to_floats(columns['garbage']),
+            routes, vehicles, supervisors,
+        )
+
+    @classmethod
+    def from_reader(klass, reader):
+        """
+        Builds a frame straight from the records of a report reader.
+        """
+        return klass.from_records(reader.items())
+
+    @classmethod
+    def from_database(klass, session, start=None, end=None):
+        """
+        Loads the pickups between the start and end dates (inclusive) from
+        the database with one query for the routes and one query for the
+        pickups, which is fetched in chunks directly into arrays.
+        """
+        routes = session.query(Route.id, Route.name, Route.supervisor, Route.locations).order_by(Route.id).all()
+        ids    = np.array([route[0] for route in routes], dtype=np.int64)
+        index  = np.full(ids.max() + 1 if len(ids) else 1, -1, dtype=np.int32)
+        index[ids] = np.arange(len(ids), dtype=np.int32)
+
+        table  = Pickup.__table__
+        query  = select([table.c.date, table.c.route_id, table.c.vehicle, table.c.miles, table.c.garbage])
+        if start is not None:
+            query = query.where(table.c.date >= start)
+        if end is not None:
+            query = query.where(table.c.date <= end)
+
+        chunks = []
+        result = session.execute(query)
+        while True:
+            rows = result.fetchmany(FETCH_SIZE)
+            if not rows: break
+            date, route_id, vehicle, miles, garbage = zip(*rows)
+            chunks.append((
+                to_days(date), index[np.array(route_id, dtype=np.int64)],
+                np.array(vehicle, dtype=object), to_floats(miles), to_floats(garbage),
+            ))
+
+        if chunks:
+            columns = [np.concatenate(column) for column in zip(*chunks)]
+        else:
+            columns = [[]] * 5
+        vehicles, vehicle = encode(columns[2])
+
+        return klass(
+            columns[0], columns[1], vehicle, columns[3], columns[4],
+            [route[1] for route in routes], vehicles,
+            [route[2] for route in routes], [route[3] for route in routes],
+        )
+
+    ##////////////////////////////////////////////////////////////////////
+    ## Filtering and joining
+    ##////////////////////////////////////////////////////////////////////
+
+    def __len__(self):
+        return len(self.date)
+
+    def __str__(self):
+        return "<%s of %i pickups on %i routes>" % (self.__class__.__name__, len(self), len(self.routes))
+
+    def take(self, mask):
+        """
+        Returns a new frame of the rows selected by a boolean mask or an
+        array of indices. The route and vehicle arrays are shared.
+        """
+        return self.__class__(
+            self.date[mask], self.route[mask], self.vehicle[mask],
+            self.miles[mask], self.garbage[mask], self.routes, self.vehicles,
+            self.supervisors, self.locations,
+        )
+
+    def where(self, start=None, end=None, routes=None, supervisor=None, vehicles=None):
+        """
+        Returns the pickups between the start and end dates (inclusive), on
+        the given route names, of the given supervisor or by the vehicles.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if start is not None:
+            mask &= self.date >= to_days([start])[0]
+        if end is not None:
+            mask &= self.date <= to_days([end])[0]
+        if routes is not None:
+            mask &= np.in1d(self.route, np.flatnonzero(np.in1d(self.routes, list(routes))))
+        if supervisor is not None:
+            mask &= (self.supervisors == supervisor)[self.route]
+        if vehicles is not None:
+            mask &= np.in1d(self.vehicle, np.flatnonzero(np.in1d(self.vehicles, list(vehicles))))
+        return self.take(mask)
+
+    def join_locations(self, locations):
+        """
+        Joins the service locations of routes, given as a dictionary of
+        route name to locations (e.g. from an AccountsReportReader), onto
+        the frame. Returns a new frame; unmatched routes keep theirs.
+        """
+        joined = self.locations.copy()
+        for code, name in enumerate(self.routes):
+            if name in locations:
+                joined[code] = locations[name]
+
+        return self.__class__(
+            self.date, self.route, self.vehicle, self.miles, self.garbage,
+            self.routes, self.vehicles, self.supervisors, joined,
+        )
+
+    def households(self):
+        """
+        Returns the service locations of the route of every pickup.
+        """
+        return self.locations[self.route]
+
+    ##////////////////////////////////////////////////////////////////////
+    ## Grouping
+    ##////////////////////////////////////////////////////////////////////
+
+    def keys(self, by):
+        """
+        Returns (labels, codes) for grouping the frame by route, supervisor,
+        vehicle, date, week (starting on Mondays) or month.
+        """
+        if by == 'route':
+            return self.routes, self.route
+
+        if by == 'supervisor':
+            labels, codes = encode(self.supervisors)
+            return labels, codes[self.route] if len(codes) else self.route
+
+        if by == 'vehicle':
+            return self.vehicles, self.vehicle
+
+        if by == 'date':
+            days = self.date
+        elif by == 'week':
+            days = self.date - (self.date + 3) % 7     # 1970-01-01 is a Thursday
+        elif by == 'month':
+            days = to_dates(self.date).astype('datetime64[M]').astype('datetime64[D]').astype(np.int32)
+        else:
+            raise ValueError("Cannot group by '%s', choose from %s" % (by, ", ".join(GROUPS)))
+
+        labels, codes = np.unique(days, return_inverse=True)
+        return to_dates(labels), codes
+
+    def groupby(self, by, column='garbage', how='sum'):
+        """
+        Groups the frame by route, supervisor, vehicle, date, week or month
+        and reduces a column with sum, mean, count, min or max; missing
+        values are ignored. Returns a tuple of (labels, values) arrays.
+        """
+        if how not in REDUCERS:
+            raise ValueError("Cannot reduce by '%s', choose from %s" % (how, ", ".join(REDUCERS)))
+
+        labels, codes = self.keys(by)
+        values  = getattr(self, column) if isinstance(column, basestring) else np.asarray(column)
+        present = ~np.isnan(values)
+        codes, values = codes[present], values[present]
+        size    = len(labels)
+
+        if how == 'count':
+            return labels, np.bincount(codes, minlength=size)
+
+        if how in ('sum', 'mean'):
+            result = np.bincount(codes, weights=values, minlength=size)
+            if how == 'mean':
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    result = result / np.bincount(codes, minlength=size)
+            return labels, result
+
+        result = np.full(size, np.nan)
+        reduce = np.fmax if how == 'max' else np.fmin
+        reduce.at(result, codes, values)
+        return labels, result
@@ -0,0 +1,82 @@
+# zerocycle.analytics.rates
+# Per-household solid waste rates
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Fri Aug 01 09:18:52 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: rates.py [] benjamin@bengfort.com $
+
+"""
+Per-household solid waste rates.
+
+Every pickup collects the garbage of the service locations (households) on
+its route. The per-household rate of a group of pickups is the total
+garbage that was collected divided by the total number of households that
+were serviced, i.e. the average garbage per household per pickup. Because
+it is a ratio of sums, the rate of a supervisor, day, week or month weights
+each route by its number of households.
+
+Rates are computed over a PickupFrame with bincount reductions, so there
+is never a Python loop over the pickups.
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import numpy as np
+
+from zerocycle.ingest.accounts import AccountsReportReader
+
+##########################################################################
+## Rate functions
+##########################################################################
+
+def household_rates(frame, by='route', column='garbage'):
+    """
+    Computes the per-household rate of the column (garbage by default,
+    but miles works too) for every group of the frame, grouped by route,
+    supervisor, vehicle, date, week or month. Pickups with an unknown
+    column value or on routes with unknown locations are ignored.
+
+    Returns a tuple of (labels, rates) arrays.
+    """
+    households = frame.households()
+    valid = ~np.isnan(households) & ~np.isnan(getattr(frame, column))
+    frame, households = frame.take(valid), households[valid]
+
+    labels, totals = frame.groupby(by, column, 'sum')
+    labels, served = frame.groupby(by, households, 'sum')
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return labels, np.true_divide(totals, served)
+
+def overall_rate(frame, column='garbage'):
+    """
+    Computes the per-household rate of the column over the entire frame.
+    """
+    households = frame.households()
+    values = getattr(frame, column)
+    valid  = ~np.isnan(households) & ~np.isnan(values)
+    served = households[valid].sum()
+    return values[valid].sum() / served if served else np.nan
+
+def route_locations(path):
+    """
+    Reads the service locations of every route from an accounts report
+    with columnar chunks, returning a dictionary of route name to the
+    number of locations, which can be joined onto a PickupFrame. Routes
+    whose number of locations is missing are left out.
+    """
+    locations = {}
+    for chunk in AccountsReportReader(path).chunks():
+        names, counts = chunk["ROUTE NAME"], chunk["SERVICE LOCATIONS"]
+        if counts.dtype.kind == 'f':
+            known  = ~np.isnan(counts)
+            names  = names[known]
+            counts = counts[known].astype(np.int64)
+        locations.update(zip(names, counts))
+    return locations
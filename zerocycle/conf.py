@@ -29,9 +29,20 @@ However, this will raise an exception if the setting is not found.
 
 Note: Keys are CASE insensitive
 
-Note: Settings can be modified directly by settings.mysetting = newsetting
-however, this is not recommended, and settings should be fetched via the
-dictionary-like access.
+Nested settings can be fetched in one lookup with a dotted key:
+
+    uri = settings['database.uri']
+
+Note: The configuration files are not read (nor is YAML imported) until a
+setting is first accessed, so importing this module is cheap. The parsed
+files are cached on disk (see Configuration.CACHE_PATH) for as long as
+their mtimes do not change, so most processes do not parse YAML at all.
+
+Note: The settings are an immutable snapshot of the loaded configuration.
+They cannot be assigned to; use settings.override, e.g. in tests:
+
+    with settings.overridden(database={'scheme': 'sqlite', 'name': path}):
+        ...
 """
 
 ##########################################################################
@@ -39,9 +50,29 @@ dictionary-like access.
 ##########################################################################
 
 import os
-import yaml
+import cPickle as pickle
 
 from copy import deepcopy
+from collections import Mapping
+from contextlib import contextmanager
+
+##########################################################################
+## Helper functions
+##########################################################################
+
+def format_options(options):
+    """
+    Formats (option, value) pairs as aligned lines of at most 80 columns.
+    """
+    s = ""
+    for opt, val in options:
+        r = repr(val)
+        r = " ".join(r.split())
+        wlen = 76-max(len(opt),10)
+        if len(r) > wlen:
+            r = r[:wlen-3]+"..."
+        s += "%-10s = %s\n" % (opt, r)
+    return s[:-1]
 
 ##########################################################################
 ## Configuration Base Class
@@ -85,20 +116,87 @@ class Configuration(object):
         os.path.abspath('.zerocycle.yaml')                # Local directory configuration
     ]
 
+    ## Where the parsed CONF_PATHS are cached, None to always parse them
+    CACHE_PATH = os.path.expandvars('$HOME/.zerocycle/conf.cache')
+
     @classmethod
-    def load(klass):
+    def load(klass, cache=True):
         """
         Insantiates the configuration by attempting to load the
         configuration from YAML files specified by the CONF_PATH module
         variable. This should be the main entry point for configuration.
         """
         config = klass()
+        for document in klass.documents(cache):
+            config.configure(document)
+        return config
+
+    @classmethod
+    def sources(klass):
+        """
+        Returns the (path, mtime, size) of each of the CONF_PATHS, with
+        None as the mtime and size of the paths that do not exist.
+        """
+        sources = []
         for path in klass.CONF_PATHS:
-            if os.path.exists(path):
-                with open(path, 'r') as conf:
-                    config.configure(yaml.load(conf))
+            try:
+                stat = os.stat(path)
+                sources.append((path, stat.st_mtime, stat.st_size))
+            except OSError:
+                sources.append((path, None, None))
+        return tuple(sources)
+
+    @classmethod
+    def documents(klass, cache=True):
+        """
+        Returns the parsed YAML documents of the CONF_PATHS that exist, in
+        order. If cache is True, the documents are read from the CACHE_PATH
+        when it was written from the same files with the same mtimes and
+        sizes; otherwise they are parsed and the cache is rewritten.
+        """
+        sources = klass.sources()
+        if all(mtime is None for path, mtime, size in sources):
+            return []
+
+        cache = klass.CACHE_PATH if cache else None
+        if cache:
+            try:
+                with open(cache, 'rb') as data:
+                    key, documents = pickle.load(data)
+                if key == sources:
+                    return documents
+            except Exception:
+                pass # A missing, stale or unreadable cache is parsed again
+
+        import yaml # Deferred, since PyYAML is slow to import
+
+        documents = []
+        for path, mtime, size in sources:
+            if mtime is None: continue
+            with open(path, 'r') as conf:
+                documents.append(yaml.load(conf))
+
+        if cache:
+            write_cache(cache, (sources, documents))
+        return documents
+
+    def copy(self):
+        """
+        Returns a deep copy of the configuration, including the nested
+        configurations that are defaults of the class.
+        """
+        config = deepcopy(self)
+        for opt, val in self.options():
+            if isinstance(val, Configuration):
+                config.__dict__[opt] = val.copy()
         return config
 
+    def snapshot(self):
+        """
+        Returns an immutable, flattened Snapshot of the configuration.
+        """
+        return Snapshot(self)
+
     def configure(self, conf={}):
         """
         Allows updating of the configuration via a dictionary of
@@ -160,15 +258,94 @@ class Configuration(object):
         return str(self)
 
     def __str__(self):
-        s = ""
-        for opt, val in self.options():
-            r = repr(val)
-            r = " ".join(r.split())
-            wlen = 76-max(len(opt),10)
-            if len(r) > wlen:
-                r = r[:wlen-3]+"..."
-            s += "%-10s = %s\n" % (opt, r)
-        return s[:-1]
+        return format_options(self.options())
+
+def write_cache(path, value):
+    """
+    Pickles the value to path by way of a temporary file, so that readers
+    never see a partial cache. The cache is an optimization, so failing to
+    write it is ignored.
+    """
+    import tempfile
+
+    try:
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        fd, temp = tempfile.mkstemp(dir=directory, prefix=".conf-")
+        with os.fdopen(fd, 'wb') as data:
+            pickle.dump(value, data, pickle.HIGHEST_PROTOCOL)
+        os.rename(temp, path)
+    except (IOError, OSError):
+        pass
+
+##########################################################################
+## Configuration Snapshot
+##########################################################################
+
+class Snapshot(Mapping):
+    """
+    An immutable, flattened view of a configuration: every option and the
+    option of every nested configuration (as a dotted key, e.g.
+    "database.uri") is computed once, so that a lookup is a single
+    dictionary access. Nested configurations are snapshots themselves and
+    options can also be fetched as attributes (snapshot.database.uri).
+    Like the configuration, keys are case insensitive.
+    """
+
+    __slots__ = ('_name', '_data', '_keys')
+
+    def __init__(self, config):
+        data = {}
+        keys = []
+        for opt, val in config.options():
+            if isinstance(val, Configuration):
+                val = Snapshot(val)
+                for key, sub in val._data.items():
+                    data["%s.%s" % (opt, key)] = sub
+            data[opt] = val
+            keys.append(opt)
+
+        object.__setattr__(self, '_name', config.__class__.__name__)
+        object.__setattr__(self, '_data', data)
+        object.__setattr__(self, '_keys', tuple(keys))
+
+    def __getitem__(self, key):
+        try:
+            return self._data[key]
+        except KeyError:
+            pass
+
+        try:
+            return self._data[key.lower()]
+        except (KeyError, AttributeError):
+            raise KeyError("%s has no configuration '%s'" % (self._name, key))
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError as e:
+            raise AttributeError(e.args[0])
+
+    def __setattr__(self, name, value):
+        raise TypeError("%s settings are immutable, use settings.override" % self._name)
+
+    __delattr__ = __setattr__
+
+    def __repr__(self):
+        return str(self)
+
+    def __str__(self):
+        return format_options((key, self._data[key]) for key in self._keys)
 
 ##########################################################################
 ## LoggingConfiguration
@@ -189,6 +366,14 @@ class DatabaseConfiguration(Configuration):
     password: the password for user connection
     host: the hostname of the database
     port: the port of the database
+    pool_size: connections kept open in the pool (ignored by sqlite)
+    max_overflow: connections opened beyond pool_size under load
+    pool_recycle: seconds after which a pooled connection is replaced,
+        -1 to never replace them
+    pool_pre_ping: test connections as they are checked out of the pool
+    server_timestamps: stamp the created and updated columns with the
+        database's now() rather than the local time (read when the first
+        engine is created, and only affects the schema of new tables)
     """
     scheme          = "postgresql"
     name            = "zerocycle"
@@ -196,6 +381,11 @@ class DatabaseConfiguration(Configuration):
     password        = ""
     host            = "127.0.0.1"
     port            = 5432
+    pool_size       = 5
+    max_overflow    = 10
+    pool_recycle    = 3600
+    pool_pre_ping   = False
+    server_timestamps = False
 
     @property
     def uri(self):
@@ -214,6 +404,23 @@ class DatabaseConfiguration(Configuration):
             db     = self.name
         )
 
+##########################################################################
+## CacheConfiguration
+##########################################################################
+
+class CacheConfiguration(Configuration):
+    """
+    This object contains the default configuration of the parsed report
+    cache.
+
+    directory: where to store cache files, None to store them next to the
+        report that they were parsed from
+    maxsize: the total size in bytes of the cache files in a directory
+        before the least recently used files are evicted
+    """
+    directory       = None
+    maxsize         = 268435456
+
 ##########################################################################
 ## Zerocycle Configuration Defaults
 ##########################################################################
@@ -228,6 +435,7 @@ class ZerocycleConfiguration(Configuration):
     debug           = True
     testing         = False
     database        = DatabaseConfiguration()
+    cache           = CacheConfiguration()
 
 class TestingConfiguration(ZerocycleConfiguration):
     """
@@ -239,12 +447,112 @@ class TestingConfiguration(ZerocycleConfiguration):
     database        = DatabaseConfiguration()
 
 ##########################################################################
-## Import this loaded Configuration
+## Lazily loaded Configuration
+##########################################################################
+
+class LazyConfiguration(object):
+    """
+    Stands in for the configuration returned by loader, which is called
+    the first time a setting is accessed. Settings are looked up in an
+    immutable Snapshot of the configuration; they are changed by
+    `override`, which replaces the snapshot with one of an updated copy
+    of the configuration until `restore` is called with what it returned.
+    """
+
+    def __init__(self, loader):
+        self.__dict__['_loader']   = loader
+        self.__dict__['_wrapped']  = None
+        self.__dict__['_snapshot'] = None
+
+    def _configuration(self):
+        if self._wrapped is None:
+            self._install(self._loader())
+        return self._wrapped
+
+    def _install(self, config):
+        self.__dict__['_wrapped']  = config
+        self.__dict__['_snapshot'] = config.snapshot()
+
+    @property
+    def loaded(self):
+        return self._wrapped is not None
+
+    @property
+    def snapshot(self):
+        if self._snapshot is None:
+            self._configuration()
+        return self._snapshot
+
+    def get(self, key, default=None):
+        return self.snapshot.get(key, default)
+
+    def override(self, conf=None, **options):
+        """
+        Replaces the settings with those of a copy of the configuration
+        that is configured with conf (a dictionary or a configuration)
+        and then the keyword options, which may be dictionaries of the
+        options of nested configurations. Returns the configuration that
+        was replaced, to be passed to `restore`.
+        """
+        previous = self._configuration()
+        config   = previous.copy()
+        config.configure(deepcopy(conf))
+        config.configure(deepcopy(options))
+        self._install(config)
+        return previous
+
+    def restore(self, previous):
+        """
+        Puts back the configuration that was replaced by `override`.
+        """
+        self._install(previous)
+
+    @contextmanager
+    def overridden(self, conf=None, **options):
+        """
+        Overrides the settings for the duration of the with block.
+        """
+        previous = self.override(conf, **options)
+        try:
+            yield self
+        finally:
+            self.restore(previous)
+
+    def __getattr__(self, name):
+        return getattr(self.snapshot, name)
+
+    def __setattr__(self, name, value):
+        raise TypeError("settings are immutable, use settings.override")
+
+    __delattr__ = __setattr__
+
+    def __getitem__(self, key):
+        return self.snapshot[key]
+
+    def __contains__(self, key):
+        return key in self.snapshot
+
+    def __repr__(self):
+        return repr(self.snapshot)
+
+    def __str__(self):
+        return str(self.snapshot)
+
+def load_settings():
+    """
+    Loads the Zerocycle configuration, with the testing defaults if the
+    ZEROCYCLE_TESTING environment variable is set.
+    """
+    settings = ZerocycleConfiguration.load()
+    if bool(int(os.environ.get("ZEROCYCLE_TESTING", 0))):
+        settings.configure(TestingConfiguration())
+    return settings
+
+##########################################################################
+## Import this Configuration
 ##########################################################################
 
-settings = ZerocycleConfiguration.load()
-if bool(int(os.environ.get("ZEROCYCLE_TESTING", 0))):
-    settings.configure(TestingConfiguration())
+settings = LazyConfiguration(load_settings)
 
 if __name__ == '__main__':
     print settings
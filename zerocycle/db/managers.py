@@ -10,7 +10,10 @@
 # ID: managers.py [] benjamin@bengfort.com $
 
 """
-Management methods for interacting with models
+Management methods for interacting with models. Besides get_or_create, the
+managers compile aggregations (sum, avg, count, min, max) grouped by
+columns, related columns or date buckets into a single GROUP BY query so
+that totals are computed by the database rather than in Python.
 """
 
 ##########################################################################
@@ -18,7 +21,60 @@ Management methods for interacting with models
 ##########################################################################
 
 from zerocycle.db.models import *
-from sqlalchemy.sql.expression import ClauseElement
+from sqlalchemy import func, cast, and_, or_
+from sqlalchemy.sql.expression import ClauseElement, FunctionElement
+from sqlalchemy.ext.compiler import compiles
+
+##########################################################################
+## Module Constants
+##########################################################################
+
+AGGREGATES = {
+    'sum':   func.sum,
+    'avg':   func.avg,
+    'count': func.count,
+    'min':   func.min,
+    'max':   func.max,
+}
+
+BUCKETS = ('day', 'week', 'month', 'year')
+
+CHUNK_SIZE = 500    # Keys resolved per query by get_or_create_many
+
+##########################################################################
+## Date buckets
+##########################################################################
+
+class date_bucket(FunctionElement):
+    """
+    Truncates a date to the start of its day, week (Monday), month or year;
+    compiled for each database dialect below.
+    """
+
+    type = Date()
+    name = 'date_bucket'
+
+    def __init__(self, bucket, expr, **kwargs):
+        if bucket not in BUCKETS:
+            raise ValueError("Cannot bucket dates by '%s', choose from %s" % (bucket, ", ".join(BUCKETS)))
+        self.bucket = bucket
+        super(date_bucket, self).__init__(expr, **kwargs)
+
+@compiles(date_bucket)
+def compile_date_bucket(element, compiler, **kwargs):
+    expr = element.clauses.clauses[0]
+    return compiler.process(cast(func.date_trunc(element.bucket, expr), Date))
+
+@compiles(date_bucket, 'sqlite')
+def compile_sqlite_date_bucket(element, compiler, **kwargs):
+    expr = element.clauses.clauses[0]
+    if element.bucket == 'day':
+        return compiler.process(func.date(expr))
+    if element.bucket == 'week':
+        return compiler.process(func.date(expr, '-6 days', 'weekday 1'))
+    if element.bucket == 'month':
+        return compiler.process(func.strftime('%Y-%m-01', expr))
+    return compiler.process(func.strftime('%Y-01-01', expr))
 
 ##########################################################################
 ## Manager Class
@@ -29,9 +85,95 @@ class Manager(object):
     Provides Django-like queries on the models ...
     """
 
+    ## Column that date buckets and date ranges apply to
+    date_field = 'date'
+
     def __init__(self, model):
         self.model = model
 
+    def group_column(self, name):
+        """
+        Returns the column expression to group or filter by for a name,
+        either a date bucket (day, week, month, year) or a model column.
+        Subclasses add related columns along with the joins they need.
+        """
+        if name in BUCKETS:
+            return date_bucket(name, getattr(self.model, self.date_field)).label(name), None
+
+        column = getattr(self.model, name, None)
+        if column is None or not hasattr(column, 'property'):
+            raise ValueError("Cannot group %s by '%s'" % (self.model.__name__, name))
+        return column.label(name), None
+
+    def aggregates(self, session, columns, how='sum', by=(), start=None, end=None, **filters):
+        """
+        Builds a single GROUP BY query that reduces the columns with how
+        (sum, avg, count, min or max) grouped by the names in by, between
+        the start and end dates (inclusive). Keyword filters match group
+        names against a value or a list of values.
+        """
+        if how not in AGGREGATES:
+            raise ValueError("Cannot aggregate by '%s', choose from %s" % (how, ", ".join(sorted(AGGREGATES))))
+
+        if isinstance(columns, basestring): columns = (columns,)
+        if isinstance(by, basestring): by = (by,)
+
+        joins  = []
+        groups = []
+        for name in by:
+            column, join = self.group_column(name)
+            groups.append(column)
+            if join is not None and join not in joins:
+                joins.append(join)
+
+        values = [AGGREGATES[how](getattr(self.model, column)).label(column) for column in columns]
+        query  = session.query(*(groups + values)).select_from(self.model)
+        query  = self.filter_query(query, joins, start, end, **filters)
+
+        if groups:
+            query = query.group_by(*groups).order_by(*groups)
+        return query
+
+    def filter(self, session, start=None, end=None, **filters):
+        """
+        Returns a query of the instances between the start and end dates
+        (inclusive) that match the keyword filters, as in `aggregates`.
+        """
+        return self.filter_query(session.query(self.model), [], start, end, **filters)
+
+    def filter_query(self, query, joins, start=None, end=None, **filters):
+        """
+        Adds the keyword filters on group names, the date range and the
+        joins that they (and the groups in joins) need to a query.
+        """
+        joins = list(joins)
+        for name, value in filters.items():
+            column, join = self.group_column(name)
+            if join is not None and join not in joins:
+                joins.append(join)
+            column = column.element
+            if isinstance(value, (list, tuple, set)):
+                query = query.filter(column.in_(value))
+            else:
+                query = query.filter(column == value)
+
+        for join in joins:
+            query = query.join(join)
+
+        field = getattr(self.model, self.date_field, None)
+        if start is not None:
+            query = query.filter(field >= start)
+        if end is not None:
+            query = query.filter(field <= end)
+        return query
+
+    def aggregate(self, session, columns, how='sum', by=(), start=None, end=None, **filters):
+        """
+        Executes the aggregation query described in `aggregates` and returns
+        a list of named tuples of the group labels and the reduced values.
+        """
+        return self.aggregates(session, columns, how, by, start, end, **filters).all()
+
     def get_or_create(self, session, defaults=None, **kwargs):
         """
         Fetches the object from the database or creates it, returns the
@@ -47,7 +189,122 @@ class Manager(object):
             instance = self.model(**params)
             return instance, True
 
+    def get_or_create_many(self, session, keys, defaults=None, chunk_size=CHUNK_SIZE):
+        """
+        Like get_or_create for an iterable of dictionaries of keyword
+        filters, but fetches the existing instances with a single query
+        per chunk of keys and creates the missing instances in one pass.
+        Returns a list of (instance, created) tuples in the order of the
+        keys; a repeated key gets the same instance, created only once.
+
+        Instances are matched to keys by their attributes, so unlike
+        get_or_create the values of the keys cannot be SQL expressions,
+        and every key must have at least one field.
+        """
+        keys    = [dict(key) for key in keys]
+        found   = {}
+        results = []
+
+        for key in keys:
+            if not key:
+                raise ValueError("cannot get or create %s by an empty key" % self.model.__name__)
+            for field, value in key.items():
+                if isinstance(value, ClauseElement):
+                    raise ValueError("cannot get or create many %s by an expression of %s" % (self.model.__name__, field))
+
+        # Keys with the same fields are matched by the same kind of query
+        groups  = {}
+        for key in keys:
+            groups.setdefault(tuple(sorted(key)), set()).add(self.lookup_key(key))
+
+        for fields, lookups in groups.items():
+            columns = [getattr(self.model, field) for field in fields]
+            lookups = list(lookups)
+            for idx in xrange(0, len(lookups), chunk_size):
+                chunk = lookups[idx:idx+chunk_size]
+                if len(columns) == 1:
+                    clause = columns[0].in_([lookup[0][1] for lookup in chunk])
+                else:
+                    clause = or_(*[
+                        and_(*[column == value for column, (field, value) in zip(columns, lookup)])
+                        for lookup in chunk
+                    ])
+                for instance in session.query(self.model).filter(clause):
+                    lookup = tuple((field, getattr(instance, field)) for field in fields)
+                    found.setdefault(lookup, instance)
+
+        for key in keys:
+            lookup = self.lookup_key(key)
+            if lookup in found:
+                results.append((found[lookup], False))
+                continue
+
+            params = dict(key)
+            if defaults:
+                params.update(defaults)
+            found[lookup] = self.model(**params)
+            results.append((found[lookup], True))
+
+        return results
+
+    def lookup_key(self, key):
+        """
+        Returns a hashable lookup of a dictionary of keyword filters.
+        """
+        return tuple(sorted(key.items()))
+
 class RoutesManager(Manager):
 
+    def __init__(self, model=Route):
+        super(RoutesManager, self).__init__(model)
+
     def get_or_create(self, session, name):
         return super(RoutesManager, self).get_or_create(session, name=name)
+
+    def get_or_create_many(self, session, names, defaults=None, chunk_size=CHUNK_SIZE):
+        names = ({'name': name} for name in names)
+        return super(RoutesManager, self).get_or_create_many(session, names, defaults, chunk_size)
+
+class PickupsManager(Manager):
+    """
+    Aggregates pickups by their route and supervisor as well as by their
+    own columns and date buckets, e.g. the monthly garbage totals:
+
+        PickupsManager().aggregate(session, 'garbage', by='month')
+    """
+
+    def __init__(self, model=Pickup):
+        super(PickupsManager, self).__init__(model)
+
+    def group_column(self, name):
+        if name == 'route':
+            return Route.name.label(name), Route
+        if name == 'supervisor':
+            return Route.supervisor.label(name), Route
+        return super(PickupsManager, self).group_column(name)
+
+class DailyRollupsManager(PickupsManager):
+    """
+    Aggregates the daily rollups just like the pickups they total, e.g.
+    the garbage of every route in the week:
+
+        DailyRollupsManager().aggregate(session, 'garbage', by='route', start=monday, end=sunday)
+    """
+
+    def __init__(self, model=DailyRollup):
+        super(DailyRollupsManager, self).__init__(model)
+
+    def group_column(self, name):
+        if name == 'supervisor':
+            return DailyRollup.supervisor.label(name), None
+        return super(DailyRollupsManager, self).group_column(name)
+
+class MonthlyRollupsManager(Manager):
+    """
+    Aggregates the monthly rollups, whose dates are the month column.
+    """
+
+    date_field = 'month'
+
+    def __init__(self, model=MonthlyRollup):
+        super(MonthlyRollupsManager, self).__init__(model)
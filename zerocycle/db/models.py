@@ -13,22 +13,26 @@
 Zerocycle Models for interacting with the database. These models use the
 SQLAlchemy delcarative base extension to define them in a "Django-like"
 way.
-
-@todo: Should we have a Report model to track reports?
 """
 
 ##########################################################################
 ## Imports
 ##########################################################################
 
-from sqlalchemy import UniqueConstraint
+import os
+import threading
+
+from sqlalchemy import UniqueConstraint, Index
 from sqlalchemy import Column, Integer, Unicode, UnicodeText
 from sqlalchemy import DateTime, Date
 from sqlalchemy.orm import relationship
 from sqlalchemy import ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy import create_engine, event, func
+from sqlalchemy import ColumnDefault, DefaultClause
+from sqlalchemy.exc import DisconnectionError
+from sqlalchemy.engine.url import make_url
 from zerocycle.conf import settings
 from zerocycle.utils.timez import Clock
 from datetime import datetime
@@ -40,6 +44,47 @@ from datetime import datetime
 
 Base = declarative_base() # SQLAlchemy declarative extension
 
+##########################################################################
+## Columns
+##########################################################################
+
+def timestamp(onupdate=False, server=None):
+    """
+    Returns a timezone aware column that defaults to the local time when
+    a row is inserted (and updated, if onupdate). If server, the column
+    defaults to the database's now() instead so that no Python function
+    is called for every row. If server is None, the column is switched to
+    the database's now() by `use_server_timestamps` if the
+    server_timestamps database setting is on when the first engine is
+    created, so the settings are not loaded when the models are imported.
+    """
+    if server:
+        kwargs = {'server_default': func.now()}
+        if onupdate: kwargs['onupdate'] = func.now()
+    else:
+        kwargs = {'default': Clock.localnow}
+        if onupdate: kwargs['onupdate'] = Clock.localnow
+        if server is None: kwargs['info'] = {'timestamp': onupdate}
+
+    return Column(DateTime(timezone=True), **kwargs)
+
+def use_server_timestamps(metadata=None):
+    """
+    Switches the timestamp columns of the metadata (of the models by
+    default) that follow the server_timestamps setting to the database's
+    now(). This must happen before the first session is flushed.
+    """
+    metadata = metadata if metadata is not None else Base.metadata
+    for table in metadata.tables.values():
+        for column in table.columns:
+            if 'timestamp' not in column.info or column.server_default is not None:
+                continue
+
+            column.default = None
+            DefaultClause(func.now())._set_parent_with_dispatch(column)
+            if column.info['timestamp']:
+                ColumnDefault(func.now(), for_update=True)._set_parent_with_dispatch(column)
+
 ##########################################################################
 ## Models
 ##########################################################################
@@ -55,8 +100,8 @@ class Route(Base):
     name          = Column(Unicode(50), unique=True, nullable=False)
     supervisor    = Column(Unicode(50), nullable=True)
     locations     = Column(Integer, nullable=True)
-    created       = Column(DateTime(timezone=True), default=Clock.localnow)
-    updated       = Column(DateTime(timezone=True), default=Clock.localnow, onupdate=Clock.localnow)
+    created       = timestamp()
+    updated       = timestamp(onupdate=True)
 
     def __str__(self):
         return "Route %s" % self.name
@@ -72,25 +117,125 @@ class Pickup(Base):
     )
 
     id            = Column(Integer, primary_key=True, nullable=False)
-    date          = Column(Date, nullable=False)
-    route_id      = Column(Integer, ForeignKey('routes.id'), nullable=False)
+    date          = Column(Date, nullable=False, index=True)
+    route_id      = Column(Integer, ForeignKey('routes.id'), nullable=False, index=True)
     route         = relationship('Route', backref='pickups')
     vehicle       = Column(Unicode(20))
     miles         = Column(Integer)
     garbage       = Column(Integer)
-    created       = Column(DateTime(timezone=True), default=Clock.localnow)
-    updated       = Column(DateTime(timezone=True), default=Clock.localnow, onupdate=Clock.localnow)
+    created       = timestamp()
+    updated       = timestamp(onupdate=True)
 
     def __str__(self):
         return "Pickup on %s for route %s" % (Clock().format(self.date, "isodate"), self.route)
 
+class Report(Base):
+    """
+    Stores a manifest of the report files that have been ingested.
+    """
+
+    __tablename__ = 'reports'
+
+    id            = Column(Integer, primary_key=True, nullable=False)
+    path          = Column(UnicodeText, nullable=False)
+    checksum      = Column(Unicode(40), unique=True, nullable=False)
+    size          = Column(Integer)
+    mtime         = Column(DateTime)  # UTC
+    reader        = Column(Unicode(20))
+    rows          = Column(Integer)
+    created       = timestamp()
+    updated       = timestamp(onupdate=True)
+
+    def __str__(self):
+        return "Report %s" % self.path
+
+class DailyRollup(Base):
+    """
+    Totals of the pickups of a route on a day, maintained incrementally by
+    ingestion. The supervisor of the route is kept so that the monthly
+    rollups can be corrected when a route changes supervisors. The updated
+    time is indexed since its maximum is part of the data version that
+    the service checks on every request.
+    """
+
+    __tablename__  = 'daily_rollups'
+    __table_args__ = (
+        UniqueConstraint('date', 'route_id'),
+        Index('ix_daily_rollups_updated', 'updated'),
+    )
+
+    id            = Column(Integer, primary_key=True, nullable=False)
+    date          = Column(Date, nullable=False, index=True)
+    route_id      = Column(Integer, ForeignKey('routes.id'), nullable=False)
+    route         = relationship('Route')
+    supervisor    = Column(Unicode(50), nullable=False, default=u"")
+    pickups       = Column(Integer, nullable=False, default=0)
+    miles         = Column(Integer, nullable=False, default=0)
+    garbage       = Column(Integer, nullable=False, default=0)
+    updated       = timestamp(onupdate=True)
+
+    def __str__(self):
+        return "Rollup on %s for route %s" % (Clock().format(self.date, "isodate"), self.route)
+
+class MonthlyRollup(Base):
+    """
+    Totals of the pickups of a supervisor's routes in a month, where month
+    is the first day of the month and supervisor is empty if unknown.
+    """
+
+    __tablename__  = 'monthly_rollups'
+    __table_args__ = (
+        UniqueConstraint('month', 'supervisor'),
+    )
+
+    id            = Column(Integer, primary_key=True, nullable=False)
+    month         = Column(Date, nullable=False, index=True)
+    supervisor    = Column(Unicode(50), nullable=False, default=u"")
+    pickups       = Column(Integer, nullable=False, default=0)
+    miles         = Column(Integer, nullable=False, default=0)
+    garbage       = Column(Integer, nullable=False, default=0)
+    updated       = timestamp(onupdate=True)
+
+    def __str__(self):
+        return "Rollup for %s in %s" % (self.supervisor or "unknown supervisor", Clock().format(self.month, "%B %Y"))
+
 ##########################################################################
 ## Database helper methods
 ##########################################################################
 
-def get_engine(uri=None):
-    uri = uri or settings.get('database').uri
-    return create_engine(uri)
+def ping_connection(dbapi_connection, connection_record, connection_proxy):
+    """
+    Pool checkout listener that tests the connection with a trivial query,
+    so that the pool replaces connections the database has dropped instead
+    of handing them out.
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("SELECT 1")
+    except Exception:
+        raise DisconnectionError()
+    finally:
+        cursor.close()
+
+def get_engine(uri=None, **kwargs):
+    """
+    Creates an engine for the uri (the configured database by default)
+    with the pool settings of the database configuration. Keyword
+    arguments are passed to create_engine and override the settings.
+    """
+    uri = uri or settings['database.uri']
+    if not make_url(uri).drivername.startswith('sqlite'):
+        # SQLite uses a NullPool or SingletonThreadPool without a size
+        kwargs.setdefault('pool_size', settings['database.pool_size'])
+        kwargs.setdefault('max_overflow', settings['database.max_overflow'])
+        kwargs.setdefault('pool_recycle', settings['database.pool_recycle'])
+
+    engine = create_engine(uri, **kwargs)
+    if settings['database.server_timestamps']:
+        use_server_timestamps()
+    if settings['database.pool_pre_ping']:
+        event.listen(engine, 'checkout', ping_connection)
+    return engine
 
 def syncdb(uri=None):
     engine = get_engine(uri)
@@ -99,17 +244,65 @@ def syncdb(uri=None):
 
 ## Descriptor for creating and maintaining sessions
 class SessionFactory(object):
+    """
+    Lazily creates the engine and session factory for the configured
+    database (or the uri) the first time a session is requested, guarded
+    by a lock so that threads share a single engine and its pool.
+
+    Calling the factory returns a new session, or with scoped=True the
+    thread-local session of the calling thread, which `remove` closes.
+    The engine is disposed with `dispose`; call it before forking worker
+    processes so that they do not inherit pooled connections. A process
+    that finds itself forked creates an engine of its own.
+    """
 
-    def __init__(self):
+    def __init__(self, uri=None):
+        self.uri     = uri
+        self.pid     = None
         self.engine  = None
         self.factory = None
+        self.scoped  = None
+        self.lock    = threading.RLock()
 
-    def __call__(self):
-        if self.engine is None:
-            self.engine  = get_engine()
-        if self.factory is None:
-            self.factory = sessionmaker(bind=self.engine)
+    def __call__(self, scoped=False):
+        with self.lock:
+            if self.pid != os.getpid():
+                # Pooled connections must not be shared with a forked process,
+                # so a new engine is created for every process that asks.
+                self.pid     = os.getpid()
+                self.engine  = None
+                self.factory = None
+                self.scoped  = None
+            if self.engine is None:
+                self.engine  = get_engine(self.uri)
+            if self.factory is None:
+                self.factory = sessionmaker(bind=self.engine)
+                self.scoped  = scoped_session(self.factory)
+
+        if scoped:
+            return self.scoped()
         return self.factory()
 
+    def remove(self):
+        """
+        Closes and discards the scoped session of the calling thread.
+        """
+        if self.scoped is not None:
+            self.scoped.remove()
+
+    def dispose(self):
+        """
+        Closes every pooled connection of the engine and forgets the
+        engine, which is created again by the next session.
+        """
+        with self.lock:
+            if self.scoped is not None:
+                self.scoped.remove()
+            if self.engine is not None and self.pid == os.getpid():
+                self.engine.dispose()
+            self.engine  = None
+            self.factory = None
+            self.scoped  = None
+
 ## Create session "method"
 create_session = SessionFactory()
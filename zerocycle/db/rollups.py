@@ -0,0 +1,317 @@
+# zerocycle.db.rollups
+# Maintenance of the daily and monthly rollup tables
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Sun Aug 03 14:12:08 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: rollups.py [] benjamin@bengfort.com $
+
+"""
+Maintenance of the daily and monthly rollup tables.
+
+The daily rollups hold the totals of the pickups of each route on each day
+and the monthly rollups the totals of each supervisor's routes in each
+month, so that summary reports read a table whose size does not grow with
+the number of pickups.
+
+Ingestion calls `update_rollups` with the (route_id, date) keys of the
+pickups it wrote. Only the daily rollups of those keys are recomputed and
+the difference between their new and old totals is applied to the monthly
+rollups as a delta. `rebuild_rollups` recomputes both tables from scratch,
+one month per worker process.
+
+Pickups are always credited to the current supervisor of their route, as
+they are by `PickupsManager`, so if a route of the touched keys has moved
+to another supervisor, the daily rollups of all of its other dates are
+recomputed as well and the monthly totals move with them.
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import multiprocessing
+
+from datetime import date, timedelta
+from collections import defaultdict
+from sqlalchemy import select, func, bindparam, and_
+from zerocycle.db.models import Route, Pickup, DailyRollup, MonthlyRollup, create_session
+from zerocycle.utils.timez import Clock
+
+##########################################################################
+## Module Constants
+##########################################################################
+
+CHUNK_SIZE = 500                                # Keys recomputed per query
+TOTALS     = ('pickups', 'miles', 'garbage')    # Columns of the rollups
+
+##########################################################################
+## Helper functions
+##########################################################################
+
+def month_of(day):
+    """
+    Returns the first day of the month of a date.
+    """
+    return day.replace(day=1)
+
+def next_month(month):
+    """
+    Returns the first day of the month after a date.
+    """
+    if month.month == 12:
+        return date(month.year + 1, 1, 1)
+    return date(month.year, month.month + 1, 1)
+
+def daily_totals(start, end, route_ids=None):
+    """
+    Returns a select of the totals of the pickups of every route on every
+    day between the start and end dates (inclusive), with the columns of
+    the daily rollups table (besides its id).
+    """
+    pickups = Pickup.__table__
+    routes  = Route.__table__
+
+    query = select([
+        pickups.c.date,
+        pickups.c.route_id,
+        func.coalesce(routes.c.supervisor, u"").label('supervisor'),
+        func.count(pickups.c.id).label('pickups'),
+        func.coalesce(func.sum(pickups.c.miles), 0).label('miles'),
+        func.coalesce(func.sum(pickups.c.garbage), 0).label('garbage'),
+    ]).select_from(pickups.join(routes))
+
+    query = query.where(pickups.c.date.between(start, end))
+    if route_ids is not None:
+        query = query.where(pickups.c.route_id.in_(route_ids))
+    return query.group_by(pickups.c.date, pickups.c.route_id, routes.c.supervisor)
+
+def monthly_totals(month):
+    """
+    Returns a select of the totals of every supervisor in the month from
+    the daily rollups, with the columns of the monthly rollups table.
+    """
+    daily = DailyRollup.__table__
+    query = select([
+        bindparam('month', month, type_=MonthlyRollup.month.type).label('month'),
+        daily.c.supervisor,
+        func.sum(daily.c.pickups).label('pickups'),
+        func.sum(daily.c.miles).label('miles'),
+        func.sum(daily.c.garbage).label('garbage'),
+    ])
+
+    query = query.where(daily.c.date >= month)
+    query = query.where(daily.c.date < next_month(month))
+    return query.group_by(daily.c.supervisor)
+
+def reassigned(session, route_ids, size=CHUNK_SIZE):
+    """
+    Returns the (route_id, date) keys of the daily rollups of the routes
+    that are credited to another supervisor than the current supervisor of
+    their route, querying size routes at a time.
+    """
+    daily     = DailyRollup.__table__
+    routes    = Route.__table__
+    route_ids = sorted(route_ids)
+    keys      = set()
+
+    for idx in xrange(0, len(route_ids), size):
+        query = select([daily.c.route_id, daily.c.date]).select_from(daily.join(routes))
+        query = query.where(daily.c.route_id.in_(route_ids[idx:idx+size]))
+        query = query.where(daily.c.supervisor != func.coalesce(routes.c.supervisor, u""))
+        keys.update((row.route_id, row.date) for row in session.execute(query))
+
+    return keys
+
+def chunked(keys, size=CHUNK_SIZE):
+    """
+    Splits the (route_id, date) keys into lists of at most size keys of
+    the same month, so that the dates queried for a chunk span no more
+    than a month however far apart the dates of different routes are.
+    """
+    chunk, month = [], None
+    for key in sorted(keys, key=lambda key: (month_of(key[1]), key)):
+        if chunk and (len(chunk) >= size or month_of(key[1]) != month):
+            yield chunk
+            chunk = []
+        chunk.append(key)
+        month = month_of(key[1])
+    if chunk:
+        yield chunk
+
+##########################################################################
+## Incremental maintenance
+##########################################################################
+
+def update_rollups(session, keys):
+    """
+    Recomputes the daily rollups of the (route_id, date) keys, and of any
+    other dates of their routes that are credited to a former supervisor,
+    and applies the differences to the monthly rollups. Does not commit
+    the session. Returns the number of daily rollups that were changed.
+    """
+    table   = DailyRollup.__table__
+    changed = 0
+    deltas  = defaultdict(lambda: dict.fromkeys(TOTALS, 0))
+
+    keys = set(keys)
+    keys.update(reassigned(session, set(route_id for route_id, day in keys)))
+
+    for chunk in chunked(keys):
+        wanted    = set(chunk)
+        route_ids = set(route_id for route_id, day in chunk)
+        start     = min(day for route_id, day in chunk)
+        end       = max(day for route_id, day in chunk)
+
+        totals = {}
+        for row in session.execute(daily_totals(start, end, route_ids)):
+            if (row.route_id, row.date) in wanted:
+                totals[(row.route_id, row.date)] = dict(row)
+
+        query = select([table]).where(table.c.route_id.in_(route_ids))
+        query = query.where(table.c.date.between(start, end))
+        stored = dict(((row.route_id, row.date), row) for row in session.execute(query) if (row.route_id, row.date) in wanted)
+
+        inserts, updates, deletes = [], [], []
+        for key in chunk:
+            new, old = totals.get(key), stored.get(key)
+
+            if old is not None:
+                delta = deltas[(month_of(old.date), old.supervisor)]
+                for column in TOTALS:
+                    delta[column] -= old[column]
+
+            if new is not None:
+                delta = deltas[(month_of(new['date']), new['supervisor'])]
+                for column in TOTALS:
+                    delta[column] += new[column]
+
+            if new is None and old is None:
+                continue
+            elif old is None:
+                inserts.append(new)
+            elif new is None:
+                deletes.append(old.id)
+            elif any(new[column] != old[column] for column in TOTALS + ('supervisor',)):
+                updates.append(dict(new, _id=old.id))
+            else:
+                continue
+            changed += 1
+
+        if inserts:
+            session.execute(table.insert(), inserts)
+        if updates:
+            session.execute(table.update().where(table.c.id == bindparam('_id')), updates)
+        if deletes:
+            session.execute(table.delete().where(table.c.id.in_(deletes)))
+
+    apply_deltas(session, deltas)
+    return changed
+
+def apply_deltas(session, deltas):
+    """
+    Adds the deltas, a dictionary of (month, supervisor) to a dictionary
+    of totals, to the monthly rollups, inserting any that do not exist and
+    deleting any that no longer have pickups.
+    """
+    deltas = dict((key, delta) for key, delta in deltas.items() if any(delta.values()))
+    if not deltas: return
+
+    table    = MonthlyRollup.__table__
+    months   = set(month for month, supervisor in deltas)
+    query    = select([table.c.id, table.c.month, table.c.supervisor]).where(table.c.month.in_(months))
+    existing = dict(((row.month, row.supervisor), row.id) for row in session.execute(query))
+
+    inserts  = []
+    updates  = []
+    for (month, supervisor), delta in deltas.items():
+        if (month, supervisor) in existing:
+            updates.append(dict(('d_' + column, value) for column, value in delta.items()))
+            updates[-1]['_id'] = existing[(month, supervisor)]
+        else:
+            inserts.append(dict(delta, month=month, supervisor=supervisor))
+
+    if inserts:
+        session.execute(table.insert(), inserts)
+    if updates:
+        values = dict((column, table.c[column] + bindparam('d_' + column)) for column in TOTALS)
+        session.execute(table.update().where(table.c.id == bindparam('_id')).values(**values), updates)
+
+        # Supervisors left without pickups in the month are not rolled up
+        updated = [row['_id'] for row in updates]
+        session.execute(table.delete().where(and_(table.c.id.in_(updated), table.c.pickups <= 0)))
+
+##########################################################################
+## Rebuilding
+##########################################################################
+
+def rebuild_month(month):
+    """
+    Replaces the daily and monthly rollups of the month with totals that
+    are recomputed from the pickups, in a session of its own. Returns the
+    month and the number of daily rollups.
+    """
+    daily   = DailyRollup.__table__
+    monthly = MonthlyRollup.__table__
+    end     = next_month(month)
+    session = create_session()
+
+    try:
+        session.execute(daily.delete().where(and_(daily.c.date >= month, daily.c.date < end)))
+        session.execute(monthly.delete().where(monthly.c.month == month))
+
+        # Column defaults are not applied to INSERT ... SELECT statements
+        updated = bindparam('updated', Clock.localnow(), type_=DailyRollup.updated.type).label('updated')
+
+        columns = ['date', 'route_id', 'supervisor'] + list(TOTALS) + ['updated']
+        totals  = daily_totals(month, end - timedelta(days=1)).column(updated)
+        session.execute(daily.insert().from_select(columns, totals))
+
+        columns = ['month', 'supervisor'] + list(TOTALS) + ['updated']
+        session.execute(monthly.insert().from_select(columns, monthly_totals(month).column(updated)))
+
+        count = session.query(func.count(DailyRollup.id)).filter(DailyRollup.date >= month, DailyRollup.date < end).scalar()
+        session.commit()
+        return month, count
+    except:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+def rebuild_rollups(jobs=1):
+    """
+    Rebuilds the rollups of every month that has pickups, in a pool of
+    jobs worker processes if jobs is greater than one, and removes the
+    rollups of months that no longer have any. Yields (month, count)
+    tuples as the months are completed.
+    """
+    session = create_session()
+    months  = set(month_of(day) for day, in session.query(Pickup.date).distinct())
+    stale   = set(month for month, in session.query(MonthlyRollup.month).distinct()) - months
+    for month in stale:
+        session.query(DailyRollup).filter(DailyRollup.date >= month, DailyRollup.date < next_month(month)).delete()
+        session.query(MonthlyRollup).filter(MonthlyRollup.month == month).delete()
+    session.commit()
+    session.close()
+
+    months = sorted(months)
+    if jobs == 1:
+        for month in months:
+            yield rebuild_month(month)
+        return
+
+    create_session.dispose()    # workers must not inherit pooled connections
+    pool = multiprocessing.Pool(jobs)
+    try:
+        for result in pool.imap_unordered(rebuild_month, months):
+            yield result
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
@@ -0,0 +1,194 @@
+# zerocycle.export
+# Streaming export of pickups and routes to CSV or JSON Lines
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Thu Aug 07 10:18:33 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: export.py [] benjamin@bengfort.com $
+
+"""
+Streaming export of pickups and routes to CSV or JSON Lines.
+
+Rows are selected with a Core query rather than through the ORM, executed
+with `stream_results` (a server-side cursor on PostgreSQL) and fetched
+CHUNK_SIZE rows at a time. Each chunk is rendered into a single string
+that is written to the (optionally gzipped) output in one call, so memory
+stays constant however many rows are exported:
+
+    with open_output("pickups.csv.gz") as out:
+        count = export(session, "pickups", out, start=date(2014, 1, 1))
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import sys
+import gzip
+import json
+import unicodecsv as csv
+
+from cStringIO import StringIO
+from contextlib import contextmanager
+from datetime import date, datetime
+from sqlalchemy import select
+from zerocycle.db.models import Route, Pickup
+from zerocycle.utils.timez import Clock, dthandler
+
+##########################################################################
+## Module Constants
+##########################################################################
+
+CHUNK_SIZE  = 5000          # Rows fetched from the cursor and written at once
+BUFFER_SIZE = 1048576       # Bytes buffered by the output file
+FORMATS     = ('csv', 'jsonl')
+TABLES      = ('pickups', 'routes')
+
+DATE_FORMAT = Clock.FORMATS["isodate"]
+TIME_FORMAT = Clock.FORMATS["iso"]
+
+##########################################################################
+## Queries
+##########################################################################
+
+def export_query(table, start=None, end=None, routes=None, supervisors=None):
+    """
+    Returns the select of the rows of the table ("pickups" or "routes")
+    that are between the start and end dates (inclusive, pickups only),
+    of the named routes and of the supervisors, in the order of their ids.
+    """
+    route = Route.__table__
+    if table == 'pickups':
+        pickup = Pickup.__table__
+        query  = select([
+            pickup.c.date, route.c.name.label('route'), route.c.supervisor,
+            pickup.c.vehicle, pickup.c.miles, pickup.c.garbage,
+            pickup.c.created, pickup.c.updated,
+        ]).select_from(pickup.join(route)).order_by(pickup.c.id)
+
+        if start is not None:
+            query = query.where(pickup.c.date >= start)
+        if end is not None:
+            query = query.where(pickup.c.date <= end)
+    elif table == 'routes':
+        if start is not None or end is not None:
+            raise ValueError("routes cannot be filtered by date")
+        query = select([
+            route.c.name, route.c.supervisor, route.c.locations,
+            route.c.created, route.c.updated,
+        ]).order_by(route.c.id)
+    else:
+        raise ValueError("cannot export '%s', choose from %s" % (table, ", ".join(TABLES)))
+
+    if routes:
+        query = query.where(route.c.name.in_(routes))
+    if supervisors:
+        query = query.where(route.c.supervisor.in_(supervisors))
+    return query
+
+def stream_rows(session, query, chunk_size=CHUNK_SIZE):
+    """
+    Executes the query with a server-side cursor where the database has
+    them and yields lists of at most chunk_size rows.
+    """
+    connection = session.connection().execution_options(stream_results=True)
+    result     = connection.execute(query)
+    try:
+        while True:
+            rows = result.fetchmany(chunk_size)
+            if not rows: break
+            yield rows
+    finally:
+        result.close()
+
+##########################################################################
+## Writers
+##########################################################################
+
+def format_value(value):
+    """
+    Formats dates and datetimes with the Clock formats, leaving all other
+    values alone.
+    """
+    if isinstance(value, datetime):
+        return dthandler(value, TIME_FORMAT)
+    if isinstance(value, date):
+        return dthandler(value, DATE_FORMAT)
+    return value
+
+def render_csv(fields, rows):
+    """
+    Renders the rows as CSV lines, encoded as UTF-8.
+    """
+    buffer = StringIO()
+    writer = csv.writer(buffer, encoding='utf-8')
+    writer.writerows([format_value(value) for value in row] for row in rows)
+    return buffer.getvalue()
+
+def render_jsonl(fields, rows):
+    """
+    Renders the rows as JSON objects, one per line, encoded as UTF-8.
+    """
+    return "".join(
+        json.dumps(dict(zip(fields, [format_value(value) for value in row])), sort_keys=True) + "\n"
+        for row in rows
+    )
+
+RENDERERS = {
+    'csv': render_csv,
+    'jsonl': render_jsonl,
+}
+
+@contextmanager
+def open_output(path=None, compress=None):
+    """
+    Opens the path (stdout if it is None or "-") for writing with a large
+    buffer, compressed with gzip if compress is True or if compress is
+    None and the path ends with ".gz".
+    """
+    if compress is None:
+        compress = bool(path) and path.endswith(".gz")
+
+    if not path or path == "-":
+        out, close = sys.stdout, False
+    else:
+        out, close = open(path, 'wb', BUFFER_SIZE), True
+
+    try:
+        if compress:
+            with gzip.GzipFile(fileobj=out, mode='wb') as zipped:
+                yield zipped
+        else:
+            yield out
+        out.flush()
+    finally:
+        if close: out.close()
+
+##########################################################################
+## Export
+##########################################################################
+
+def export(session, table, out, fmt='csv', header=True, chunk_size=CHUNK_SIZE, **filters):
+    """
+    Streams the rows of the table ("pickups" or "routes") to the out file
+    as CSV (with a header row unless header is False) or as JSON Lines.
+    The filters are passed to `export_query`. Returns the number of rows.
+    """
+    if fmt not in RENDERERS:
+        raise ValueError("cannot export to '%s', choose from %s" % (fmt, ", ".join(FORMATS)))
+
+    render = RENDERERS[fmt]
+    query  = export_query(table, **filters)
+    fields = query.c.keys()
+    count  = 0
+
+    if fmt == 'csv' and header:
+        out.write(render_csv(fields, [fields]))
+
+    for rows in stream_rows(session, query, chunk_size):
+        out.write(render(fields, rows))
+        count += len(rows)
+    return count
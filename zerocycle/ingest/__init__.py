@@ -17,23 +17,71 @@ Handles a variety of data ingestion and loading tasks
 ## Imports
 ##########################################################################
 
+import importlib
+import multiprocessing
+
+from copy import deepcopy
+from collections import Counter, MutableMapping
+from itertools import izip
 from zerocycle.db.models import *
 from zerocycle.exceptions import *
 from zerocycle.db import create_session
-from monthly import MonthlyReportReader
-from accounts import AccountsReportReader
-from base import ReportReader, CSVReportReader, ExcelReportReader
+from zerocycle.db.rollups import update_rollups
+from zerocycle.utils.timers import profiler
+from zerocycle.utils.timez import BatchClock
+from bulk import BulkUpserter, DEFAULT_BATCH_SIZE
+from manifest import record_report, filter_reports
+from routes import RouteMap
+from pipeline import Pipeline, DEFAULT_QUEUE_DEPTH
+from cache import ReportCache
+
+##########################################################################
+## Reader Registry
+##########################################################################
+
+class ReaderRegistry(MutableMapping):
+    """
+    Maps report types to reader classes, which may be registered by their
+    dotted path so that a reader module (and xlrd, unicodecsv or NumPy
+    along with it) is only imported once its report type is looked up.
+    """
+
+    def __init__(self, readers):
+        self.readers = dict(readers)
+
+    def __getitem__(self, key):
+        reader = self.readers[key]
+        if isinstance(reader, basestring):
+            module, name = reader.rsplit(".", 1)
+            reader = getattr(importlib.import_module(module), name)
+            self.readers[key] = reader
+        return reader
+
+    def __setitem__(self, key, reader):
+        self.readers[key] = reader
+
+    def __delitem__(self, key):
+        del self.readers[key]
+
+    def __contains__(self, key):
+        return key in self.readers
+
+    def __iter__(self):
+        return iter(self.readers)
+
+    def __len__(self):
+        return len(self.readers)
 
 ##########################################################################
 ## Module Constants
 ##########################################################################
 
-READERS = {
-    "MONTHLY":  MonthlyReportReader,
-    "ACCOUNTS": AccountsReportReader,
-    "EXCEL":    ExcelReportReader,
-    "CSV":      CSVReportReader
-}
+READERS = ReaderRegistry({
+    "MONTHLY":  "zerocycle.ingest.monthly.MonthlyReportReader",
+    "ACCOUNTS": "zerocycle.ingest.accounts.AccountsReportReader",
+    "EXCEL":    "zerocycle.ingest.base.ExcelReportReader",
+    "CSV":      "zerocycle.ingest.base.CSVReportReader",
+})
 
 ##########################################################################
 ## Database access functions
@@ -45,8 +93,11 @@ def insert_or_update(session, obj):
     """
 
     if isinstance(obj, Route):
-        # Do Route Lookup
-        instance = session.query(Route).filter_by(name=obj.name).first()
+        # Do Route Lookup, unless the route map has already resolved it
+        if obj.id is not None:
+            instance = obj
+        else:
+            instance = session.query(Route).filter_by(name=obj.name).first()
     elif isinstance(obj, Pickup):
         # Do Pickup Lookup
         obj.route_id = obj.route.id
@@ -55,11 +106,11 @@ def insert_or_update(session, obj):
         instance = None
 
     if not instance:
-        print "add"
+        profiler.count("insert_or_update.add")
         session.add(obj)
         return obj, True
     else:
-        print "update"
+        profiler.count("insert_or_update.update")
         obj.id = instance.id
         session.merge(obj)
         return obj, False
@@ -68,6 +119,132 @@ def insert_or_update(session, obj):
 ## Ingestion functions
 ##########################################################################
 
+def get_reader(report_type, path, **kwargs):
+    """
+    Instantiates the reader for the report_type on the report at path.
+    """
+    report_type = report_type.upper()
+    if report_type not in READERS:
+        raise IngestionException("No Report type called '%s'" % report_type)
+    return READERS[report_type](path, **kwargs)
+
+def parse_report(task):
+    """
+    Reads every item of a report into a list so that the items can be sent
+    back from a worker process. Expects a (report_type, path, kwargs) task.
+    """
+    report_type, path, kwargs = task
+    return list(get_reader(report_type, path, **kwargs))
+
+def profile_report(task):
+    """
+    Reads a report like `parse_report` in a worker process of a pool, and
+    returns the items with a snapshot of the profiler of the worker (which
+    is reset first) if profiling is enabled, otherwise None, so that the
+    time spent parsing can be merged into the profile of the parent.
+    """
+    if not profiler.enabled:
+        return parse_report(task), None
+
+    profiler.reset()
+    with profiler.timer('read'):
+        items = parse_report(task)
+    return items, profiler.snapshot()
+
+def write_items(items, commit=True, batch_size=DEFAULT_BATCH_SIZE, report=None, routes=None, fingerprint=None, counts=None):
+    """
+    Creates a session and saves every item from a reader (or a list of
+    parsed items) to the database, yielding (obj, created) tuples. Every
+    item is a row (record) of the report, even if it is a tuple of objects.
+
+    Objects are written in batches of batch_size by the BulkUpserter; if
+    batch_size is 0 or None then every object is inserted or updated one
+    at a time with `insert_or_update` instead.
+
+    If a (report_type, path) tuple is passed as report, the report is
+    recorded in the manifest with its number of rows once all of its items
+    have been written, using the fingerprint of the report if it has
+    already been taken (see `filter_reports`). If a Counter is passed as
+    counts, its "rows" and "objects" are incremented as they are written.
+    The routes RouteMap learns the ids of any routes that are written, in
+    either mode, and forgets them again if the transaction is not committed.
+    The daily and monthly rollups of the pickups that were written are
+    updated in the same transaction. Everything written is stamped with
+    the time that writing started, by a BatchClock.
+    """
+    session = create_session()
+    clock   = BatchClock()
+    counts  = counts if counts is not None else Counter()
+    rows    = 0
+    objects = 0
+    created = 0
+
+    if batch_size:
+        upserter = BulkUpserter(session, batch_size, routes)
+        touched  = set()
+        for item in items:
+            rows += 1
+            with profiler.timer('write'), clock:
+                results = upserter.add(item)
+            for result in results:
+                if isinstance(result[0], Pickup):
+                    touched.add(upserter.pickup_key(result[0])[:2])
+                objects += 1
+                created += result[1]
+                yield result
+
+        with profiler.timer('write'), clock:
+            results = upserter.flush()
+        for result in results:
+            if isinstance(result[0], Pickup):
+                touched.add(upserter.pickup_key(result[0])[:2])
+            objects += 1
+            created += result[1]
+            yield result
+    else:
+        pickups = []
+        written = []
+        for item in items:
+            rows += 1
+            if isinstance(item, Base):
+                item = (item,)
+            for obj in item:
+                objects += 1
+                if isinstance(obj, Pickup): pickups.append(obj)
+                if isinstance(obj, Route): written.append(obj)
+                with profiler.timer('write'), clock:
+                    result = insert_or_update(session, obj)
+                created += result[1]
+                yield result
+
+        with profiler.timer('write'), clock:
+            session.flush()
+        touched = set((obj.route_id or obj.route.id, obj.date) for obj in pickups)
+
+        if routes is not None:
+            written.extend(obj.route for obj in pickups if obj.route is not None)
+            routes.learn((route.name, route.id) for route in written if route.id is not None and route.name not in routes)
+
+    counts["rows"]    += rows
+    counts["objects"] += objects
+    profiler.count("rows", rows)
+    profiler.count("created", created)
+
+    with profiler.timer('rollups'), clock:
+        update_rollups(session, touched)
+
+    if report is not None:
+        with profiler.timer('manifest'), clock:
+            record_report(session, report[1], report[0], rows, fingerprint)
+
+    with profiler.timer('commit'), clock:
+        if commit:
+            session.commit()
+            if routes is not None: routes.commit()
+        elif routes is not None:
+            routes.rollback()
+        session.close()
+
 def ingest_report(report_type, path, **kwargs):
     """
     Accepts a report and a report_type, then creates a session and for
@@ -75,27 +252,101 @@ def ingest_report(report_type, path, **kwargs):
     and then returns the item.
 
     If commit is passed into kwargs as False, this will not commit to the
-    database, but instead just return the objects as they come.
+    database, but instead just return the objects as they come. The
+    batch_size keyword argument is passed to `write_items`, and a RouteMap
+    passed as routes is shared by the reader and the writer.
+
+    If pipeline is passed into kwargs as a queue depth, the report is read
+    in a background thread through a Pipeline, so that parsing continues
+    while the writer is flushing batches to the database.
+
+    The fingerprint of the report (if it has been taken already) and a
+    Counter of the rows and objects written are passed to `write_items`
+    as the fingerprint and counts keyword arguments.
+
+    If the profiler is enabled, the time spent reading the report, writing
+    it, updating the rollups and the manifest and committing is timed.
+    """
+    commit      = kwargs.pop("commit", True)
+    batch_size  = kwargs.pop("batch_size", DEFAULT_BATCH_SIZE)
+    pipeline    = kwargs.pop("pipeline", None)
+    routes      = kwargs.pop("routes", None)
+    routes      = routes if routes is not None else RouteMap()
+    fingerprint = kwargs.pop("fingerprint", None)
+    counts      = kwargs.pop("counts", None)
+    reader      = get_reader(report_type, path, routes=routes, **kwargs)
+    items       = profiler.iterate('read', reader)
+
+    if pipeline:
+        items   = Pipeline(items, depth=pipeline)
+
+    for result in write_items(items, commit, batch_size, (report_type, path), routes, fingerprint, counts):
+        yield result
+
+def ingest_reports(report_type, paths, **kwargs):
     """
+    Ingests multiple reports of the same report_type in order, yielding
+    (obj, created) tuples just like `ingest_report`.
 
+    If jobs is passed into kwargs as greater than one, the reports are
+    parsed in a pool of that many worker processes, while the parsed items
+    are written by this process one report at a time and in the order of
+    the paths, so the database sees the same writes as a serial run.
+
+    If the profiler is enabled, the time this process waits for the pool
+    is timed as the read stage, and the stages of every worker are merged
+    beneath a workers stage; since the workers parse in parallel with the
+    writer and with each other, the workers stage may exceed the elapsed
+    time of the run.
+
+    A single RouteMap, warmed from the routes table, is shared by every
+    report in the run unless one is passed in as routes. The pipeline
+    keyword argument is passed to `ingest_report` and is ignored by the
+    worker pool, since the pool already parses ahead of the writer.
+
+    The fingerprints of the reports by path (as filled in by
+    `filter_reports`) can be passed as fingerprints so that the reports
+    are not hashed again when they are recorded in the manifest.
+    """
+    jobs        = kwargs.pop("jobs", 1) or 1
     commit      = kwargs.pop("commit", True)
-    report_type = report_type.upper()
-    if report_type not in READERS:
-        raise IngestionException("No Report type called '%s'" % report_type)
+    batch_size  = kwargs.pop("batch_size", DEFAULT_BATCH_SIZE)
+    routes      = kwargs.pop("routes", None)
+    prints      = kwargs.pop("fingerprints", None) or {}
+    counts      = kwargs.pop("counts", None)
 
-    reader  = READERS[report_type](path, **kwargs)
-    session = create_session()
+    if routes is None:
+        session = create_session()
+        routes  = RouteMap().warm(session)
+        session.close()
 
-    for item in reader:
-        if isinstance(item, Base):
-                yield insert_or_update(session, item)
-        else:
-            for obj in item:
-                yield insert_or_update(session, obj)
+    if jobs == 1:
+        for path in paths:
+            for result in ingest_report(report_type, path, commit=commit, batch_size=batch_size, routes=routes, fingerprint=prints.get(path), counts=counts, **kwargs):
+                yield result
+        return
+
+    if report_type.upper() not in READERS:
+        raise IngestionException("No Report type called '%s'" % report_type)
 
-    if commit:
-        session.commit()
-    session.close()
+    kwargs.pop("pipeline", None)
+    paths = list(paths)
+    create_session.dispose()    # workers must not inherit pooled connections
+    pool  = multiprocessing.Pool(jobs)
+    try:
+        wargs = dict(kwargs, routes=deepcopy(routes))    # snapshot for workers
+        tasks = ((report_type, path, wargs) for path in paths)
+        for path, (items, timings) in izip(paths, profiler.iterate('read', pool.imap(profile_report, tasks))):
+            if timings is not None:
+                profiler.merge(timings, 'workers')
+            for result in write_items(items, commit, batch_size, (report_type, path), routes, prints.get(path), counts):
+                yield result
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
 
 def ingest_monthly_report(path, **kwargs):
     """
@@ -17,6 +17,8 @@ Accounts report reader
 ## Imports
 ##########################################################################
 
+import numpy as np
+
 from zerocycle.db.models import *
 from zerocycle.exceptions import *
 from zerocycle.ingest.base import CSVReportReader
@@ -27,6 +29,11 @@ from zerocycle.ingest.base import CSVReportReader
 
 class AccountsReportReader(CSVReportReader):
 
+    COLUMN_TYPES = {
+        "ROUTE NAME": object,
+        "SERVICE LOCATIONS": np.int64,
+    }
+
     def __init__(self, *args, **kwargs):
         kwargs['header'] = kwargs.get('header', True)
         super(AccountsReportReader, self).__init__(*args, **kwargs)
@@ -35,7 +42,7 @@ class AccountsReportReader(CSVReportReader):
         """
         Constructs a Route item from the dictionary being passed in.
         """
-        return Route(name=item['ROUTE NAME'], locations=int(item['SERVICE LOCATIONS']))
+        return self.routes.route(item['ROUTE NAME'], locations=int(item['SERVICE LOCATIONS']))
 
 if __name__ == '__main__':
     import os
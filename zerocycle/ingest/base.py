@@ -18,10 +18,56 @@ Base API for ingestion related tasks.
 ##########################################################################
 
 import os
+import warnings
+import numpy as np
 import unicodecsv as csv
 
+from itertools import islice, izip
 from xlrd import open_workbook
+from xlrd import XL_CELL_EMPTY, XL_CELL_TEXT, XL_CELL_BOOLEAN
+from xlrd import XL_CELL_ERROR, XL_CELL_BLANK, XL_CELL_DATE
 from zerocycle.exceptions import *
+from zerocycle.ingest.routes import RouteMap
+from zerocycle.utils.timers import profiler
+from zerocycle.utils.timez import date_parser, xldate
+
+##########################################################################
+## Module Constants
+##########################################################################
+
+DEFAULT_CHUNKSIZE = 10000
+EMPTY_CELLS = frozenset((XL_CELL_EMPTY, XL_CELL_ERROR, XL_CELL_BLANK))
+
+##########################################################################
+## Helper functions
+##########################################################################
+
+def numeric_column(column, dtype, linenos):
+    """
+    Converts a column of a chunk to the numeric dtype. Missing values (None
+    or blank) are NaN, so an integer column with missing values is float64
+    instead. Malformed values are also NaN, and are warned about as an
+    UnparsableRow with the line number of their row from linenos.
+    """
+    try:
+        return np.array(column, dtype=dtype)
+    except (TypeError, ValueError):
+        pass
+
+    values = np.empty(len(column), dtype=np.float64)
+    for idx, value in enumerate(column):
+        if value is None or not value.strip():
+            values[idx] = np.nan
+            continue
+        try:
+            values[idx] = float(value)
+        except ValueError:
+            warnings.warn("line %i: %r is not a number" % (linenos[idx], value), UnparsableRow)
+            values[idx] = np.nan
+
+    if dtype.kind == 'f' or np.isnan(values).any():
+        return values
+    return values.astype(dtype)
 
 ##########################################################################
 ## Report Reader
@@ -32,11 +78,30 @@ class ReportReader(object):
     Base report reader class - it implements methods for accessing and
     iterating through reports that come from various cities. Provides a
     standard interface for all ReportReader objects.
+
+    Readers that construct routes should do so through `self.routes`, the
+    RouteMap of the ingest run, which can be passed in as `routes`.
+
+    If a ReportCache is passed in as `cache`, the records of the report are
+    loaded from the cache rather than parsed. Subclasses must increment
+    VERSION whenever the records that they produce change.
+
+    If the profiler is enabled when the reader is created, the time spent
+    in `handle_row` and `handle_item` is timed as stages of the read.
     """
 
+    VERSION = 1
+
     def __init__(self, path, **kwargs):
         self.path = path
         self.encoding = kwargs.pop('encoding', None)
+        routes = kwargs.pop('routes', None)
+        self.routes = routes if routes is not None else RouteMap()
+        self.cache = kwargs.pop('cache', None)
+
+        if profiler.enabled:
+            self.handle_row  = profiler.wrap('read.handle_row', self.handle_row)
+            self.handle_item = profiler.wrap('read.handle_item', self.handle_item)
 
     def __str__(self):
         return "<%s at %s>" % (self.__class__.__name__, self.path)
@@ -82,6 +147,22 @@ class ReportReader(object):
         """
         return row
 
+    def records(self, **kwargs):
+        """
+        The denormalized records of the report, which must be picklable
+        since they are what is stored in the cache. By default the records
+        are the rows of the report.
+        """
+        return self.rows(**kwargs)
+
+    def read(self, **kwargs):
+        """
+        Access each record of the report, from the cache if there is one.
+        """
+        if self.cache is None:
+            return self.records(**kwargs)
+        return self.cache.records(self, self.records(**kwargs))
+
     def items(self):
         """
         Access each item of the report. This method is an external access
@@ -109,8 +190,16 @@ class CSVReportReader(ReportReader):
     """
     A report reader that wraps a CSV report and implements `rows` and
     `items` in order to allow subclasses to not have to deal with a csv.
+
+    Subclasses can declare the NumPy dtype of their columns in the
+    COLUMN_TYPES dictionary for use with the columnar `chunks` method,
+    and the strptime format of their date columns in DATE_COLUMNS, which
+    `chunks` parses into datetime64 arrays.
     """
 
+    COLUMN_TYPES = None
+    DATE_COLUMNS = None
+
     def __init__(self, path, delimiter=",", quotechar="\"", **kwargs):
         self.delimiter  = delimiter
         self.quotechar  = quotechar
@@ -139,11 +228,59 @@ class CSVReportReader(ReportReader):
         """
         Pass-through for CSV rows since CSV rows are typically entities.
         """
-        for item in self.rows(**kwargs):
+        for item in self.read(**kwargs):
             item = self.handle_item(item)
             if item is not None:
                 yield item
 
+    def chunks(self, chunksize=DEFAULT_CHUNKSIZE, **kwargs):
+        """
+        Columnar access to the CSV file as an alternative to `rows`. Reads
+        chunksize lines at a time and yields a dictionary of column name
+        to NumPy array for every chunk. Columns are converted to the dtype
+        declared for them in COLUMN_TYPES, undeclared columns are object
+        arrays. Without a header, columns are named by their index. The
+        columns declared in DATE_COLUMNS are parsed a whole column at a
+        time into datetime64 arrays. Values missing from short rows are
+        None, and blank lines are skipped. Missing values of numeric
+        columns are NaN (see `numeric_column`).
+
+        Note that chunks bypass `handle_row` and `handle_item` entirely.
+        """
+        kwargs['encoding']  = kwargs.get('encoding', self.encoding)
+        kwargs['delimiter'] = kwargs.get('delimiter', self.delimiter)
+        kwargs['quotechar'] = kwargs.get('quotechar', self.quotechar)
+        dtypes = self.COLUMN_TYPES or {}
+        dates  = dict((field, date_parser(fmt)) for field, fmt in (self.DATE_COLUMNS or {}).items())
+
+        with open(self.path, 'rU') as data:
+            reader = csv.reader(data, **kwargs)
+            fields = next(reader) if self.header else None
+
+            while True:
+                lines = [(reader.line_num, row) for row in islice(reader, chunksize)]
+                if not lines: break
+
+                rows    = [row for line, row in lines if row]
+                linenos = [line for line, row in lines if row]
+                if not rows: continue
+
+                # Short rows are padded with None (like the restval of a
+                # DictReader) so that every column is as long as the chunk.
+                names   = fields if fields is not None else range(max(len(row) for row in rows))
+                columns = izip(*[row + [None] * (len(names) - len(row)) for row in rows])
+
+                chunk = {}
+                for field, column in izip(names, columns):
+                    dtype = np.dtype(dtypes.get(field, object))
+                    if field in dates:
+                        chunk[field] = dates[field].column(column)
+                    elif dtype.kind in 'iuf':
+                        chunk[field] = numeric_column(column, dtype, linenos)
+                    else:
+                        chunk[field] = np.array(column, dtype=dtype)
+                yield chunk
+
 ##########################################################################
 ## ExcelReportReader
 ##########################################################################
@@ -153,55 +290,64 @@ class ExcelReportReader(ReportReader):
     A report reader that wraps an Excel report and implements `rows` and
     `items` in order to allow subclasses to not have to deal with the
     Excel file. This class treats an Excel file like a fancy CSV.
+
+    Date cells are converted to datetimes with the datemode of the
+    workbook, which is set on the reader as `datemode` when it is opened.
     """
 
+    datemode = 0
+
     def rows(self, **kwargs):
         """
         Handles Excel workbook access methods. Currently this method
         iterates through every single sheet in a workbook, returning all
         of the rows from the Excel file.
-        """
-        workbook = open_workbook(self.path)
-        for sheet in workbook.sheets():
-            for ridx in xrange(sheet.nrows):
-                row = [sheet.cell(ridx, cidx) for cidx in xrange(sheet.ncols)]
-                row = self.handle_row(row)
-                if row is not None:
-                    yield row
 
-    def handle_row(self, row):
+        The workbook is opened on demand so only one sheet is loaded at a
+        time; each sheet is unloaded as soon as its rows are consumed.
+        Rows are read whole with `row_types` and `row_values` and then
+        normalized with `normalize_row` before being passed to
+        `handle_row`.
         """
-        Strips off spaces in every row for uniformity. Replaces empty rows
-        with "None" - this is a text handling method, but leaves all
-        number values alone.
+        with profiler.timer('read.open'):
+            workbook = open_workbook(self.path, on_demand=True)
+        self.datemode = workbook.datemode
+        try:
+            for sidx in xrange(workbook.nsheets):
+                sheet = workbook.sheet_by_index(sidx)
+                for ridx in xrange(sheet.nrows):
+                    row = self.normalize_row(sheet.row_types(ridx), sheet.row_values(ridx))
+                    row = self.handle_row(row)
+                    if row is not None:
+                        yield row
+                workbook.unload_sheet(sidx)
+        finally:
+            workbook.release_resources()
+
+    def normalize_row(self, types, values):
         """
-
-        def handle_cell(cell):
-            """
-            Handles individual cells.
-            """
-            # These are blank/empty cells
-            if cell.ctype in (0, 5, 6):
-                return None
-
-            # This is the boolean type, cast to a bool.
-            if cell.ctype == 4:
-                return bool(cell.value)
-
-            # Text processing type
-            if cell.ctype == 1:
-                return cell.value.strip()
-
-            # Fall through, the rest are numbers
-            return cell.value
-
-        return [handle_cell(cell) for cell in row]
+        Strips off spaces in every row for uniformity. Replaces empty cells
+        with "None", casts booleans to bool and dates to datetime - this is
+        a text handling method, but leaves all number values alone.
+        """
+        if not any(types):
+            # Every cell in the row is empty
+            return [None] * len(values)
+
+        return [
+            None if ctype in EMPTY_CELLS else
+            value.strip() if ctype == XL_CELL_TEXT else
+            bool(value) if ctype == XL_CELL_BOOLEAN else
+            xldate(value, self.datemode) if ctype == XL_CELL_DATE else
+            value
+            for ctype, value in izip(types, values)
+        ]
 
     def items(self, **kwargs):
         """
         Pass-through for Excel rows since Excel rows are typically entities.
         """
-        for item in self.rows(**kwargs):
+        for item in self.read(**kwargs):
             item = self.handle_item(item)
             if item is not None:
                 yield item
@@ -0,0 +1,266 @@
+# zerocycle.ingest.bulk
+# Batched insert or update of ingested objects
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Mon Jul 21 09:12:44 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: bulk.py [] benjamin@bengfort.com $
+
+"""
+Batched insert or update of ingested objects. Rather than querying the
+database once per object, the BulkUpserter collects the objects that a
+reader emits into batches and resolves the existing routes and pickups of
+each batch with one set based query, then writes inserts and updates with
+executemany (or INSERT ... ON CONFLICT on PostgreSQL).
+
+Every row of a batch is stamped with a single Clock.localnow() (the time
+of the BatchClock that the batch is written in, if any) rather than having
+the column defaults called once per row.
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+from sqlalchemy import bindparam, text
+from collections import OrderedDict, defaultdict
+from zerocycle.db.models import Base, Route, Pickup
+from zerocycle.utils.timez import Clock
+from zerocycle.ingest.routes import RouteMap
+from zerocycle.utils.timers import profiler
+
+##########################################################################
+## Module Constants
+##########################################################################
+
+DEFAULT_BATCH_SIZE = 1000
+
+## Upsert against the UniqueConstraint('route_id', 'date', 'vehicle')
+PICKUP_KEY    = ('route_id', 'date', 'vehicle')
+PICKUP_UPSERT = (
+    "INSERT INTO pickups (%(columns)s) VALUES (%(values)s) "
+    "ON CONFLICT (route_id, date, vehicle) DO UPDATE SET %(updates)s"
+)
+
+##########################################################################
+## Helper functions
+##########################################################################
+
+def column_values(obj, exclude=('id', 'created', 'updated')):
+    """
+    Returns a dictionary of the column values that have been set on a
+    transient model instance. Unset columns are left out so that an
+    update does not clobber them (the same behavior as session.merge).
+    """
+    return dict(
+        (column.key, obj.__dict__[column.key])
+        for column in obj.__table__.columns
+        if column.key not in exclude and column.key in obj.__dict__
+    )
+
+def stamp(rows, table, now, columns=('created', 'updated')):
+    """
+    Sets the timestamp columns of every row to now, unless the timestamps
+    of the table are stamped by the database (see server_timestamps).
+    """
+    if table.c.created.server_default is not None:
+        return rows
+    stamps = dict.fromkeys(columns, now)
+    return [dict(row, **stamps) for row in rows]
+
+def pickup_upsert(columns):
+    """
+    Returns the PICKUP_UPSERT of rows with the columns, which only updates
+    the columns that are set (never created) so that unset values are not
+    clobbered. If the timestamps are not in the rows, they are stamped by
+    the database (see server_timestamps) and updated is set to now().
+    """
+    columns = sorted(columns)
+    updates = [
+        "%s = EXCLUDED.%s" % (column, column) for column in columns
+        if column not in PICKUP_KEY and column != 'created'
+    ]
+    if 'updated' not in columns:
+        updates.append("updated = now()")
+
+    return PICKUP_UPSERT % {
+        'columns': ", ".join(columns),
+        'values': ", ".join(":" + column for column in columns),
+        'updates': ", ".join(updates),
+    }
+
+def group_by_keys(rows):
+    """
+    Groups rows by their set of keys, since an executemany requires that
+    every parameter set in the call has the same keys.
+    """
+    groups = defaultdict(list)
+    for row in rows:
+        groups[tuple(sorted(row))].append(row)
+    return groups.values()
+
+##########################################################################
+## Bulk Upserter
+##########################################################################
+
+class BulkUpserter(object):
+    """
+    Collects Route and Pickup objects into batches of `batch_size` and
+    writes each batch to the database with a handful of statements. Route
+    ids are resolved through a RouteMap, which can be shared across an
+    ingest run, so each route is only looked up once.
+    """
+
+    def __init__(self, session, batch_size=DEFAULT_BATCH_SIZE, routes=None):
+        self.session    = session
+        self.batch_size = batch_size
+        self.routes     = routes if routes is not None else RouteMap()
+        self.pending    = []
+
+    @property
+    def dialect(self):
+        return self.session.get_bind().dialect.name
+
+    def add(self, item):
+        """
+        Adds an item from a reader (a model instance or a tuple of model
+        instances) to the batch. Returns a list of (obj, created) tuples,
+        which is empty unless the batch was full and has been flushed.
+        """
+        if isinstance(item, Base):
+            item = (item,)
+
+        self.pending.extend(item)
+        if len(self.pending) >= self.batch_size:
+            return self.flush()
+        return []
+
+    def flush(self):
+        """
+        Writes the current batch to the database and returns (obj, created)
+        tuples in the order that the objects were added. An object is only
+        marked as created the first time its key appears in the batch.
+        """
+        pending, self.pending = self.pending, []
+        if not pending: return []
+
+        routes  = [obj for obj in pending if isinstance(obj, Route)]
+        routes += [obj.route for obj in pending if isinstance(obj, Pickup) and obj.route is not None]
+        pickups = [obj for obj in pending if isinstance(obj, Pickup)]
+
+        inserted = self.upsert_routes(routes)
+        inserted.update(self.upsert_pickups(pickups))
+
+        results = []
+        for obj in pending:
+            if isinstance(obj, Route):
+                key = obj.name
+            elif isinstance(obj, Pickup):
+                key = self.pickup_key(obj)
+            else:
+                self.session.add(obj)
+                results.append((obj, True))
+                continue
+
+            results.append((obj, key in inserted))
+            inserted.discard(key)
+
+        return results
+
+    def pickup_key(self, pickup):
+        """
+        Returns the (route_id, date, vehicle) key of a pickup.
+        """
+        route_id = pickup.route_id
+        if pickup.route is not None:
+            route_id = self.routes.resolve(pickup.route.name)
+        return (route_id, pickup.date, pickup.vehicle)
+
+    def upsert_routes(self, routes):
+        """
+        Resolves unknown route names with a single query, then inserts and
+        updates the routes with executemany. Returns the set of names that
+        were inserted.
+        """
+        table  = Route.__table__
+        values = OrderedDict()
+        for route in routes:
+            values.setdefault(route.name, {}).update(column_values(route))
+
+        unknown = [name for name in values if name not in self.routes]
+        if unknown:
+            with profiler.timer('write.lookup'):
+                query = self.session.query(Route.id, Route.name).filter(Route.name.in_(unknown))
+                self.routes.learn((name, idx) for idx, name in query)
+
+        now     = Clock.localnow()
+        inserts = [row for name, row in values.items() if name not in self.routes]
+        updates = [dict(row, _id=self.routes.resolve(name)) for name, row in values.items() if name in self.routes]
+        inserts = stamp(inserts, table, now)
+        updates = stamp(updates, table, now, ('updated',))
+
+        with profiler.timer('write.execute'):
+            for rows in group_by_keys(inserts):
+                self.session.execute(table.insert(), rows)
+
+            for rows in group_by_keys(updates):
+                self.session.execute(table.update().where(table.c.id == bindparam('_id')), rows)
+
+        inserted = set(row['name'] for row in inserts)
+        if inserted:
+            with profiler.timer('write.lookup'):
+                query = self.session.query(Route.id, Route.name).filter(Route.name.in_(inserted))
+                self.routes.learn((name, idx) for idx, name in query)
+
+        return inserted
+
+    def upsert_pickups(self, pickups):
+        """
+        Resolves existing (route_id, date, vehicle) keys of the batch with
+        a single query, then writes the pickups. On PostgreSQL a single
+        INSERT ... ON CONFLICT is issued, otherwise the inserts and the
+        updates are executed separately. Returns the set of inserted keys.
+        """
+        if not pickups: return set()
+
+        table  = Pickup.__table__
+        values = OrderedDict()
+        for pickup in pickups:
+            row = column_values(pickup)
+            row['route_id'] = self.pickup_key(pickup)[0]
+            values.setdefault(self.pickup_key(pickup), {}).update(row)
+
+        route_ids = set(key[0] for key in values)
+        dates     = [key[1] for key in values]
+        query     = self.session.query(Pickup.id, Pickup.route_id, Pickup.date, Pickup.vehicle)
+        query     = query.filter(Pickup.route_id.in_(route_ids))
+        query     = query.filter(Pickup.date.between(min(dates), max(dates)))
+
+        with profiler.timer('write.lookup'):
+            existing  = dict(((route_id, date, vehicle), idx) for idx, route_id, date, vehicle in query)
+        inserted  = set(key for key in values if key not in existing)
+        now       = Clock.localnow()
+
+        if self.dialect == 'postgresql':
+            rows = stamp(values.values(), table, now)
+            with profiler.timer('write.execute'):
+                for group in group_by_keys(rows):
+                    self.session.execute(text(pickup_upsert(group[0])), group)
+            return inserted
+
+        inserts = [row for key, row in values.items() if key not in existing]
+        updates = [dict(row, _id=existing[key]) for key, row in values.items() if key in existing]
+        inserts = stamp(inserts, table, now)
+        updates = stamp(updates, table, now, ('updated',))
+
+        with profiler.timer('write.execute'):
+            for rows in group_by_keys(inserts):
+                self.session.execute(table.insert(), rows)
+
+            for rows in group_by_keys(updates):
+                self.session.execute(table.update().where(table.c.id == bindparam('_id')), rows)
+
+        return inserted
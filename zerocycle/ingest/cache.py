@@ -0,0 +1,176 @@
+# zerocycle.ingest.cache
+# Persistent cache of parsed reports keyed by file fingerprint
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Tue Jul 29 16:05:38 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: cache.py [] benjamin@bengfort.com $
+
+"""
+Persistent cache of parsed reports keyed by file fingerprint.
+
+Parsing a workbook with xlrd is slow, but the denormalized records that a
+reader produces from it are small. The ReportCache stores those records
+in a binary (pickle) file keyed by the path, size and mtime of the report
+along with the reader class and its VERSION. Later reads load the records
+through a memory-mapped file instead of parsing the report again. Cache
+files are evicted least recently used first when the total size of the
+cache directory grows beyond maxsize.
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import os
+import re
+import mmap
+import glob
+import hashlib
+import cPickle as pickle
+
+from zerocycle.conf import settings
+
+##########################################################################
+## Module Constants
+##########################################################################
+
+CACHE_EXT = ".zcache"
+KEY_SIZE  = 16              # Hex digits of the key in cache file names
+
+##########################################################################
+## Helper functions
+##########################################################################
+
+def escape(pathname):
+    """
+    Escapes the glob metacharacters of a path, like glob.escape.
+    """
+    return re.sub(r'([*?[])', r'[\1]', pathname)
+
+##########################################################################
+## Report Cache
+##########################################################################
+
+class ReportCache(object):
+    """
+    Stores the parsed records of reports on disk. If directory is None,
+    cache files are written as hidden files next to the report; if the
+    directory or maxsize are not given they are read from the settings.
+    """
+
+    def __init__(self, directory=None, maxsize=None):
+        conf = settings.get('cache')
+        self.directory = directory or conf.get('directory')
+        self.maxsize   = maxsize or conf.get('maxsize')
+
+        if self.directory:
+            self.directory = os.path.abspath(os.path.expanduser(self.directory))
+
+    def key(self, reader):
+        """
+        Computes the fingerprint of a reader's report from its path, size
+        and mtime and the class and version of the reader.
+        """
+        stat = os.stat(reader.path)
+        fingerprint = "%s|%i|%r|%s.%s|%s" % (
+            reader.path, stat.st_size, stat.st_mtime,
+            reader.__class__.__module__, reader.__class__.__name__,
+            reader.VERSION,
+        )
+        return hashlib.sha1(fingerprint).hexdigest()
+
+    def prefix(self, reader):
+        """
+        Returns the path prefix shared by every cache file of a report. In
+        a shared cache directory the prefix includes a hash of the report's
+        directory, since reports in different directories may have the
+        same name.
+        """
+        name = "." + os.path.basename(reader.path)
+        if not self.directory:
+            return os.path.join(os.path.dirname(reader.path), name)
+
+        digest = hashlib.sha1(os.path.dirname(reader.path)).hexdigest()[:8]
+        return os.path.join(self.directory, "%s.%s" % (name, digest))
+
+    def path(self, reader):
+        """
+        Returns the path of the cache file for the reader's report.
+        """
+        return "%s.%s%s" % (self.prefix(reader), self.key(reader)[:KEY_SIZE], CACHE_EXT)
+
+    def stale(self, reader):
+        """
+        Returns the paths of every cache file of the reader's report.
+        """
+        return glob.glob("%s.%s%s" % (escape(self.prefix(reader)), "?" * KEY_SIZE, CACHE_EXT))
+
+    def load(self, path):
+        """
+        Yields the records from a memory-mapped cache file.
+        """
+        os.utime(path, None) # Mark the cache file as recently used
+        with open(path, 'rb') as cache:
+            data = mmap.mmap(cache.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                while data.tell() < data.size():
+                    yield pickle.load(data)
+            finally:
+                data.close()
+
+    def store(self, path, records):
+        """
+        Writes each record to the cache file as it is yielded; the file is
+        only put in place once every record has been written, after which
+        least recently used cache files are evicted from the directory.
+        """
+        directory = os.path.dirname(path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        tmp = "%s.%i.tmp" % (path, os.getpid())
+        try:
+            with open(tmp, 'wb') as cache:
+                for record in records:
+                    pickle.dump(record, cache, pickle.HIGHEST_PROTOCOL)
+                    yield record
+            os.rename(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        self.evict(directory)
+
+    def evict(self, directory):
+        """
+        Removes the least recently used cache files in the directory until
+        their total size is no more than maxsize.
+        """
+        files = []
+        for path in glob.glob(os.path.join(escape(directory), ".*" + CACHE_EXT)):
+            stat = os.stat(path)
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for mtime, size, path in files)
+        for mtime, size, path in sorted(files):
+            if total <= self.maxsize: break
+            os.remove(path)
+            total -= size
+
+    def records(self, reader, records):
+        """
+        Yields the cached records of the reader if there are any, otherwise
+        yields from records, replacing any cache files of previous versions
+        of the report with a new one.
+        """
+        path = self.path(reader)
+        if os.path.exists(path):
+            return self.load(path)
+
+        for stale in self.stale(reader):
+            os.remove(stale)
+        return self.store(path, records)
@@ -0,0 +1,97 @@
+# zerocycle.ingest.manifest
+# Tracks the reports that have already been ingested
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Wed Jul 23 14:20:31 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: manifest.py [] benjamin@bengfort.com $
+
+"""
+Tracks the reports that have already been ingested in the reports table
+by their content hash so that unchanged files can be skipped.
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import os
+import hashlib
+
+from datetime import datetime
+from zerocycle.db.models import Report
+from zerocycle.db.managers import Manager
+
+##########################################################################
+## Module Constants
+##########################################################################
+
+BLOCKSIZE = 65536
+
+##########################################################################
+## Manifest functions
+##########################################################################
+
+def fingerprint(path):
+    """
+    Returns a dictionary of the path, content hash, size and mtime of a
+    report on disk.
+    """
+    path   = os.path.abspath(path)
+    path   = path.decode('utf-8') if isinstance(path, str) else path
+    stat   = os.stat(path)
+    sha1   = hashlib.sha1()
+
+    with open(path, 'rb') as report:
+        for block in iter(lambda: report.read(BLOCKSIZE), ''):
+            sha1.update(block)
+
+    return {
+        "path": path,
+        "checksum": unicode(sha1.hexdigest()),
+        "size": stat.st_size,
+        "mtime": datetime.utcfromtimestamp(stat.st_mtime),
+    }
+
+def record_report(session, path, report_type, rows, details=None):
+    """
+    Adds the report at path to the manifest (or updates its entry if the
+    content has been ingested before) with the number of rows written.
+    The fingerprint of the report is taken unless it is passed as details.
+    """
+    details = dict(details or fingerprint(path))
+    report, created = Manager(Report).get_or_create(session, checksum=details.pop("checksum"))
+    for key, val in details.items():
+        setattr(report, key, val)
+
+    report.reader = unicode(report_type.upper())
+    report.rows   = rows
+    session.add(report)
+    return report
+
+def filter_reports(session, paths, fingerprints=None):
+    """
+    Returns the paths whose content is not yet in the manifest, in order,
+    and only the first of any paths with the same content. If a dictionary
+    is passed as fingerprints, the fingerprint of every path is added to
+    it so that it can be passed on to `record_report`.
+    """
+    fingerprints = fingerprints if fingerprints is not None else {}
+    for path in paths:
+        if path not in fingerprints:
+            fingerprints[path] = fingerprint(path)
+
+    checksums = [fingerprints[path]["checksum"] for path in paths]
+    if not checksums: return []
+
+    query  = session.query(Report.checksum).filter(Report.checksum.in_(set(checksums)))
+    seen   = set(checksum for checksum, in query)
+    unseen = []
+    for path, checksum in zip(paths, checksums):
+        if checksum not in seen:
+            seen.add(checksum)
+            unseen.append(path)
+    return unseen
@@ -19,11 +19,12 @@ Report reader for monthly supervisor reports
 
 import warnings
 
-from datetime import datetime
 from zerocycle.utils import text
+from zerocycle.utils.timez import date_parser
 from zerocycle.db.models import *
 from zerocycle.exceptions import *
 from zerocycle.ingest.base import ExcelReportReader
+from zerocycle.utils.timers import profiler
 
 ##########################################################################
 ## MonthlyReportReader
@@ -31,11 +32,22 @@ from zerocycle.ingest.base import ExcelReportReader
 
 class MonthlyReportReader(ExcelReportReader):
 
+    ## Marker rows by the keyword in their first cell and the name of the
+    ## method that handles them; None means the row is simply skipped.
+    MARKERS = {
+        "daily date": "handle_daily_date",
+        "supervisor": "handle_supervisor",
+        "daily total": None,                # we could do a checksum
+        "supervisor total": None,           # we could do a checksum
+        "supervisor daily report": None,    # the header row
+    }
+
     def __init__(self, *args, **kwargs):
         """
         Can customize the date format of a report.
         """
         self.datefmt  = kwargs.pop("date_format", "%m/%d/%Y")
+        self.dates    = date_parser(self.datefmt)
         super(MonthlyReportReader, self).__init__(*args, **kwargs)
 
     def __iter__(self):
@@ -48,21 +60,28 @@ class MonthlyReportReader(ExcelReportReader):
         """
         lookup  = {}
         for item in self.items():
-            route = item.pop("route")
-            supervisor = item.pop("supervisor")
+            with profiler.timer('read.construct'):
+                route = item.pop("route")
+                supervisor = item.pop("supervisor")
 
-            if route in lookup:
-                route = lookup[route]
-            else:
-                route = Route(name=route, supervisor=supervisor)
-                lookup[route.name] = route
+                if route in lookup:
+                    route = lookup[route]
+                else:
+                    route = self.routes.route(route, supervisor=supervisor)
+                    lookup[route.name] = route
 
-            pickup = Pickup(**item)
-            pickup.route = route
+                pickup = Pickup(**item)
+                pickup.route = route
 
             yield route, pickup
 
     def items(self, **kwargs):
+        """
+        The items of a monthly report are its denormalized records.
+        """
+        return self.read(**kwargs)
+
+    def records(self, **kwargs):
         """
         Denormalizes each row into Python dictionaries
         """
@@ -81,6 +100,9 @@ class MonthlyReportReader(ExcelReportReader):
         the class if needed. For example, this function will identify the
         pickup_date row as well as the supervisor row and store them for
         iteration over the class.
+
+        Marker rows are identified by looking up the normalized first cell
+        in the class's compiled table of MARKERS.
         """
         row = super(MonthlyReportReader, self).handle_row(row)
 
@@ -93,26 +115,13 @@ class MonthlyReportReader(ExcelReportReader):
             # Discovered a completely empty row (full of None)
             return None
 
-        if text.compare("daily date", row[0]):
-            # Discovered a daily date row, set the pickup date and move on
-            self._current_pickup_date = datetime.strptime(row[1], self.datefmt).date()
-            return None
-
-        if text.compare("supervisor", row[0]):
-            # Discovered a supervisor row, set the supervisor and move on
-            self._current_supervisor  = row[1]
-            return None
-
-        if text.compare("daily total", row[0]):
-            # Discovered a daily total row, we could do a checksum
-            return None
-
-        if text.compare("supervisor total", row[0]):
-            # Discovered a supervisor total row, we could do a checksum
-            return None
-
-        if text.compare("supervisor daily report", row[0]):
-            # Discovered the header row, move on
+        markers = self.compile_markers()
+        marker  = text.normalize(row[0]) if isinstance(row[0], basestring) else None
+        if marker in markers:
+            # Discovered a marker row, handle it if needed and move on
+            handler = markers[marker]
+            if handler is not None:
+                getattr(self, handler)(row)
             return None
 
         # Ok, if we've gotten to this point, we don't know what the row is.
@@ -120,6 +129,32 @@ class MonthlyReportReader(ExcelReportReader):
         warnings.warn(message ,UnparsableRow)
         return None
 
+    @classmethod
+    def compile_markers(klass):
+        """
+        Normalizes the MARKERS keywords once per class and caches the
+        resulting table of normalized keyword to handler method name.
+        """
+        if "_markers" not in klass.__dict__:
+            klass._markers = dict(
+                (text.normalize(keyword), handler)
+                for keyword, handler in klass.MARKERS.items()
+            )
+        return klass._markers
+
+    def handle_daily_date(self, row):
+        """
+        Discovered a daily date row, set the pickup date. The date may be
+        text in the date format or a date cell.
+        """
+        self._current_pickup_date = self.dates.date(row[1])
+
+    def handle_supervisor(self, row):
+        """
+        Discovered a supervisor row, set the supervisor.
+        """
+        self._current_supervisor  = row[1]
+
     def handle_item(self, item):
         """
         Denormalizes the item into a Python dictionary.
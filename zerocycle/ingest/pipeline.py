@@ -0,0 +1,122 @@
+# zerocycle.ingest.pipeline
+# Producer/consumer pipeline between report readers and the database writer
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Mon Jul 28 13:47:22 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: pipeline.py [] benjamin@bengfort.com $
+
+"""
+Producer/consumer pipeline between report readers and the database writer.
+
+A Pipeline wraps a reader and parses it in a background thread, putting
+chunks of items onto a bounded queue. The writer iterates the pipeline
+like it would the reader, so parsing carries on while the previous batch
+is being flushed to the database. When the queue is full, the reader
+blocks until the writer catches up (backpressure).
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import sys
+import threading
+
+from Queue import Queue, Full
+
+##########################################################################
+## Module Constants
+##########################################################################
+
+DEFAULT_QUEUE_DEPTH = 8         # Maximum chunks waiting on the queue
+DEFAULT_CHUNKSIZE   = 500       # Items put on the queue at a time
+POLL_INTERVAL       = 0.1       # Seconds between checks for a stopped writer
+
+## Sentinel put on the queue when the reader is exhausted
+DONE = object()
+
+##########################################################################
+## Pipeline
+##########################################################################
+
+class Pipeline(object):
+    """
+    Iterates the items of a reader that is being parsed in a background
+    thread. At most `depth` chunks of `chunksize` items are held in memory
+    at any time. Exceptions raised by the reader are raised again in the
+    thread that iterates the pipeline.
+    """
+
+    def __init__(self, reader, depth=DEFAULT_QUEUE_DEPTH, chunksize=DEFAULT_CHUNKSIZE):
+        self.reader    = reader
+        self.chunksize = chunksize
+        self.queue     = Queue(maxsize=depth)
+        self.stopped   = threading.Event()
+        self.thread    = None
+        self.error     = None
+
+    def __str__(self):
+        return "<%s of %s>" % (self.__class__.__name__, self.reader)
+
+    def start(self):
+        """
+        Starts the reader stage if it has not already been started.
+        """
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.produce, name=str(self))
+            self.thread.daemon = True
+            self.thread.start()
+        return self
+
+    def put(self, chunk):
+        """
+        Puts a chunk on the queue, blocking while the queue is full unless
+        the writer has stopped consuming. Returns False if it has.
+        """
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(chunk, timeout=POLL_INTERVAL)
+                return True
+            except Full:
+                continue
+        return False
+
+    def produce(self):
+        """
+        The reader stage: parses the reader into chunks on the queue.
+        """
+        try:
+            chunk = []
+            for item in self.reader:
+                chunk.append(item)
+                if len(chunk) >= self.chunksize:
+                    if not self.put(chunk): return
+                    chunk = []
+            if chunk:
+                self.put(chunk)
+        except Exception:
+            self.error = sys.exc_info()
+        finally:
+            self.put(DONE)
+
+    def __iter__(self):
+        """
+        The writer stage: yields the items from the queue in order.
+        """
+        self.start()
+        try:
+            while True:
+                chunk = self.queue.get()
+                if chunk is DONE: break
+                for item in chunk:
+                    yield item
+        finally:
+            self.stopped.set()
+            self.thread.join()
+
+        if self.error is not None:
+            raise self.error[0], self.error[1], self.error[2]
@@ -0,0 +1,90 @@
+# zerocycle.ingest.routes
+# Route identity map shared by the readers and writers of an ingest run
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Fri Jul 25 09:31:56 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: routes.py [] benjamin@bengfort.com $
+
+"""
+Route identity map shared by the readers and writers of an ingest run.
+
+Every report mentions routes by name, but the database identifies them by
+id. A single RouteMap is created for an ingest run (optionally warmed from
+the routes table with one query) and handed to every reader and to the
+writer, so that route names are resolved to ids without a SELECT per row,
+no matter how many reports mention the same routes.
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+from zerocycle.db.models import Route
+
+##########################################################################
+## Route Map
+##########################################################################
+
+class RouteMap(object):
+    """
+    Maps route names to their database ids. Ids that are learned during a
+    transaction are pending until `commit` is called; `rollback` forgets
+    them again so that the map never refers to routes that do not exist.
+    """
+
+    def __init__(self):
+        self.ids     = {}
+        self.pending = set()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def warm(self, session):
+        """
+        Loads the id of every route in the database with a single query.
+        """
+        self.ids.update((name, idx) for idx, name in session.query(Route.id, Route.name))
+        return self
+
+    def resolve(self, name):
+        """
+        Returns the id of the route name or None if it is not known.
+        """
+        return self.ids.get(name)
+
+    def learn(self, pairs):
+        """
+        Adds (name, id) pairs discovered in the current transaction.
+        """
+        for name, idx in pairs:
+            if name not in self.ids:
+                self.pending.add(name)
+            self.ids[name] = idx
+
+    def commit(self):
+        """
+        The current transaction was committed, so pending ids are kept.
+        """
+        self.pending.clear()
+
+    def rollback(self):
+        """
+        The current transaction was rolled back, forget the pending ids.
+        """
+        for name in self.pending:
+            self.ids.pop(name, None)
+        self.pending.clear()
+
+    def route(self, name, **kwargs):
+        """
+        Constructs a Route for the name with its id already resolved if the
+        route is known, setting any other column values passed in kwargs.
+        """
+        return Route(id=self.resolve(name), name=name, **kwargs)
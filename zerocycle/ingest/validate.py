@@ -0,0 +1,275 @@
+# zerocycle.ingest.validate
+# Validation of reports by their readers, without a database
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Sat Aug 09 10:14:37 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: validate.py [] benjamin@bengfort.com $
+
+"""
+Validation of reports by their readers, without a database.
+
+Every report is read in full by the reader of its type with an empty
+RouteMap, so no session is created and no query is issued. The warnings
+and errors of each report are collected into a summary dictionary (which
+is JSON serializable) rather than raised:
+
+    unparsable  rows that the reader warned about with UnparsableRow
+    invalid     rows that the reader could not convert (the exception of
+                its handle_row or handle_item) and items whose required
+                columns are missing or mistyped
+    error       the exception that stopped the reader, if any
+
+A report is valid if it was read without an error or an invalid item;
+unparsable rows are skipped by an ingest, so they only fail a report if
+the validation is strict.
+
+Reports are validated in a pool of worker processes if jobs is more than
+one, and the summaries are yielded in the order of the paths.
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import os
+import sys
+import time
+import warnings
+import multiprocessing
+
+from datetime import date
+from zerocycle.db.models import Base, Route, Pickup
+from zerocycle.exceptions import *
+from zerocycle.ingest import READERS, get_reader
+from zerocycle.ingest.routes import RouteMap
+
+##########################################################################
+## Module Constants
+##########################################################################
+
+MAX_MESSAGES = 100          # Messages kept of each kind per report
+
+## Report types of files in a directory by their extension
+EXTENSIONS = {
+    ".xls":  "MONTHLY",
+    ".xlsx": "MONTHLY",
+    ".csv":  "ACCOUNTS",
+}
+
+## Required column values of the items that would be written
+REQUIRED = {
+    Route:  (('name', basestring),),
+    Pickup: (('date', date), ('vehicle', basestring)),
+}
+
+##########################################################################
+## Helper functions
+##########################################################################
+
+def find_reports(paths):
+    """
+    Expands any directories in paths to the reports that they contain (by
+    the EXTENSIONS of their names) and returns a list of paths.
+    """
+    reports = []
+    for path in paths:
+        if os.path.isdir(path):
+            reports.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path))
+                if os.path.splitext(name)[1].lower() in EXTENSIONS
+            )
+        else:
+            reports.append(path)
+    return reports
+
+def report_type_of(path):
+    """
+    Guesses the report type of a path by its extension.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXTENSIONS:
+        raise IngestionException("Cannot guess the report type of '%s'" % path)
+    return EXTENSIONS[extension]
+
+def check_item(obj):
+    """
+    Returns a message if a required column of a Route or Pickup is not set
+    or is not of the expected type, otherwise None.
+    """
+    for column, expected in REQUIRED.get(type(obj), ()):
+        value = getattr(obj, column)
+        if not isinstance(value, expected):
+            return "%s %s is %r" % (type(obj).__name__.lower(), column, value)
+    if isinstance(obj, Pickup) and (obj.route is None or not obj.route.name):
+        return "pickup has no route"
+    return None
+
+class RowChecker(object):
+    """
+    Wraps the handle_row and handle_item methods of a reader so that an
+    exception raised while converting a row is recorded as an invalid row
+    and the row is skipped, rather than stopping the reader, so that every
+    row of the report is validated. Counts the rows and items handled.
+    """
+
+    def __init__(self, reader, invalid):
+        self.invalid = invalid
+        self.row     = 0
+        self.items   = 0
+
+        self.handle_row  = reader.handle_row
+        self.handle_item = reader.handle_item
+        reader.handle_row  = self.check_row
+        reader.handle_item = self.check_item
+
+    def error(self, e):
+        self.invalid.append("row %i: %s: %s" % (self.row, type(e).__name__, e))
+
+    def check_row(self, row):
+        self.row += 1
+        try:
+            return self.handle_row(row)
+        except (ValueError, TypeError, KeyError, IndexError) as e:
+            self.error(e)
+            return None
+
+    def check_item(self, item):
+        self.items += 1
+        try:
+            return self.handle_item(item)
+        except (ValueError, TypeError, KeyError, IndexError) as e:
+            self.error(e)
+            return None
+
+def reset_warnings(reader):
+    """
+    Forgets the warnings that the modules of the reader have issued, since
+    Python 2 does not repeat a warning that is in the registry of its
+    module, even if the filter is "always".
+    """
+    for klass in type(reader).__mro__:
+        module = sys.modules.get(klass.__module__)
+        if module is not None:
+            vars(module).pop('__warningregistry__', None)
+
+##########################################################################
+## Validation
+##########################################################################
+
+def validate_report(task):
+    """
+    Reads every item of a report and returns its summary. Expects a
+    (report_type, path, kwargs) task so that it can be mapped by a pool.
+    """
+    report_type, path, kwargs = task
+    summary = {
+        "path": path,
+        "type": report_type.upper() if report_type else None,
+        "rows": 0,
+        "routes": set(),
+        "pickups": 0,
+        "unparsable": [],
+        "invalid": [],
+        "error": None,
+    }
+
+    started = time.time()
+    checker = None
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", UnparsableRow)
+        try:
+            report_type = summary["type"] or report_type_of(path)
+            summary["type"] = report_type
+
+            reader  = get_reader(report_type, path, routes=RouteMap(), **kwargs)
+            checker = RowChecker(reader, summary["invalid"])
+            reset_warnings(reader)
+            for item in reader:
+                for obj in (item if isinstance(item, tuple) else (item,)):
+                    if not isinstance(obj, Base): continue
+                    if isinstance(obj, Route):
+                        summary["routes"].add(obj.name)
+                    elif isinstance(obj, Pickup):
+                        summary["pickups"] += 1
+
+                    message = check_item(obj)
+                    if message is not None:
+                        summary["invalid"].append("row %i: %s" % (checker.row, message))
+        except Exception as e:
+            # Any other exception stops the reader, including the ones that
+            # xlrd raises on corrupt files, and is the error of the report.
+            summary["error"] = "%s: %s" % (type(e).__name__, e)
+
+    if checker is not None:
+        summary["rows"] = checker.items
+
+    summary["unparsable"] = [
+        warning.message.args[0] for warning in caught
+        if issubclass(warning.category, UnparsableRow)
+    ]
+    summary["routes"] = len(summary["routes"])
+
+    for key in ("unparsable", "invalid"):
+        summary["%s_count" % key] = len(summary[key])
+        summary[key] = summary[key][:MAX_MESSAGES]
+
+    summary["valid"]   = not (summary["error"] or summary["invalid_count"])
+    summary["elapsed"] = time.time() - started
+    return summary
+
+def validate_reports(report_type, paths, jobs=1, **kwargs):
+    """
+    Validates the reports at paths (and in any directories in paths),
+    yielding the summary of each in order. If report_type is None, the
+    type of each report is guessed from its extension. With more than one
+    job, the reports are read in a pool of that many worker processes.
+    """
+    if report_type is not None and report_type.upper() not in READERS:
+        raise IngestionException("No Report type called '%s'" % report_type)
+
+    paths = find_reports(paths)
+    tasks = [(report_type, path, kwargs) for path in paths]
+
+    if (jobs or 1) == 1 or len(tasks) < 2:
+        for task in tasks:
+            yield validate_report(task)
+        return
+
+    pool = multiprocessing.Pool(min(jobs, len(tasks)))
+    try:
+        for summary in pool.imap(validate_report, tasks):
+            yield summary
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+def passed(summary, strict=False):
+    """
+    Returns True if the report is valid and, if strict, has no unparsable
+    rows either.
+    """
+    return summary["valid"] and not (strict and summary["unparsable_count"])
+
+def summarize(summaries, strict=False):
+    """
+    Totals the summaries of reports into a single summary of the run.
+    """
+    summaries = list(summaries)
+    failed    = sum(1 for summary in summaries if not passed(summary, strict))
+    totals    = {
+        "reports": summaries,
+        "strict": strict,
+        "valid": failed == 0,
+        "failed": failed,
+    }
+    for key in ("rows", "routes", "pickups", "unparsable_count", "invalid_count"):
+        totals[key] = sum(summary[key] for summary in summaries)
+    totals["errors"] = sum(1 for summary in summaries if summary["error"])
+    return totals
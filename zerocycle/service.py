@@ -0,0 +1,392 @@
+# zerocycle.service
+# A read-only WSGI service of routes, pickups and aggregates as JSON
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Fri Aug 08 09:47:02 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: service.py [] benjamin@bengfort.com $
+
+"""
+A read-only WSGI service of routes, pickups and aggregates as JSON.
+
+    GET /routes                     ?supervisor=
+    GET /routes/<name>
+    GET /pickups                    ?start=&end=&route=&supervisor=&vehicle=&limit=&offset=
+    GET /aggregates/<source>        ?column=&how=&by=&start=&end=&route=&supervisor=&vehicle=
+
+where the source of aggregates is pickups, daily or monthly (the rollups)
+and dates are YYYY-MM-DD. Filters may be repeated to match any of their
+values, and column and by are comma separated lists.
+
+Every response carries an ETag of the request and the version of the
+data, which changes whenever a report is ingested or the rollups are
+written or rebuilt (see `data_version`), and is revalidated by clients
+(Cache-Control: no-cache). A request whose If-None-Match has the current
+ETag (weak or strong) gets a 304 without being queried, as does an
+If-None-Match of * if the resource exists, and the bodies of the most
+recently used responses are cached in memory, so polling a summary costs
+a single query of the data version until the next write. Run it locally
+with `zerocycle serve`.
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import re
+import json
+import hashlib
+import threading
+
+from decimal import Decimal
+from urlparse import parse_qs
+from collections import OrderedDict
+from sqlalchemy import select, func
+from sqlalchemy.orm import joinedload
+from zerocycle.db import create_session
+from zerocycle.db.models import Route, Pickup, Report, DailyRollup, MonthlyRollup
+from zerocycle.db.managers import RoutesManager, PickupsManager
+from zerocycle.db.managers import DailyRollupsManager, MonthlyRollupsManager
+from zerocycle.export import format_value
+from zerocycle.utils.timez import date_parser, ISO8601_DATE
+
+##########################################################################
+## Module Constants
+##########################################################################
+
+DEFAULT_CACHE_SIZE = 256        # Responses kept in memory
+DEFAULT_LIMIT      = 1000       # Pickups per page unless limit is given
+MAX_LIMIT          = 10000      # Most pickups per page
+
+FILTERS = ('route', 'supervisor', 'vehicle')
+ETAGS   = re.compile(r'\*|(?:W/)?"[^"]*"')
+SOURCES = {
+    'pickups': PickupsManager,
+    'daily':   DailyRollupsManager,
+    'monthly': MonthlyRollupsManager,
+}
+
+STATUSES = {
+    200: "200 OK",
+    304: "304 Not Modified",
+    400: "400 Bad Request",
+    404: "404 Not Found",
+    405: "405 Method Not Allowed",
+}
+
+##########################################################################
+## Exceptions
+##########################################################################
+
+class HTTPError(Exception):
+    """
+    Raised by a handler to respond with the status and message.
+    """
+
+    def __init__(self, status, message):
+        super(HTTPError, self).__init__(message)
+        self.status = status
+
+##########################################################################
+## Helper functions
+##########################################################################
+
+def json_default(obj):
+    """
+    Serializes dates and datetimes like the exports, and decimals.
+    """
+    if isinstance(obj, Decimal):
+        return float(obj)
+    value = format_value(obj)
+    if value is obj:
+        raise TypeError("%r is not JSON serializable" % obj)
+    return value
+
+def data_version(session):
+    """
+    Returns a token of the reports that have been ingested and of the
+    rollups, which changes whenever a report is added to or updated in the
+    manifest and whenever the rollups are written, including by a rebuild,
+    with a single query.
+    """
+    rollups = [
+        select([func.max(DailyRollup.updated)]).as_scalar().label('daily_updated'),
+        select([func.count(MonthlyRollup.id)]).as_scalar().label('monthly_count'),
+        select([func.max(MonthlyRollup.updated)]).as_scalar().label('monthly_updated'),
+    ]
+    version = session.query(func.count(Report.id), func.max(Report.id), func.max(Report.updated), *rollups).one()
+    return ":".join(str(value) for value in version)
+
+class Params(object):
+    """
+    Parses the parameters of a query string.
+    """
+
+    def __init__(self, query):
+        self.params = parse_qs(query)
+
+    def all(self, name):
+        return [value.decode('utf-8') for value in self.params.get(name, []) if value]
+
+    def list(self, name):
+        values = []
+        for value in self.all(name):
+            values.extend(item.strip() for item in value.split(',') if item.strip())
+        return values
+
+    def get(self, name, default=None):
+        values = self.all(name)
+        return values[-1] if values else default
+
+    def date(self, name):
+        value = self.get(name)
+        if value is None: return None
+        try:
+            return date_parser(ISO8601_DATE).date(value)
+        except ValueError:
+            raise HTTPError(400, "%s must be a date as YYYY-MM-DD" % name)
+
+    def integer(self, name, default, maximum=None):
+        try:
+            value = int(self.get(name, default))
+        except ValueError:
+            raise HTTPError(400, "%s must be an integer" % name)
+        if maximum is None and value < 0:
+            raise HTTPError(400, "%s must be at least 0" % name)
+        if maximum is not None and not 0 <= value <= maximum:
+            raise HTTPError(400, "%s must be between 0 and %s" % (name, maximum))
+        return value
+
+    def filters(self):
+        return dict((name, self.all(name)) for name in FILTERS if self.all(name))
+
+##########################################################################
+## Response cache
+##########################################################################
+
+class ResponseCache(object):
+    """
+    A thread safe cache of the maxsize most recently used responses.
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock    = threading.Lock()
+        self.hits    = 0
+        self.misses  = 0
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            value = self.entries.pop(key)
+            self.entries[key] = value
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0: return
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = value
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+##########################################################################
+## Query Service
+##########################################################################
+
+class QueryService(object):
+    """
+    The WSGI application, which answers GET (and HEAD) requests with the
+    routes, pickups and aggregates in a scoped session of `create_session`
+    that is removed at the end of every request.
+    """
+
+    ## Handlers by the pattern of the paths that they serve
+    URLS = (
+        (re.compile(r'^/routes/?$'), 'routes'),
+        (re.compile(r'^/routes/(?P<name>[^/]+)/?$'), 'route'),
+        (re.compile(r'^/pickups/?$'), 'pickups'),
+        (re.compile(r'^/aggregates/(?P<source>[^/]+)/?$'), 'aggregates'),
+    )
+
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE, sessions=create_session):
+        self.cache    = ResponseCache(cache_size)
+        self.sessions = sessions
+
+    def __call__(self, environ, start_response):
+        method = environ.get('REQUEST_METHOD', 'GET')
+        path   = environ.get('PATH_INFO', '/') or '/'
+        query  = environ.get('QUERY_STRING', '')
+
+        try:
+            if method not in ('GET', 'HEAD'):
+                raise HTTPError(405, "%s is not allowed, the service is read-only" % method)
+
+            handler, kwargs = self.resolve(path)
+            session = self.sessions(scoped=True)
+            try:
+                key  = (path, tuple(sorted(parse_qs(query).items())))
+                etag = '"%s"' % hashlib.sha1(repr((data_version(session), key))).hexdigest()
+
+                tags = self.if_none_match(environ)
+                if etag in tags:
+                    return self.respond(start_response, 304, etag=etag)
+
+                body = self.cache.get(etag)
+                if body is None:
+                    data = getattr(self, handler)(session, Params(query), **kwargs)
+                    body = json.dumps(data, default=json_default, sort_keys=True)
+                    self.cache.set(etag, body)
+
+                if '*' in tags:
+                    return self.respond(start_response, 304, etag=etag)
+            finally:
+                self.sessions.remove()
+
+            return self.respond(start_response, 200, body if method == 'GET' else None, etag, len(body))
+        except HTTPError as e:
+            body = json.dumps({"error": e.args[0]})
+            return self.respond(start_response, e.status, body)
+
+    def resolve(self, path):
+        """
+        Returns the name of the handler of the path and its arguments.
+        """
+        for pattern, handler in self.URLS:
+            match = pattern.match(path)
+            if match:
+                return handler, dict((key, value.decode('utf-8')) for key, value in match.groupdict().items())
+        raise HTTPError(404, "no resource at %s" % path)
+
+    def if_none_match(self, environ):
+        """
+        Returns the ETags of the If-None-Match header of the request, or *,
+        without the W/ prefix of weak validators since If-None-Match uses
+        the weak comparison of RFC 7232.
+        """
+        tags = ETAGS.findall(environ.get('HTTP_IF_NONE_MATCH', ''))
+        return set(tag[2:] if tag.startswith('W/') else tag for tag in tags)
+
+    def respond(self, start_response, status, body=None, etag=None, length=None):
+        headers = [('Cache-Control', 'no-cache')]
+        if etag is not None:
+            headers.append(('ETag', etag))
+        if status != 304:
+            headers.append(('Content-Type', 'application/json; charset=utf-8'))
+            headers.append(('Content-Length', str(length if length is not None else len(body or ''))))
+
+        start_response(STATUSES[status], headers)
+        return [body] if body else []
+
+    ##////////////////////////////////////////////////////////////////////
+    ## Handlers
+    ##////////////////////////////////////////////////////////////////////
+
+    def serialize_route(self, route):
+        return {
+            "name": route.name,
+            "supervisor": route.supervisor,
+            "locations": route.locations,
+            "updated": route.updated,
+        }
+
+    def routes(self, session, params):
+        """
+        The routes, by name, of any of the supervisors.
+        """
+        filters = {}
+        if params.all('supervisor'):
+            filters['supervisor'] = params.all('supervisor')
+
+        query = RoutesManager().filter(session, **filters).order_by(Route.name)
+        return {"routes": [self.serialize_route(route) for route in query]}
+
+    def route(self, session, params, name):
+        """
+        A route by its name.
+        """
+        route = RoutesManager().filter(session, name=name).first()
+        if route is None:
+            raise HTTPError(404, "no route named %s" % name)
+        return self.serialize_route(route)
+
+    def pickups(self, session, params):
+        """
+        A page of the pickups between the dates, by date and route.
+        """
+        limit  = params.integer('limit', DEFAULT_LIMIT, MAX_LIMIT)
+        offset = params.integer('offset', 0)
+        query  = PickupsManager().filter(session, params.date('start'), params.date('end'), **params.filters())
+        query  = query.options(joinedload(Pickup.route)).order_by(Pickup.date, Pickup.id)
+
+        return {
+            "limit": limit,
+            "offset": offset,
+            "pickups": [
+                {
+                    "date": pickup.date,
+                    "route": pickup.route.name,
+                    "supervisor": pickup.route.supervisor,
+                    "vehicle": pickup.vehicle,
+                    "miles": pickup.miles,
+                    "garbage": pickup.garbage,
+                }
+                for pickup in query.limit(limit).offset(offset)
+            ],
+        }
+
+    def aggregates(self, session, params, source):
+        """
+        The columns of the source reduced by how and grouped by by.
+        """
+        if source not in SOURCES:
+            raise HTTPError(404, "no aggregates of %s, choose from %s" % (source, ", ".join(sorted(SOURCES))))
+
+        columns = params.list('column') or ['garbage']
+        how     = params.get('how', 'sum')
+        by      = params.list('by')
+        filters = params.filters()
+
+        try:
+            rows = SOURCES[source]().aggregate(session, columns, how, by, params.date('start'), params.date('end'), **filters)
+        except (ValueError, AttributeError) as e:
+            raise HTTPError(400, e.args[0])
+
+        return {
+            "source": source,
+            "how": how,
+            "by": by,
+            "results": [dict(zip(row.keys(), row)) for row in rows],
+        }
+
+##########################################################################
+## Running the service
+##########################################################################
+
+def serve(host='127.0.0.1', port=8000, cache_size=DEFAULT_CACHE_SIZE):
+    """
+    Serves the QueryService with the wsgiref reference server until it is
+    interrupted.
+    """
+    from wsgiref.simple_server import make_server
+
+    httpd = make_server(host, port, QueryService(cache_size))
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+if __name__ == '__main__':
+    serve()
@@ -22,10 +22,42 @@ import sys
 import string
 import unicodedata
 
+##########################################################################
+## Module Constants
+##########################################################################
+
+NORMALIZE_CACHE_SIZE = 8192                 # Maximum memoized normalizations
+WHITESPACE = re.compile(r'\s+')             # Whitespace to be grayspaced
+IDENTITY   = string.maketrans("", "")       # Byte string translation table
+
+## Unicode punctuation translation table, built once on first use
+_punctuation = None
+
+## Bounded memo of normalized text keyed on (type, text)
+_normalized  = {}
+
 ##########################################################################
 ## Helper functions
 ##########################################################################
 
+def punctuation_table():
+    """
+    Returns the translation table that removes all unicode punctuation.
+    Building the table requires a category lookup for every unicode code
+    point, so it is built once and shared by every call to depunctuate.
+    """
+    global _punctuation
+    if _punctuation is None:
+        _punctuation = dict.fromkeys(i for i in xrange(sys.maxunicode)
+                if unicodedata.category(unichr(i)).startswith('P'))
+    return _punctuation
+
+def clear_cache():
+    """
+    Empties the memo of normalized text.
+    """
+    _normalized.clear()
+
 def depunctuate(s):
     """
     Remove all punctuation from a string.
@@ -34,12 +66,10 @@ def depunctuate(s):
         return None
 
     elif isinstance(s, str):
-        return s.translate(string.maketrans("",""), string.punctuation)
+        return s.translate(IDENTITY, string.punctuation)
 
     elif isinstance(s, unicode):
-        tbl = dict.fromkeys(i for i in xrange(sys.maxunicode)
-                if unicodedata.category(unichr(i)).startswith('P'))
-        return s.translate(tbl)
+        return s.translate(punctuation_table())
 
     else:
         raise TypeError("Unknown type to depunctuate, '%s'" % type(s))
@@ -50,7 +80,7 @@ def grayspace(s):
     space character, then strip off any trailing space at the end.
     """
     if s is None: return None
-    return re.sub( '\s+', ' ', s ).strip()
+    return WHITESPACE.sub(' ', s).strip()
 
 def normalize(text):
     """
@@ -63,15 +93,42 @@ def normalize(text):
 
     This will allow for case-insensitive, punctuation-insensitive,
     whitespace-insensitive string comparisons.
+
+    Results are memoized since the same values (supervisor names, route
+    codes, marker keywords) are normalized over and over again; the memo
+    is emptied whenever it reaches NORMALIZE_CACHE_SIZE entries.
     """
     if text is None: return None
-    text = depunctuate(text)
-    text = grayspace(text)
-    return text.lower()
+
+    key = (type(text), text)
+    if key in _normalized:
+        return _normalized[key]
+
+    normal = depunctuate(text)
+    normal = grayspace(normal)
+    normal = normal.lower()
+
+    if len(_normalized) >= NORMALIZE_CACHE_SIZE:
+        _normalized.clear()
+    _normalized[key] = normal
+    return normal
+
+def normalize_many(texts):
+    """
+    Normalizes a whole column of text, returning a list of the normalized
+    values. Each distinct value is only normalized once.
+    """
+    seen = {}
+    normals = []
+    for text in texts:
+        key = (type(text), text)
+        if key not in seen:
+            seen[key] = normalize(text)
+        normals.append(seen[key])
+    return normals
 
 def compare(apples, oranges):
     """
     Compares two pieces of text by normalizing them, and then comparing.
     """
     return normalize(apples) == normalize(oranges)
-
@@ -0,0 +1,246 @@
+# zerocycle.utils.timers
+# Lightweight per-stage timers and counters for profiling ingestion
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Tue Aug 05 09:44:21 2014 -0400
+#
+# Copyright (C) 2014 Bengfort.com
+# For license information, see LICENSE.txt
+#
+# ID: timers.py [] benjamin@bengfort.com $
+
+"""
+Lightweight per-stage timers and counters for profiling ingestion.
+
+The module level profiler is disabled by default, in which case its
+timers are a shared no-op and its wrappers return the function or iterable
+untouched, so instrumented code pays next to nothing. Once enabled, the
+profiler accumulates the seconds spent in and the number of calls to each
+stage. Stages are dotted names, e.g. "read.handle_row" is a part of
+"read", and the report shows how much of every stage its parts account
+for:
+
+    from zerocycle.utils.timers import profiler
+
+    profiler.enable()
+    for obj, created in ingest_report('monthly', path):
+        pass
+    print "\\n".join(profiler.report())
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import time
+import threading
+
+from functools import wraps
+from collections import defaultdict
+
+##########################################################################
+## Timers
+##########################################################################
+
+class Timer(object):
+    """
+    Context manager that adds the time spent in its block to a stage.
+    """
+
+    __slots__ = ('profiler', 'stage', 'started')
+
+    def __init__(self, profiler, stage):
+        self.profiler = profiler
+        self.stage    = stage
+
+    def __enter__(self):
+        self.started = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.stage, time.time() - self.started)
+
+class NullTimer(object):
+    """
+    Context manager that does nothing, used while profiling is disabled.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+NULL_TIMER = NullTimer()
+
+##########################################################################
+## Profiler
+##########################################################################
+
+class Profiler(object):
+    """
+    Accumulates the time spent in and the calls to stages, and counters.
+    Stages may be timed from several threads (e.g. by a Pipeline).
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock    = threading.Lock()
+        self.reset()
+
+    def enable(self):
+        self.enabled = True
+        return self
+
+    def disable(self):
+        self.enabled = False
+        return self
+
+    def reset(self):
+        """
+        Clears all of the timings and counters.
+        """
+        with self.lock:
+            self.seconds  = defaultdict(float)
+            self.calls    = defaultdict(int)
+            self.counters = defaultdict(int)
+        return self
+
+    def add(self, stage, seconds, calls=1):
+        """
+        Adds seconds spent in a stage, regardless of whether it is enabled.
+        """
+        with self.lock:
+            self.seconds[stage] += seconds
+            self.calls[stage]   += calls
+
+    def snapshot(self):
+        """
+        Returns the seconds, calls and counters as plain dictionaries, which
+        can be pickled and sent back from a worker process.
+        """
+        with self.lock:
+            return {
+                "seconds":  dict(self.seconds),
+                "calls":    dict(self.calls),
+                "counters": dict(self.counters),
+            }
+
+    def merge(self, snapshot, prefix):
+        """
+        Adds the stages of a snapshot (e.g. of a worker process) beneath the
+        prefix stage, which is timed as the total of its top level stages.
+        Counters are added as they are.
+        """
+        seconds, calls = snapshot["seconds"], snapshot["calls"]
+        self.add(prefix, sum(value for stage, value in seconds.items() if '.' not in stage))
+        for stage, value in seconds.items():
+            self.add(prefix + "." + stage, value, calls.get(stage, 0))
+        with self.lock:
+            for counter, n in snapshot["counters"].items():
+                self.counters[counter] += n
+
+    def count(self, counter, n=1):
+        """
+        Increments a counter if profiling is enabled.
+        """
+        if self.enabled:
+            with self.lock:
+                self.counters[counter] += n
+
+    def timer(self, stage):
+        """
+        Returns a context manager that times its block as the stage.
+        """
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self, stage)
+
+    def wrap(self, stage, func):
+        """
+        Returns the function timed as the stage, or the function itself if
+        profiling is disabled.
+        """
+        if not self.enabled:
+            return func
+
+        @wraps(func)
+        def timed(*args, **kwargs):
+            started = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(stage, time.time() - started)
+        return timed
+
+    def iterate(self, stage, iterable):
+        """
+        Returns the iterable with the time spent producing each of its
+        items timed as the stage, or the iterable itself if profiling is
+        disabled. The time the consumer spends with an item is not counted.
+        """
+        if not self.enabled:
+            return iterable
+        return self._iterate(stage, iterable)
+
+    def _iterate(self, stage, iterable):
+        iterator = iter(iterable)
+        while True:
+            started = time.time()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(stage, time.time() - started, 0)
+                return
+            self.add(stage, time.time() - started)
+            yield item
+
+    def report(self, elapsed=None, rows=None):
+        """
+        Returns lines of a per-stage breakdown: the seconds, calls and share
+        of each stage, with the parts of a stage indented beneath it along
+        with the time its parts do not account for, then the counters. If
+        elapsed and rows are given, the overall rows/sec is reported.
+        """
+        with self.lock:
+            seconds  = dict(self.seconds)
+            calls    = dict(self.calls)
+            counters = dict(self.counters)
+
+        total  = elapsed or sum(value for stage, value in seconds.items() if '.' not in stage)
+        lines  = ["%-28s %10s %10s %7s" % ("stage", "seconds", "calls", "share")]
+
+        def line(name, value, count, depth):
+            share = 100.0 * value / total if total else 0.0
+            lines.append("%-28s %10.3f %10s %6.1f%%" % ("  " * depth + name, value, count, share))
+
+        def children(stage):
+            prefix = stage + "." if stage else ""
+            return sorted(
+                (name for name in seconds if name.startswith(prefix) and '.' not in name[len(prefix):]),
+                key=lambda name: -seconds[name]
+            )
+
+        def walk(stage, depth):
+            parts = children(stage)
+            for name in parts:
+                line(name.rsplit('.', 1)[-1], seconds[name], calls.get(name, 0), depth)
+                walk(name, depth + 1)
+            if stage and parts:
+                other = seconds[stage] - sum(seconds[name] for name in parts)
+                if other > 0:
+                    line("(other)", other, "", depth)
+
+        walk("", 0)
+
+        for counter in sorted(counters):
+            lines.append("%-28s %10i" % (counter, counters[counter]))
+
+        if elapsed is not None and rows is not None:
+            lines.append("%i rows in %0.3f seconds, %0.1f rows/sec" % (rows, elapsed, rows / elapsed if elapsed > 0 else 0.0))
+        return lines
+
+## The profiler of the running process
+profiler = Profiler()
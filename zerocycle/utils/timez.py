@@ -15,6 +15,16 @@ Time utilities for ensuring that the Timezone is properly handled.
 This is necessary for logging, particularly as deployments can be across
 various regions within AWS, and to ensure that the timing of jobs is
 synced across all nodes and workers.
+
+The local timezone is resolved once per process. Within a BatchClock,
+Clock.localnow returns the single time of the batch, so that every row
+written in the batch is stamped alike without a clock call per row.
+
+Dates are parsed by a DateParser, which compiles a strptime format into a
+single regular expression once (see `date_parser`), so that parsing a
+value is one match and a datetime constructor rather than a full
+`datetime.strptime`. Parsers also convert the date serials of Excel cells
+and parse whole columns at a time.
 """
 
 ##########################################################################
@@ -22,6 +32,7 @@ synced across all nodes and workers.
 ##########################################################################
 
 import re
+import threading
 
 from dateutil.tz import tzlocal, tzutc
 from datetime import date, datetime, timedelta
@@ -39,6 +50,234 @@ ISO8601_DATE     = "%Y-%m-%d"
 ISO8601_TIME     = "%H:%M:%S"
 COMMON_DATETIME  = "%d/%b/%Y:%H:%M:%S %z"
 
+##########################################################################
+## Timezone constants
+##########################################################################
+
+LOCAL_TZ         = tzlocal()    # Resolved once per process
+UTC_TZ           = tzutc()
+
+##########################################################################
+## Date Parsers
+##########################################################################
+
+MONTHS   = ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec")
+FULL_MONTHS = (
+    "january", "february", "march", "april", "may", "june", "july",
+    "august", "september", "october", "november", "december",
+)
+
+## Regular expressions of the strptime directives that are compiled; the
+## names of the groups are the directives. Names are matched in English.
+DIRECTIVES = {
+    'Y': r'(?P<Y>\d{4})',
+    'y': r'(?P<y>\d{2})',
+    'm': r'(?P<m>1[0-2]|0[1-9]|[1-9])',
+    'd': r'(?P<d>3[01]|[12]\d|0[1-9]|[1-9])',
+    'H': r'(?P<H>2[0-3]|[01]\d|\d)',
+    'I': r'(?P<I>1[0-2]|0[1-9]|[1-9])',
+    'M': r'(?P<M>[0-5]\d|\d)',
+    'S': r'(?P<S>6[01]|[0-5]\d|\d)',
+    'f': r'(?P<f>\d{1,6})',
+    'p': r'(?P<p>am|pm)',
+    'b': r'(?P<b>%s)' % "|".join(MONTHS),
+    'B': r'(?P<B>%s)' % "|".join(FULL_MONTHS),
+    'a': r'(?:mon|tue|wed|thu|fri|sat|sun)',
+    'A': r'(?:monday|tuesday|wednesday|thursday|friday|saturday|sunday)',
+    'z': r'(?P<z>[\-\+]\d\d:?\d\d|z)',
+    '%': r'%',
+}
+
+## Formats of only these leading datetime fields are parsed by position
+NUMERIC_FIELDS = "YmdHMS"
+
+## The days of the Excel date serials of each workbook datemode count from
+EXCEL_EPOCHS = {
+    0: datetime(1899, 12, 30),  # 1900 based, after the phantom 29 Feb 1900
+    1: datetime(1904, 1, 1),    # 1904 based
+}
+
+def xldate(serial, datemode=0):
+    """
+    Converts the date serial of an Excel date cell into a datetime using
+    the datemode of its workbook, rounded to the millisecond.
+    """
+    if serial < 0 or (datemode == 0 and 60 <= serial < 61):
+        raise ValueError("invalid Excel date serial %r for datemode %i" % (serial, datemode))
+
+    epoch = EXCEL_EPOCHS[datemode]
+    if datemode == 0 and serial < 60:
+        epoch += timedelta(days=1)  # Before the phantom leap day
+    return epoch + timedelta(milliseconds=round(serial * 86400000))
+
+class DateParser(object):
+    """
+    Compiles a strptime format into one regular expression so that a
+    value is parsed by a single match. Like `strptimez`, if the format has
+    a '%z' the result is converted to UTC and is timezone aware. Formats
+    with other directives (or the same directive twice) fall back to
+    `datetime.strptime`.
+
+    If a datemode is given, numbers are taken to be the date serials of
+    Excel cells from a workbook in that datemode. Datetimes are returned
+    as they are.
+    """
+
+    def __init__(self, fmt, datemode=None):
+        self.format   = fmt
+        self.datemode = datemode
+        self.regex    = None
+        self.numeric  = None
+
+        parts  = []
+        fields = set()
+        for idx, part in enumerate(re.split(r'(%.)', fmt)):
+            if idx % 2 == 0:
+                # Whitespace in a format matches any whitespace, as strptime
+                parts.append(r'\s+'.join(re.escape(text) for text in part.split()))
+                if part[:1].isspace(): parts.insert(-1, r'\s*')
+                if part[-1:].isspace(): parts.append(r'\s*')
+                continue
+
+            directive = part[1]
+            if directive not in DIRECTIVES or directive in fields:
+                return
+            if directive not in 'aA%': fields.add(directive)
+            parts.append(DIRECTIVES[directive])
+
+        self.regex = re.compile("".join(parts) + r'\Z', re.IGNORECASE)
+
+        # e.g. "%m/%d/%Y": the groups are the datetime arguments, reordered
+        if len(fields) >= 3 and fields == set(NUMERIC_FIELDS[:len(fields)]):
+            self.numeric = tuple(self.regex.groupindex[field] for field in NUMERIC_FIELDS[:len(fields)])
+
+    def __call__(self, value):
+        if isinstance(value, datetime):
+            return value
+        if self.datemode is not None and isinstance(value, (int, long, float)):
+            return xldate(value, self.datemode)
+        if self.regex is None:
+            return self.strptime(value)
+
+        match = self.regex.match(value)
+        if match is None:
+            raise ValueError("time data %r does not match format %r" % (value, self.format))
+        if self.numeric is not None:
+            return datetime(*map(int, match.group(*self.numeric)))
+
+        fields = match.groupdict()
+
+        if 'Y' in fields:
+            year = int(fields['Y'])
+        elif 'y' in fields:
+            year = int(fields['y'])
+            year += 2000 if year < 69 else 1900
+        else:
+            year = 1900
+
+        if 'm' in fields:
+            month = int(fields['m'])
+        elif 'b' in fields:
+            month = MONTHS.index(fields['b'].lower()) + 1
+        elif 'B' in fields:
+            month = FULL_MONTHS.index(fields['B'].lower()) + 1
+        else:
+            month = 1
+
+        if 'I' in fields:
+            hour = int(fields['I']) % 12
+            if 'p' in fields and fields['p'].lower() == 'pm':
+                hour += 12
+        else:
+            hour = int(fields.get('H', 0))
+
+        dt = datetime(
+            year, month, int(fields.get('d', 1)), hour,
+            int(fields.get('M', 0)), int(fields.get('S', 0)),
+            int(fields['f'].ljust(6, '0')) if 'f' in fields else 0,
+        )
+
+        if 'z' in fields:
+            offset = fields['z'].replace(':', '')
+            if offset.lower() != 'z':
+                minutes = int(offset[1:3]) * 60 + int(offset[3:5])
+                dt -= timedelta(minutes=-minutes if offset[0] == '-' else minutes)
+            dt = dt.replace(tzinfo=UTC_TZ)
+        return dt
+
+    def strptime(self, value):
+        """
+        Parses the value with `datetime.strptime`, converting the UTC
+        offset of a '%z' format to UTC.
+        """
+        if '%z' not in self.format:
+            return datetime.strptime(value, self.format)
+
+        offset = zre.search(value).group(1)
+        minutes = int(offset[1:3]) * 60 + int(offset[3:5])
+        dt = datetime.strptime(zre.sub('', value), self.format.replace('%z', ''))
+        dt -= timedelta(minutes=-minutes if offset[0] == '-' else minutes)
+        return dt.replace(tzinfo=UTC_TZ)
+
+    def date(self, value):
+        """
+        Parses the value into a date.
+        """
+        return self(value).date()
+
+    def column(self, values, coerce=False):
+        """
+        Parses a whole column of values (e.g. a column of a CSV chunk) into
+        a NumPy datetime64 array, in UTC if the format has a '%z'. Each
+        distinct value is only parsed once, and Excel date serials are
+        converted with array arithmetic. Empty values (None, blank strings
+        and NaN) are NaT; malformed values raise a ValueError unless
+        coerce is True, in which case they are NaT as well.
+        """
+        import numpy as np
+
+        values = np.asarray(values)
+        if self.datemode is not None and values.dtype.kind in 'iuf':
+            missing = np.isnan(values) if values.dtype.kind == 'f' else np.zeros(len(values), dtype=bool)
+            serials = np.where(missing, 0, values)
+            invalid = serials < 0
+            if self.datemode == 0:
+                invalid |= (serials >= 60) & (serials < 61)
+            if invalid.any() and not coerce:
+                raise ValueError("invalid Excel date serials for datemode %i" % self.datemode)
+
+            epoch  = np.datetime64(EXCEL_EPOCHS[self.datemode], 'ms')
+            millis = np.round(serials * 86400000).astype('timedelta64[ms]')
+            if self.datemode == 0:
+                millis = millis + np.where(serials < 60, 86400000, 0).astype('timedelta64[ms]')
+            dates  = (epoch + millis).astype('datetime64[us]')
+            dates[missing | invalid] = np.datetime64('NaT')
+            return dates
+
+        uniques, inverse = np.unique(values.astype(object), return_inverse=True)
+        parsed = []
+        for value in uniques:
+            if value is None or (isinstance(value, basestring) and not value.strip()) or value != value:
+                parsed.append(None)
+                continue
+            try:
+                parsed.append(self(value).replace(tzinfo=None))
+            except ValueError:
+                if not coerce: raise
+                parsed.append(None)
+        return np.array(parsed, dtype='datetime64[us]')[inverse]
+
+_parsers = {}
+def date_parser(fmt, datemode=None):
+    """
+    Returns the DateParser of the format (and datemode), which is compiled
+    the first time that it is asked for.
+    """
+    key = (fmt, datemode)
+    if key not in _parsers:
+        _parsers[key] = DateParser(fmt, datemode)
+    return _parsers[key]
+
 ##########################################################################
 ## Module helper function
 ##########################################################################
@@ -48,16 +287,9 @@ def strptimez(dtstr, dtfmt):
     """
     Helper function that performs the timezone calculation to correctly
     compute the '%z' format that is not added by default in Python 2.7.
+    The format is compiled once by `date_parser`.
     """
-    if '%z' not in dtfmt:
-        return datetime.strptime(dtstr, dtfmt)
-
-    dtfmt  = dtfmt.replace('%z', '')
-    offset = int(zre.search(dtstr).group(1))
-    dtstr  = zre.sub('', dtstr)
-    delta  = timedelta(hours = offset/100)
-    utctsp = datetime.strptime(dtstr, dtfmt) - delta
-    return utctsp.replace(tzinfo=tzutc())
+    return date_parser(dtfmt)(dtstr)
 
 def dthandler(obj, dtftmt="%Y-%m-%dT%H:%M:%S"):
     """
@@ -104,12 +336,15 @@ class Clock(object):
 
     @staticmethod
     def localnow():
-        return datetime.now(tzlocal())
+        now = getattr(BatchClock.active, 'now', None)
+        if now is not None:
+            return now
+        return datetime.now(LOCAL_TZ)
 
     @staticmethod
     def utcnow():
         now = datetime.utcnow()
-        now = now.replace(tzinfo=tzutc())
+        now = now.replace(tzinfo=UTC_TZ)
         return now
 
     def __init__(self, default="long", local=False, formats={}):
@@ -131,6 +366,39 @@ class Clock(object):
     def __str__(self):
         return self.strfnow()
 
+##########################################################################
+## Batch Clock
+##########################################################################
+
+class BatchClock(object):
+    """
+    A context manager that stops the local clock for a batch of writes:
+    within its blocks, Clock.localnow returns the time that the batch
+    clock was created (or now) in the thread that entered the block. The
+    same clock can be entered once per batch, for example:
+
+        clock = BatchClock()
+        for batch in batches:
+            with clock:
+                write(batch)
+
+    """
+
+    ## The now of the innermost batch clock entered by each thread
+    active = threading.local()
+
+    def __init__(self, now=None):
+        self.now      = now or Clock.localnow()
+        self.previous = []
+
+    def __enter__(self):
+        self.previous.append(getattr(self.active, 'now', None))
+        self.active.now = self.now
+        return self
+
+    def __exit__(self, *exc):
+        self.active.now = self.previous.pop()
+
 if __name__ == '__main__':
     import time
     clock = Clock("human", local=True)  # UTC JSON clock formatter